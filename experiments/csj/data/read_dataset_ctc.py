@@ -12,14 +12,17 @@ from __future__ import print_function
 
 from os.path import join, basename
 import pickle
-import random
 import numpy as np
-import tensorflow as tf
-import time
 
-from utils.frame_stack import stack_frame
+from utils.frame_stack import stack_frame_utt
 from utils.sparsetensor import list2sparsetensor
 from utils.progressbar import wrap_iterator
+from utils.shard import open_shard
+from utils.sampler import EpochSampler
+from utils.batch_buffer import BatchBuffer
+from utils.tower_split import balance_towers
+from utils.utterance_cache import UtteranceCache
+from utils.stacked_cache import open_stacked_cache, build_stacked_cache
 
 
 class DataSet(object):
@@ -27,7 +30,9 @@ class DataSet(object):
 
     def __init__(self, data_type, train_data_size, label_type, batch_size,
                  num_stack=None, num_skip=None,
-                 is_sorted=True, is_progressbar=False, num_gpu=1):
+                 is_sorted=True, is_progressbar=False, num_gpu=1,
+                 sampler_params=None, dtype=np.float32, cache_bytes=0,
+                 make_stacked_cache=False):
         """
         Args:
             data_type: string, train, dev, eval1, eval2, eval3
@@ -39,12 +44,23 @@ class DataSet(object):
             is_sorted: if True, sort dataset by frame num
             is_progressbar: if True, visualize progressbar
             num_gpu: int, if more than 1, divide batch_size by num_gpu
+            sampler_params: dict of keyword arguments of `EpochSampler`
+                (mode, bucket_boundaries, num_buckets, frame_budget,
+                budget_type, seed). If None, sorted or shuffled by
+                is_sorted.
+            dtype: data type of input features in mini-batches
+            cache_bytes: int, the size of the cache of loaded & stacked
+                utterances in bytes. If 0, utterances are loaded every time.
+            make_stacked_cache: if True, stack frames of all utterances and
+                save them on disk when they are not cached yet (see
+                utils/stacked_cache.py). The cache is used whenever it is up
+                to date.
         """
         if data_type not in ['train', 'dev', 'eval1', 'eval2', 'eval3']:
             raise ValueError(
                 'data_type is "train" or "dev", "eval1" "eval2" "eval3".')
 
-        self.data_type = data_type * num_gpu
+        self.data_type = data_type
         self.train_data_size = train_data_size
         self.label_type = label_type
         self.batch_size = batch_size * num_gpu
@@ -53,6 +69,9 @@ class DataSet(object):
         self.is_sorted = is_sorted
         self.is_progressbar = is_progressbar
         self.num_gpu = num_gpu
+        self.dtype = dtype
+        self.batch_buffer = BatchBuffer(dtype=dtype)
+        self.cache = UtteranceCache(cache_bytes) if cache_bytes > 0 else None
 
         self.input_size = 123
         self.input_size = self.input_size
@@ -89,14 +108,91 @@ class DataSet(object):
         if (self.num_stack is not None) and (self.num_skip is not None):
             self.input_size = self.input_size * num_stack
         # NOTE: Not load dataset yet
-
-        self.rest = set([i for i in range(self.data_num)])
-
-    def next_batch(self, batch_size=None, session=None):
+        self.shard = open_shard(self.dataset_path)
+
+        # Stacked frames saved on disk
+        self.stacked_cache = None
+        if (num_stack is not None) and (num_skip is not None):
+            self.stacked_cache = open_stacked_cache(
+                self.dataset_path, self.frame_num_dict, num_stack, num_skip,
+                dtype=dtype)
+            if self.stacked_cache is None and make_stacked_cache:
+                print('=> Saving stacked frames...')
+                build_stacked_cache(self.dataset_path, num_stack, num_skip,
+                                    dtype=dtype, is_progressbar=is_progressbar)
+                self.stacked_cache = open_stacked_cache(
+                    self.dataset_path, self.frame_num_dict, num_stack, num_skip,
+                    dtype=dtype)
+
+        # Frame num of each utterance (after frame skipping)
+        frame_nums = np.array(
+            [frame_num for _, frame_num in self.frame_num_tuple_sorted])
+        if (num_stack is not None) and (num_skip is not None):
+            frame_nums = -(-frame_nums // num_skip)
+        if sampler_params is None:
+            sampler_params = {'mode': 'sorted' if is_sorted else 'shuffled'}
+        self.sampler = EpochSampler(self.data_num, self.batch_size,
+                                    frame_nums=frame_nums, **sampler_params)
+
+    def _load_utterance(self, index):
+        """Load an utterance.
+        Args:
+            index: int, the index of the utterance
+        Returns:
+            input_data: A numpy array of size `[frame_num, input_size]`.
+                Frames are stacked if the stacked cache is used.
+            label: A numpy array of labels
+            input_name: string, the name of the utterance
+        """
+        input_name = basename(self.input_paths[index]).split('.')[0]
+        if self.stacked_cache is not None:
+            input_data = self.stacked_cache.input(input_name)
+        elif self.shard is not None:
+            # Read slices of the packed dataset (see utils/shard.py)
+            input_data = self.shard.input(input_name)
+        else:
+            input_data = np.load(self.input_paths[index])
+        if self.shard is not None:
+            return input_data, self.shard.label(input_name), input_name
+        return input_data, np.load(self.label_paths[index]), input_name
+
+    def _load_stacked_utterance(self, index):
+        """Load an utterance & stack frames. The result is kept in the
+           cache if it is enabled.
+        Args:
+            index: int, the index of the utterance
+        Returns:
+            The same as `_load_utterance`, but frames are stacked
+        """
+        input_name = basename(self.input_paths[index]).split('.')[0]
+        key = (input_name, self.num_stack, self.num_skip)
+        if self.cache is not None:
+            utterance = self.cache.get(key)
+            if utterance is not None:
+                return utterance
+
+        input_data, label, input_name = self._load_utterance(index)
+        if self.cache is not None:
+            # Keep copies in memory instead of views of the shard
+            input_data = np.array(input_data, dtype=self.dtype)
+            label = np.array(label)
+
+        # Frame stacking
+        if ((self.num_stack is not None) and (self.num_skip is not None) and
+                self.stacked_cache is None):
+            input_data = stack_frame_utt(
+                input_data[:self.frame_num_dict[input_name]],
+                self.num_stack, self.num_skip, dtype=self.dtype)
+
+        utterance = (input_data, label, input_name)
+        if self.cache is not None:
+            self.cache.put(key, utterance)
+        return utterance
+
+    def next_batch(self, batch_size=None):
         """Make mini-batch.
         Args:
             batch_size: int, the size of mini-batch
-            session:
         Returns:
             inputs: list of input data, size `[batch_size]`
             labels_st: list of SparseTensor of labels
@@ -104,190 +200,106 @@ class DataSet(object):
             inputs_seq_len: list of length of inputs of size `[batch_size]`
             input_names: list of file name of input data of size `[batch_size]`
         """
-        if session is None and self.num_gpu != 1:
-            raise ValueError('Set session when using multiple GPUs.')
-
-        if batch_size is None:
-            batch_size = self.batch_size
-
-        next_epoch_flag = False
-
         while True:
-            #########################
-            # sorted dataset
-            #########################
-            if self.is_sorted:
-                if len(self.rest) > self.batch_size:
-                    sorted_indices = list(self.rest)[:self.batch_size]
-                    self.rest -= set(sorted_indices)
-                else:
-                    sorted_indices = list(self.rest)
-                    self.rest = set(
-                        [i for i in range(len(self.data_num))])
-                    next_epoch_flag = True
-                    if self.data_type == 'train':
-                        print('---Next epoch---')
-
-                # Shuffle selected mini-batch
-                random.shuffle(sorted_indices)
-
-                start = time.time()
-                # Load dataset in mini-batch
-                input_list, label_list, input_name_list = [], [], []
-                for i in sorted_indices:
-                    # input_list.append(np.load(self.input_paths[i]))
-                    # label_list.append(np.load(self.label_paths[i]))
-                    # input_name_list.append(basename(
-                    #     self.input_paths[i]).split('.')[0])
-                    input_list.append(np.load(np.take(self.input_paths, i,
-                                                      axis=0)))
-                    label_list.append(np.load(np.take(self.label_paths, i,
-                                                      axis=0)))
-                    input_name_list.append(
-                        basename(np.take(self.input_paths, i,
-                                         axis=0)).split('.')[0])
-                input_list = np.array(input_list)
-                label_list = np.array(label_list)
-                input_name_list = np.array(input_name_list)
-                print('load')
-                print(time.time() - start)
-
-                start = time.time()
-                # Frame stacking
-                if (self.num_stack is not None) and (self.num_skip is not None):
-                    stacked_input_list = stack_frame(
-                        input_list,
-                        self.input_paths[sorted_indices],
-                        self.frame_num_dict,
-                        self.num_stack,
-                        self.num_skip,
-                        is_progressbar=False)
-                    input_list = np.array(stacked_input_list)
-                print('stack')
-                print(time.time() - start)
-
-                # Compute max frame num in mini-batch
-                max_frame_num = max(map(lambda x: x.shape[0], input_list))
-
-                # Compute max target label length in mini-batch
-                max_seq_len = max(map(len, label_list))
-
-                # Initialization
-                inputs = np.zeros(
-                    (len(sorted_indices), max_frame_num, self.input_size))
-                # Padding with -1
-                labels = np.array([[-1] * max_seq_len]
-                                  * len(sorted_indices), dtype=int)
-                inputs_seq_len = np.empty((len(sorted_indices),), dtype=int)
-                input_names = [None] * len(sorted_indices)
-
-                # Set values of each data in mini-batch
-                for i_batch in range(len(sorted_indices)):
-                    data_i = input_list[i_batch]
-                    frame_num = data_i.shape[0]
-                    inputs[i_batch, :frame_num, :] = data_i
-                    labels[i_batch, :len(label_list[i_batch])] = label_list[i_batch]
-                    inputs_seq_len[i_batch] = frame_num
-                    input_names[i_batch] = input_name_list[i_batch]
-
-            #########################
-            # not sorted dataset
-            #########################
-            else:
-                if len(self.rest) > self.batch_size:
-                    # Randomly sample mini-batch
-                    random_indices = random.sample(
-                        list(self.rest), self.batch_size)
-                    self.rest -= set(random_indices)
-                else:
-                    random_indices = list(self.rest)
-                    self.rest = set([i for i in range(self.data_num)])
-                    next_epoch_flag = True
-                    if self.data_type == 'train':
-                        print('---Next epoch---')
-
-                    # Shuffle selected mini-batch
-                    random.shuffle(random_indices)
-
-                # Load dataset in mini-batch
-                input_list, label_list, input_name_list = [], [], []
-                for i in random_indices:
-                    # input_list.append(np.load(self.input_paths[i]))
-                    # label_list.append(np.load(self.label_paths[i]))
-                    # input_name_list.append(
-                    #     basename(self.input_paths[i]).split('.')[0])
-                    input_list.append(np.load(np.take(self.input_paths, i, axis=0)))
-                    label_list.append(np.load(np.take(self.label_paths, i, axis=0)))
-                    input_name_list.append(
-                        basename(np.take(self.input_paths, i, axis=0)).split('.')[0])
-                input_list = np.array(input_list)
-                label_list = np.array(label_list)
-                input_name_list = np.array(input_name_list)
-
-                # Frame stacking
-                if (self.num_stack is not None) and (self.num_skip is not None):
-                    stacked_input_list = stack_frame(
-                        input_list,
-                        self.input_paths[random_indices],
-                        self.frame_num_dict,
-                        self.num_stack,
-                        self.num_skip,
-                        is_progressbar=False)
-                    input_list = np.array(stacked_input_list)
-
-                # Compute max frame num in mini-batch
-                max_frame_num = max(map(lambda x: x.shape[0], input_list))
-
-                # Compute max target label length in mini-batch
-                max_seq_len = max(map(len, label_list))
-
-                # Initialization
-                inputs = np.zeros(
-                    (len(random_indices), max_frame_num, self.input_size))
-                # Padding with -1
-                labels = np.array([[-1] * max_seq_len]
-                                  * len(random_indices), dtype=int)
-                inputs_seq_len = np.empty((len(random_indices),), dtype=int)
-                input_names = [None] * len(random_indices)
-
-                # Set values of each data in mini-batch
-                for i_batch in range(len(random_indices)):
-                    data_i = input_list[i_batch]
-                    frame_num = data_i.shape[0]
-                    inputs[i_batch, : frame_num, :] = data_i
-                    labels[i_batch, :len(label_list[i_batch])] = label_list[i_batch]
-                    inputs_seq_len[i_batch] = frame_num
-                    input_names[i_batch] = input_name_list[i_batch]
-
-            if self.num_gpu > 1:
-                divide_num = self.num_gpu
-                if next_epoch_flag:
-                    for i in range(self.num_gpu, 0, -1):
-                        if len(self.rest) % i == 0:
-                            divide_num = i
-                            break
-                    next_epoch_flag = False
-
-                start = time.time()
-                # Now we split the mini-batch data by num_gpu
-                inputs = tf.split(inputs, divide_num, axis=0)
-                labels = tf.split(labels, divide_num, axis=0)
-                inputs_seq_len = tf.split(inputs_seq_len, divide_num, axis=0)
-                input_names = tf.split(input_names, divide_num, axis=0)
-                print('tf.split')
-                print(time.time() - start)
-
-                start = time.time()
-                # Convert from SparseTensor to numpy.ndarray
-                inputs = list(map(session.run, inputs))
-                labels = list(map(session.run, labels))
-                labels_st = list(map(list2sparsetensor, labels))
-                inputs_seq_len = list(map(session.run, inputs_seq_len))
-                input_names = list(map(session.run, input_names))
-                print('session.run')
-                print(time.time() - start)
+            indices, _ = self.batch_indices(batch_size)
+            batch = self.make_batch(indices)
+            try:
+                yield batch
+            finally:
+                # The previous mini-batch is not used when the next one is
+                # requested or the generator is closed (also when it is
+                # garbage-collected)
+                self.release(batch[0])
+
+    def release(self, inputs):
+        """Let the buffer of inputs of a mini-batch be reused. Call this
+           after the mini-batch is used when mini-batches are made by
+           `make_batch` (`next_batch` releases them by itself).
+        Args:
+            inputs: inputs of a mini-batch returned by `make_batch`
+        """
+        self.batch_buffer.release(inputs)
 
-            else:
-                labels_st = list2sparsetensor(labels)
+    def batch_indices(self, batch_size=None):
+        """Select indices of the next mini-batch.
+        Args:
+            batch_size: int, the size of mini-batch. If None, use the
+                mini-batches planned by the sampler.
+        Returns:
+            indices: A numpy array of indices of the mini-batch
+            next_epoch_flag: if True, this mini-batch is the last one of
+                the epoch
+        """
+        indices, next_epoch_flag = self.sampler.next(batch_size)
+        if next_epoch_flag and self.data_type == 'train':
+            print('---Next epoch---')
+        return indices, next_epoch_flag
 
-            yield inputs, labels_st, inputs_seq_len, input_names
+    def utterances(self, indices):
+        """Load the utterances and stack frames, without padding.
+        Args:
+            indices: list of indices of utterances
+        Returns:
+            input_list: list of input data of size `[frame_num, input_size]`
+            label_list: list of labels of each utterance
+            input_names: list of file name of input data
+        """
+        input_list, label_list, input_names = [], [], []
+        for i in indices:
+            input_i, label_i, input_name_i = self._load_stacked_utterance(i)
+            input_list.append(input_i)
+            label_list.append(label_i)
+            input_names.append(input_name_i)
+        return input_list, label_list, input_names
+
+    def make_batch(self, indices):
+        """Make a mini-batch from the selected utterances. This does not
+           change the state of the dataset, so it can be called from
+           several threads or processes at once.
+        Args:
+            indices: list of indices of the mini-batch
+        Returns:
+            The same as `next_batch`
+        """
+        # Load dataset in mini-batch
+        input_list, label_list, input_names = self.utterances(indices)
+
+        # Compute max frame num in mini-batch
+        max_frame_num = max(map(lambda x: x.shape[0], input_list))
+
+        # Compute max target label length in mini-batch
+        max_seq_len = max(map(len, label_list))
+
+        # Initialization
+        inputs = self.batch_buffer.empty(
+            len(indices), max_frame_num, self.input_size)
+        # Padding with -1
+        labels = np.full((len(indices), max_seq_len), -1, dtype=np.int32)
+        inputs_seq_len = np.empty((len(indices),), dtype=int)
+
+        # Set values of each data in mini-batch
+        for i_batch in range(len(indices)):
+            data_i = input_list[i_batch]
+            frame_num = data_i.shape[0]
+            inputs[i_batch, :frame_num, :] = data_i
+            inputs[i_batch, frame_num:, :] = 0
+            labels[i_batch, :len(label_list[i_batch])] = label_list[i_batch]
+            inputs_seq_len[i_batch] = frame_num
+
+        if self.num_gpu > 1:
+            # Split into towers with balanced frame nums. Each tower is
+            # padded only to its own max frame num.
+            towers = balance_towers(inputs_seq_len, self.num_gpu)
+            tower_inputs = [inputs[t, :inputs_seq_len[t].max()]
+                            for t in towers]
+            # Towers are copied by fancy indexing, so the buffer is free
+            self.batch_buffer.release(inputs)
+            inputs = tower_inputs
+            labels_st = [list2sparsetensor(labels[t], dtype=np.int32)
+                         for t in towers]
+            inputs_seq_len = [inputs_seq_len[t] for t in towers]
+            input_names = [[input_names[i] for i in t] for t in towers]
+        else:
+            labels_st = list2sparsetensor(labels, dtype=np.int32)
+
+        return inputs, labels_st, inputs_seq_len, input_names
@@ -61,7 +61,7 @@ class TestReadDatasetCTC(unittest.TestCase):
                 map_file_path = '../metric/mapping_files/ctc/phone2num.txt'
                 map_fn = num2phone
 
-            mini_batch = dataset.next_batch(session=sess)
+            mini_batch = dataset.next_batch()
 
             iter_per_epoch = int(dataset.data_num /
                                  (batch_size * num_gpu)) + 1
@@ -11,18 +11,21 @@ from __future__ import print_function
 
 from os.path import join, basename
 import pickle
-import random
 import numpy as np
-import tensorflow as tf
 
 from utils.progressbar import wrap_iterator
+from utils.shard import open_shard
+from utils.sampler import EpochSampler
+from utils.batch_buffer import BatchBuffer
+from utils.tower_split import balance_towers
 
 
 class DataSet(object):
     """Read dataset."""
 
     def __init__(self, data_type, label_type, batch_size, eos_index,
-                 is_sorted=True, is_progressbar=False, num_gpu=1):
+                 is_sorted=True, is_progressbar=False, num_gpu=1,
+                 sampler_params=None, dtype=np.float32):
         """
         Args:
             data_type: train or dev or test
@@ -31,6 +34,11 @@ class DataSet(object):
             is_sorted: if True, sort dataset by frame num
             is_progressbar: if True, visualize progressbar
             num_gpu: int, if more than 1, divide batch_size by num_gpu
+            sampler_params: dict of keyword arguments of `EpochSampler`
+                (mode, bucket_boundaries, num_buckets, frame_budget,
+                budget_type, seed). If None, sorted or shuffled by
+                is_sorted.
+            dtype: data type of input features in mini-batches
         """
         if data_type not in ['train', 'dev', 'test']:
             raise ValueError('data_type is "train" or "dev" or "test".')
@@ -42,6 +50,8 @@ class DataSet(object):
         self.is_sorted = is_sorted
         self.is_progressbar = is_progressbar
         self.num_gpu = num_gpu
+        self.dtype = dtype
+        self.batch_buffer = BatchBuffer(dtype=dtype)
 
         self.input_size = 123
         self.dataset_path = join(
@@ -70,19 +80,33 @@ class DataSet(object):
         # Load all dataset in advance
         print('=> Loading ' + data_type + ' dataset (' + label_type + ')...')
         input_list, label_list = [], []
-        for i in wrap_iterator(range(self.data_num), self.is_progressbar):
-            input_list.append(np.load(self.input_paths[i]))
-            label_list.append(np.load(self.label_paths[i]))
+        shard = open_shard(self.dataset_path)
+        if shard is not None:
+            # Read slices of the packed dataset (see utils/shard.py)
+            for input_name, _ in wrap_iterator(self.frame_num_tuple_sorted,
+                                               self.is_progressbar):
+                input_list.append(shard.input(input_name).astype(
+                    dtype, copy=False))
+                label_list.append(shard.label(input_name))
+        else:
+            for i in wrap_iterator(range(self.data_num), self.is_progressbar):
+                input_list.append(np.load(
+                    self.input_paths[i]).astype(dtype, copy=False))
+                label_list.append(np.load(self.label_paths[i]))
         self.input_list = np.array(input_list)
         self.label_list = np.array(label_list)
 
-        self.rest = set([i for i in range(self.data_num)])
+        # Frame num of each utterance
+        frame_nums = [frame_num for _, frame_num in self.frame_num_tuple_sorted]
+        if sampler_params is None:
+            sampler_params = {'mode': 'sorted' if is_sorted else 'shuffled'}
+        self.sampler = EpochSampler(self.data_num, self.batch_size,
+                                    frame_nums=frame_nums, **sampler_params)
 
-    def next_batch(self, batch_size=None, session=None):
+    def next_batch(self, batch_size=None):
         """Make mini-batch.
         Args:
             batch_size: int, the size of mini-batch
-            session:
         Returns:
             inputs: list of input data, size `[batch_size]`
             labels: list of tuple `(indices, values, shape)` of size
@@ -92,130 +116,92 @@ class DataSet(object):
                 `[batch_size]`
             input_names: list of file name of input data of size `[batch_size]`
         """
-        if session is None and self.num_gpu != 1:
-            raise ValueError('Set session when using multiple GPUs.')
-
-        if batch_size is None:
-            batch_size = self.batch_size
-
-        next_epoch_flag = False
-
         while True:
-            #########################
-            # sorted dataset
-            #########################
-            if self.is_sorted:
-                if len(self.rest) > batch_size:
-                    sorted_indices = list(self.rest)[:batch_size]
-                    self.rest -= set(sorted_indices)
-                else:
-                    sorted_indices = list(self.rest)
-                    self.rest = set([i for i in range(self.data_num)])
-                    next_epoch_flag = True
-                    if self.data_type == 'train':
-                        print('---Next epoch---')
-
-                # Compute max frame num in mini-batch
-                max_frame_num = self.input_list[sorted_indices[-1]].shape[0]
-
-                # Compute max target label length in mini-batch
-                max_seq_len = max(map(len, self.label_list[sorted_indices]))
-
-                # Shuffle selected mini-batch
-                random.shuffle(sorted_indices)
-
-                # Initialization
-                inputs = np.zeros(
-                    (len(sorted_indices), max_frame_num, self.input_size))
-                # Padding with <EOS>
-                labels = np.array([[self.eos_index] * max_seq_len]
-                                  * len(sorted_indices), dtype=int)
-                inputs_seq_len = np.zeros((len(sorted_indices),), dtype=int)
-                labels_seq_len = np.zeros((len(sorted_indices),), dtype=int)
-                input_names = [None] * len(sorted_indices)
-
-                # Set values of each data in mini-batch
-                for i_batch, x in enumerate(sorted_indices):
-                    data_i = self.input_list[x]
-                    frame_num = data_i.shape[0]
-                    inputs[i_batch, :frame_num, :] = data_i
-                    labels[i_batch, :len(self.label_list[x])
-                           ] = self.label_list[x]
-                    inputs_seq_len[i_batch] = frame_num
-                    labels_seq_len[i_batch] = len(self.label_list[x])
-                    input_names[i_batch] = basename(
-                        self.input_paths[x]).split('.')[0]
-
-            #########################
-            # not sorted dataset
-            #########################
-            else:
-                if len(self.rest) > batch_size:
-                    # Randomly sample mini-batch
-                    random_indices = random.sample(list(self.rest), batch_size)
-                    self.rest -= set(random_indices)
-                else:
-                    random_indices = list(self.rest)
-                    self.rest = set([i for i in range(self.data_num)])
-                    next_epoch_flag = True
-                    if self.data_type == 'train':
-                        print('---Next epoch---')
-
-                    # Shuffle selected mini-batch
-                    random.shuffle(random_indices)
-
-                # Compute max frame num in mini-batch
-                frame_num_list = []
-                for data_i in self.input_list[random_indices]:
-                    frame_num_list.append(data_i.shape[0])
-                max_frame_num = max(frame_num_list)
-
-                # Compute max target label length in mini-batch
-                max_seq_len = max(map(len, self.label_list[random_indices]))
-
-                # Initialization
-                inputs = np.zeros(
-                    (len(random_indices), max_frame_num, self.input_size))
-                # Padding with <EOS>
-                labels = np.array([[self.eos_index] * max_seq_len]
-                                  * len(random_indices), dtype=int)
-                inputs_seq_len = np.zeros((len(random_indices),), dtype=int)
-                labels_seq_len = np.zeros((len(random_indices),), dtype=int)
-                input_names = [None] * len(random_indices)
-
-                # Set values of each data in mini-batch
-                for i_batch, x in enumerate(random_indices):
-                    data_i = self.input_list[x]
-                    frame_num = data_i.shape[0]
-                    inputs[i_batch, :frame_num, :] = data_i
-                    labels[i_batch, :len(self.label_list[x])
-                           ] = self.label_list[x]
-                    inputs_seq_len[i_batch] = frame_num
-                    labels_seq_len[i_batch] = len(self.label_list[x])
-                    input_names[i_batch] = basename(
-                        self.input_paths[x]).split('.')[0]
-
-            if self.num_gpu > 1:
-                divide_num = self.num_gpu
-                if next_epoch_flag:
-                    for i in range(self.num_gpu, 0, -1):
-                        if len(self.rest) % i == 0:
-                            divide_num = i
-                            break
-                    next_epoch_flag = False
-
-                # Now we split the mini-batch data by num_gpu
-                inputs = tf.split(inputs, divide_num, axis=0)
-                labels = tf.split(labels, divide_num, axis=0)
-                inputs_seq_len = tf.split(inputs_seq_len, divide_num, axis=0)
-                labels_seq_len = tf.split(labels_seq_len, divide_num, axis=0)
-                input_names = tf.split(input_names, divide_num, axis=0)
-
-                # Convert from SparseTensor to numpy.ndarray
-                inputs = list(map(session.run, inputs))
-                labels = list(map(session.run, labels))
-                inputs_seq_len = list(map(session.run, inputs_seq_len))
-                labels_seq_len = list(map(session.run, labels_seq_len))
-                input_names = list(map(session.run, input_names))
-
-            yield inputs, labels, inputs_seq_len, labels_seq_len, input_names
+            indices, _ = self.batch_indices(batch_size)
+            batch = self.make_batch(indices)
+            try:
+                yield batch
+            finally:
+                # The previous mini-batch is not used when the next one is
+                # requested or the generator is closed (also when it is
+                # garbage-collected)
+                self.release(batch[0])
+
+    def release(self, inputs):
+        """Let the buffer of inputs of a mini-batch be reused. Call this
+           after the mini-batch is used when mini-batches are made by
+           `make_batch` (`next_batch` releases them by itself).
+        Args:
+            inputs: inputs of a mini-batch returned by `make_batch`
+        """
+        self.batch_buffer.release(inputs)
+
+    def batch_indices(self, batch_size=None):
+        """Select indices of the next mini-batch.
+        Args:
+            batch_size: int, the size of mini-batch. If None, use the
+                mini-batches planned by the sampler.
+        Returns:
+            indices: A numpy array of indices of the mini-batch
+            next_epoch_flag: if True, this mini-batch is the last one of
+                the epoch
+        """
+        indices, next_epoch_flag = self.sampler.next(batch_size)
+        if next_epoch_flag and self.data_type == 'train':
+            print('---Next epoch---')
+        return indices, next_epoch_flag
+
+    def make_batch(self, indices):
+        """Make a mini-batch from the selected utterances. This does not
+           change the state of the dataset, so it can be called from
+           several threads or processes at once.
+        Args:
+            indices: list of indices of the mini-batch
+        Returns:
+            The same as `next_batch`
+        """
+        # Compute max frame num in mini-batch
+        max_frame_num = max(
+            map(lambda x: x.shape[0], self.input_list[indices]))
+
+        # Compute max target label length in mini-batch
+        max_seq_len = max(map(len, self.label_list[indices]))
+
+        # Initialization
+        inputs = self.batch_buffer.empty(
+            len(indices), max_frame_num, self.input_size)
+        # Padding with <EOS>
+        labels = np.full((len(indices), max_seq_len),
+                         self.eos_index, dtype=np.int32)
+        inputs_seq_len = np.zeros((len(indices),), dtype=int)
+        labels_seq_len = np.zeros((len(indices),), dtype=int)
+        input_names = [None] * len(indices)
+
+        # Set values of each data in mini-batch
+        for i_batch, x in enumerate(indices):
+            data_i = self.input_list[x]
+            frame_num = data_i.shape[0]
+            inputs[i_batch, :frame_num, :] = data_i
+            inputs[i_batch, frame_num:, :] = 0
+            labels[i_batch, :len(self.label_list[x])] = self.label_list[x]
+            inputs_seq_len[i_batch] = frame_num
+            labels_seq_len[i_batch] = len(self.label_list[x])
+            input_names[i_batch] = basename(
+                self.input_paths[x]).split('.')[0]
+
+        if self.num_gpu > 1:
+            # Split into towers with balanced frame nums. Each tower is
+            # padded only to its own max frame num.
+            towers = balance_towers(inputs_seq_len, self.num_gpu)
+            tower_inputs = [inputs[t, :inputs_seq_len[t].max()]
+                            for t in towers]
+            # Towers are copied by fancy indexing, so the buffer is free
+            self.batch_buffer.release(inputs)
+            inputs = tower_inputs
+            # Padded with <EOS>
+            labels = [labels[t, :labels_seq_len[t].max()] for t in towers]
+            labels_seq_len = [labels_seq_len[t] for t in towers]
+            inputs_seq_len = [inputs_seq_len[t] for t in towers]
+            input_names = [[input_names[i] for i in t] for t in towers]
+
+        return inputs, labels, inputs_seq_len, labels_seq_len, input_names
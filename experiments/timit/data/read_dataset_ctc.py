@@ -12,13 +12,16 @@ from __future__ import print_function
 
 from os.path import join, basename
 import pickle
-import random
 import numpy as np
-import tensorflow as tf
 
 from utils.frame_stack import stack_frame
 from utils.sparsetensor import list2sparsetensor
 from utils.progressbar import wrap_iterator
+from utils.shard import open_shard
+from utils.sampler import EpochSampler
+from utils.batch_buffer import BatchBuffer
+from utils.tower_split import balance_towers
+from utils.stacked_cache import open_stacked_cache, save_stacked_cache
 
 
 class DataSet(object):
@@ -26,7 +29,9 @@ class DataSet(object):
 
     def __init__(self, data_type, label_type, batch_size,
                  num_stack=None, num_skip=None,
-                 is_sorted=True, is_progressbar=False, num_gpu=1):
+                 is_sorted=True, is_progressbar=False, num_gpu=1,
+                 sampler_params=None, dtype=np.float32,
+                 make_stacked_cache=False):
         """
         Args:
             data_type: string, train or dev or test
@@ -37,6 +42,14 @@ class DataSet(object):
             is_sorted: if True, sort dataset by frame num
             is_progressbar: if True, visualize progressbar
             num_gpu: int, if more than 1, divide batch_size by num_gpu
+            sampler_params: dict of keyword arguments of `EpochSampler`
+                (mode, bucket_boundaries, num_buckets, frame_budget,
+                budget_type, seed). If None, sorted or shuffled by
+                is_sorted.
+            dtype: data type of input features in mini-batches
+            make_stacked_cache: if True, save stacked frames on disk when
+                they are not cached yet (see utils/stacked_cache.py). The
+                cache is used whenever it is up to date.
         """
         if data_type not in ['train', 'dev', 'test']:
             raise ValueError('data_type is "train" or "dev" or "test".')
@@ -49,6 +62,8 @@ class DataSet(object):
         self.is_sorted = is_sorted
         self.is_progressbar = is_progressbar
         self.num_gpu = num_gpu
+        self.dtype = dtype
+        self.batch_buffer = BatchBuffer(dtype=dtype)
 
         self.input_size = 123
         self.dataset_path = join(
@@ -72,34 +87,71 @@ class DataSet(object):
         self.label_paths = np.array(label_paths)
         self.data_num = len(self.input_paths)
 
+        # Stacked frames saved on disk
+        stacked_cache = None
+        if (num_stack is not None) and (num_skip is not None):
+            stacked_cache = open_stacked_cache(
+                self.dataset_path, self.frame_num_dict, num_stack, num_skip,
+                dtype=dtype)
+
         # Load all dataset in advance
         print('=> Loading ' + data_type + ' dataset (' + label_type + ')...')
         input_list, label_list = [], []
+        shard = open_shard(self.dataset_path)
         for i in wrap_iterator(range(self.data_num), self.is_progressbar):
-            input_list.append(np.load(self.input_paths[i]))
-            label_list.append(np.load(self.label_paths[i]))
+            input_name = self.frame_num_tuple_sorted[i][0]
+            if stacked_cache is not None:
+                input_list.append(stacked_cache.input(input_name))
+            elif shard is not None:
+                # Read slices of the packed dataset (see utils/shard.py)
+                input_list.append(shard.input(input_name).astype(
+                    dtype, copy=False))
+            else:
+                input_list.append(np.load(
+                    self.input_paths[i]).astype(dtype, copy=False))
+            if shard is not None:
+                label_list.append(shard.label(input_name))
+            else:
+                label_list.append(np.load(self.label_paths[i]))
         self.input_list = np.array(input_list)
         self.label_list = np.array(label_list)
 
         # Frame stacking
         if (num_stack is not None) and (num_skip is not None):
-            print('=> Stacking frames...')
-            stacked_input_list = stack_frame(self.input_list,
-                                             self.input_paths,
-                                             self.frame_num_dict,
-                                             num_stack,
-                                             num_skip,
-                                             is_progressbar)
-            self.input_list = np.array(stacked_input_list)
+            if stacked_cache is None:
+                print('=> Stacking frames...')
+                stacked_input_list = stack_frame(self.input_list,
+                                                 self.input_paths,
+                                                 self.frame_num_dict,
+                                                 num_stack,
+                                                 num_skip,
+                                                 is_progressbar,
+                                                 dtype=dtype)
+                self.input_list = np.array(stacked_input_list)
+                if make_stacked_cache:
+                    print('=> Saving stacked frames...')
+                    save_stacked_cache(
+                        self.dataset_path,
+                        [input_name for input_name, _
+                         in self.frame_num_tuple_sorted],
+                        stacked_input_list, self.frame_num_dict,
+                        num_stack, num_skip, dtype=dtype)
             self.input_size = self.input_size * num_stack
 
-        self.rest = set([i for i in range(self.data_num)])
+        # Frame num of each utterance (after frame skipping)
+        frame_nums = np.array(
+            [frame_num for _, frame_num in self.frame_num_tuple_sorted])
+        if (num_stack is not None) and (num_skip is not None):
+            frame_nums = -(-frame_nums // num_skip)
+        if sampler_params is None:
+            sampler_params = {'mode': 'sorted' if is_sorted else 'shuffled'}
+        self.sampler = EpochSampler(self.data_num, self.batch_size,
+                                    frame_nums=frame_nums, **sampler_params)
 
-    def next_batch(self, batch_size=None, session=None):
+    def next_batch(self, batch_size=None):
         """Make mini-batch.
         Args:
             batch_size: int, the size of mini-batch
-            session:
         Returns:
             inputs: list of input data, size `[batch_size]`
             labels_st: list of SparseTensor of labels
@@ -107,126 +159,103 @@ class DataSet(object):
             inputs_seq_len: list of length of inputs of size `[batch_size]`
             input_names: list of file name of input data of size `[batch_size]`
         """
-        if session is None and self.num_gpu != 1:
-            raise ValueError('Set session when using multiple GPUs.')
-
-        if batch_size is None:
-            batch_size = self.batch_size
-
-        next_epoch_flag = False
-
         while True:
-            #########################
-            # sorted dataset
-            #########################
-            if self.is_sorted:
-                if len(self.rest) > batch_size:
-                    sorted_indices = list(self.rest)[:batch_size]
-                    self.rest -= set(sorted_indices)
-                else:
-                    sorted_indices = list(self.rest)
-                    self.rest = set([i for i in range(self.data_num)])
-                    next_epoch_flag = True
-                    if self.data_type == 'train':
-                        print('---Next epoch---')
-
-                # Compute max frame num in mini-batch
-                max_frame_num = self.input_list[sorted_indices[-1]].shape[0]
-
-                # Compute max target label length in mini-batch
-                max_seq_len = max(map(len, self.label_list[sorted_indices]))
-
-                # Shuffle selected mini-batch
-                random.shuffle(sorted_indices)
-
-                # Initialization
-                inputs = np.zeros(
-                    (len(sorted_indices), max_frame_num, self.input_size))
-                # Padding with -1
-                labels = np.array([[-1] * max_seq_len]
-                                  * len(sorted_indices), dtype=int)
-                inputs_seq_len = np.empty((len(sorted_indices),), dtype=int)
-                input_names = [None] * len(sorted_indices)
-
-                # Set values of each data in mini-batch
-                for i_batch, x in enumerate(sorted_indices):
-                    data_i = self.input_list[x]
-                    frame_num = data_i.shape[0]
-                    inputs[i_batch, :frame_num, :] = data_i
-                    labels[i_batch, :len(self.label_list[x])
-                           ] = self.label_list[x]
-                    inputs_seq_len[i_batch] = frame_num
-                    input_names[i_batch] = basename(
-                        self.input_paths[x]).split('.')[0]
-
-            #########################
-            # not sorted dataset
-            #########################
-            else:
-                if len(self.rest) > batch_size:
-                    # Randomly sample mini-batch
-                    random_indices = random.sample(
-                        list(self.rest), batch_size)
-                    self.rest -= set(random_indices)
-                else:
-                    random_indices = list(self.rest)
-                    self.rest = set([i for i in range(self.data_num)])
-                    next_epoch_flag = True
-                    if self.data_type == 'train':
-                        print('---Next epoch---')
-
-                    # Shuffle selected mini-batch
-                    random.shuffle(random_indices)
-
-                # Compute max frame num in mini-batch
-                max_frame_num = max(
-                    map(lambda x: x.shape[0], self.input_list[random_indices]))
-
-                # Compute max target label length in mini-batch
-                max_seq_len = max(map(len, self.label_list[random_indices]))
-
-                # Initialization
-                inputs = np.zeros(
-                    (len(random_indices), max_frame_num, self.input_size))
-                # Padding with -1
-                labels = np.array([[-1] * max_seq_len]
-                                  * len(random_indices), dtype=int)
-                inputs_seq_len = np.empty((len(random_indices),), dtype=int)
-                input_names = [None] * len(random_indices)
-
-                # Set values of each data in mini-batch
-                for i_batch, x in enumerate(random_indices):
-                    data_i = self.input_list[x]
-                    frame_num = data_i.shape[0]
-                    inputs[i_batch, :frame_num, :] = data_i
-                    labels[i_batch, :len(self.label_list[x])
-                           ] = self.label_list[x]
-                    inputs_seq_len[i_batch] = frame_num
-                    input_names[i_batch] = basename(
-                        self.input_paths[x]).split('.')[0]
-
-            if self.num_gpu > 1:
-                divide_num = self.num_gpu
-                if next_epoch_flag:
-                    for i in range(self.num_gpu, 0, -1):
-                        if len(self.rest) % i == 0:
-                            divide_num = i
-                            break
-                    next_epoch_flag = False
-
-                # Now we split the mini-batch data by num_gpu
-                inputs = tf.split(inputs, divide_num, axis=0)
-                labels = tf.split(labels, divide_num, axis=0)
-                inputs_seq_len = tf.split(inputs_seq_len, divide_num, axis=0)
-                input_names = tf.split(input_names, divide_num, axis=0)
-
-                # Convert from SparseTensor to numpy.ndarray
-                inputs = list(map(session.run, inputs))
-                labels = list(map(session.run, labels))
-                labels_st = list(map(list2sparsetensor, labels))
-                inputs_seq_len = list(map(session.run, inputs_seq_len))
-                input_names = list(map(session.run, input_names))
-            else:
-                labels_st = list2sparsetensor(labels)
+            indices, _ = self.batch_indices(batch_size)
+            batch = self.make_batch(indices)
+            try:
+                yield batch
+            finally:
+                # The previous mini-batch is not used when the next one is
+                # requested or the generator is closed (also when it is
+                # garbage-collected)
+                self.release(batch[0])
+
+    def release(self, inputs):
+        """Let the buffer of inputs of a mini-batch be reused. Call this
+           after the mini-batch is used when mini-batches are made by
+           `make_batch` (`next_batch` releases them by itself).
+        Args:
+            inputs: inputs of a mini-batch returned by `make_batch`
+        """
+        self.batch_buffer.release(inputs)
+
+    def batch_indices(self, batch_size=None):
+        """Select indices of the next mini-batch.
+        Args:
+            batch_size: int, the size of mini-batch. If None, use the
+                mini-batches planned by the sampler.
+        Returns:
+            indices: A numpy array of indices of the mini-batch
+            next_epoch_flag: if True, this mini-batch is the last one of
+                the epoch
+        """
+        indices, next_epoch_flag = self.sampler.next(batch_size)
+        if next_epoch_flag and self.data_type == 'train':
+            print('---Next epoch---')
+        return indices, next_epoch_flag
 
-            yield inputs, labels_st, inputs_seq_len, input_names
+    def utterances(self, indices):
+        """Return the utterances without padding.
+        Args:
+            indices: list of indices of utterances
+        Returns:
+            input_list: list of input data of size `[frame_num, input_size]`
+            label_list: list of labels of each utterance
+            input_names: list of file name of input data
+        """
+        input_list = list(self.input_list[indices])
+        label_list = list(self.label_list[indices])
+        input_names = [basename(self.input_paths[x]).split('.')[0]
+                       for x in indices]
+        return input_list, label_list, input_names
+
+    def make_batch(self, indices):
+        """Make a mini-batch from the selected utterances. This does not
+           change the state of the dataset, so it can be called from
+           several threads or processes at once.
+        Args:
+            indices: list of indices of the mini-batch
+        Returns:
+            The same as `next_batch`
+        """
+        input_list, label_list, input_names = self.utterances(indices)
+
+        # Compute max frame num in mini-batch
+        max_frame_num = max(map(lambda x: x.shape[0], input_list))
+
+        # Compute max target label length in mini-batch
+        max_seq_len = max(map(len, label_list))
+
+        # Initialization
+        inputs = self.batch_buffer.empty(
+            len(indices), max_frame_num, self.input_size)
+        # Padding with -1
+        labels = np.full((len(indices), max_seq_len), -1, dtype=np.int32)
+        inputs_seq_len = np.empty((len(indices),), dtype=int)
+
+        # Set values of each data in mini-batch
+        for i_batch in range(len(indices)):
+            data_i = input_list[i_batch]
+            frame_num = data_i.shape[0]
+            inputs[i_batch, :frame_num, :] = data_i
+            inputs[i_batch, frame_num:, :] = 0
+            labels[i_batch, :len(label_list[i_batch])] = label_list[i_batch]
+            inputs_seq_len[i_batch] = frame_num
+
+        if self.num_gpu > 1:
+            # Split into towers with balanced frame nums. Each tower is
+            # padded only to its own max frame num.
+            towers = balance_towers(inputs_seq_len, self.num_gpu)
+            tower_inputs = [inputs[t, :inputs_seq_len[t].max()]
+                            for t in towers]
+            # Towers are copied by fancy indexing, so the buffer is free
+            self.batch_buffer.release(inputs)
+            inputs = tower_inputs
+            labels_st = [list2sparsetensor(labels[t], dtype=np.int32)
+                         for t in towers]
+            inputs_seq_len = [inputs_seq_len[t] for t in towers]
+            input_names = [[input_names[i] for i in t] for t in towers]
+        else:
+            labels_st = list2sparsetensor(labels, dtype=np.int32)
+
+        return inputs, labels_st, inputs_seq_len, input_names
@@ -53,7 +53,7 @@ class TestReadDatasetAttention(unittest.TestCase):
                     label_type[5:7] + '.txt'
                 map_fn = num2phone
 
-            mini_batch = dataset.next_batch(session=sess)
+            mini_batch = dataset.next_batch()
 
             iter_per_epoch = int(dataset.data_num /
                                  (batch_size * num_gpu)) + 1
@@ -8,11 +8,14 @@ from __future__ import print_function
 import re
 import sys
 import unittest
+import numpy as np
 import tensorflow as tf
 
 sys.path.append('../../')
 sys.path.append('../../../')
 from read_dataset_ctc import DataSet
+from utils.sampler import EpochSampler
+from utils.batch_buffer import BatchBuffer
 from utils.labels.character import num2char
 from utils.labels.phone import num2phone
 from utils.sparsetensor import sparsetensor2list
@@ -33,6 +36,30 @@ class TestReadDatasetCTC(unittest.TestCase):
         # For many GPUs
         self.check_reading(label_type='character', num_gpu=7, is_sorted=True)
 
+    def test_release_on_close(self):
+        # A dataset of the same frame num without the corpus on disk
+        data_num, batch_size, input_size = 8, 4, 3
+        dataset = DataSet.__new__(DataSet)
+        dataset.data_type = 'dev'
+        dataset.input_size = input_size
+        dataset.num_gpu = 1
+        dataset.input_list = np.array(
+            [np.ones((5, input_size), dtype=np.float32)] * data_num)
+        dataset.label_list = np.array([np.array([1, 2])] * data_num)
+        dataset.input_paths = np.array(
+            ['utt%d.npy' % i for i in range(data_num)])
+        dataset.batch_buffer = BatchBuffer(max_buffer_num=1)
+        dataset.sampler = EpochSampler(data_num, batch_size, mode='sorted')
+
+        # Stop reading partway like evaluation, which drops the generator
+        mini_batch = dataset.next_batch()
+        inputs = next(mini_batch)[0]
+        mini_batch.close()
+
+        # The buffer of the last mini-batch is reused
+        inputs_next = dataset.make_batch(list(range(batch_size)))[0]
+        self.assertTrue(np.may_share_memory(inputs, inputs_next))
+
     def check_reading(self, label_type, num_gpu, is_sorted):
         print('----- label_type: ' + label_type + ', num_gpu: ' +
               str(num_gpu) + ', is_sorted: ' + str(is_sorted) + ' -----')
@@ -55,7 +82,7 @@ class TestReadDatasetCTC(unittest.TestCase):
                     label_type[5:7] + '.txt'
                 map_fn = num2phone
 
-            mini_batch = dataset.next_batch(session=sess)
+            mini_batch = dataset.next_batch()
 
             iter_per_epoch = int(dataset.data_num /
                                  (batch_size * num_gpu)) + 1
@@ -46,7 +46,7 @@ class TestReadDatasetMultitaskCTC(unittest.TestCase):
             map_file_path_char = '../metric/mapping_files/ctc/char2num.txt'
             map_file_path_phone = '../metric/mapping_files/ctc/phone2num_61.txt'
 
-            mini_batch = dataset.next_batch(session=sess)
+            mini_batch = dataset.next_batch()
 
             iter_per_epoch = int(dataset.data_num /
                                  (batch_size * num_gpu)) + 1
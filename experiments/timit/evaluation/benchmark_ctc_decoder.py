@@ -0,0 +1,209 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compare the NumPy prefix beam search with `tf.nn.ctc_beam_search_decoder`
+   on a trained CTC network (TIMIT corpus). Logits are computed once per
+   mini-batch, and only decoding is timed. LER is computed on labels of the
+   model (without mapping to 39 phones).
+   An n-gram LM in the ARPA format can be fused into the NumPy decoder. The
+   LM is word-level for character models if its tokens are words, and
+   otherwise its tokens are labels of the model.
+   Usage:
+       python benchmark_ctc_decoder.py path_to_saved_model [beam_width]
+           [num_workers] [cutoff_top_n] [path_to_arpa] [lm_weight]
+           [insertion_bonus]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import tensorflow as tf
+import yaml
+
+sys.path.append('../')
+sys.path.append('../../')
+sys.path.append('../../../')
+from data.read_dataset_ctc import DataSet
+from models.ctc.load_model import load
+from utils.ctc_decoder import BatchPrefixBeamSearch, split_posteriors
+from utils.ngram_lm import load_arpa, NgramScorer
+from utils.labels.vocabulary import load_vocabulary
+from utils.edit_distance import ErrorCounter
+from utils.sparsetensor import sparsetensor2list
+
+OUTPUT_SIZE = {'phone61': 61, 'phone48': 48, 'phone39': 39, 'character': 30}
+
+
+def benchmark(network, dataset, beam_width, num_workers, cutoff_top_n=None,
+              scorer=None, eval_batch_size=32):
+    """Decode the dataset by both decoders.
+    Args:
+        network: model to restore
+        dataset: An instance of a `Dataset` class
+        beam_width: int, beam width of both decoders
+        num_workers: int, the number of worker processes of the NumPy decoder
+        cutoff_top_n: int, the number of labels to extend prefixes by in each
+            frame (NumPy decoder only)
+        scorer: An instance of `NgramScorer` fused into the NumPy decoder
+        eval_batch_size: int, the batch size when decoding
+    Returns:
+        results: dictionary of decoder name => (LER, utterances per second)
+    """
+    network.inputs = tf.placeholder(
+        tf.float32,
+        shape=[None, None, network.input_size],
+        name='input')
+    network.inputs_seq_len = tf.placeholder(tf.int64,
+                                            shape=[None],
+                                            name='inputs_seq_len')
+    logits = network._build(network.inputs, network.inputs_seq_len)
+    decode_op = network.decoder(logits,
+                                network.inputs_seq_len,
+                                decode_type='beam_search',
+                                beam_width=beam_width)
+    posteriors_op = network.posteriors(logits)
+    # Lengths of logits (reduced when the model subsamples frames)
+    output_seq_len_op = network.output_seq_len(network.inputs_seq_len)
+    saver = tf.train.Saver()
+
+    batch_decoder = BatchPrefixBeamSearch(blank_index=network.num_classes - 1,
+                                          beam_width=beam_width,
+                                          cutoff_top_n=cutoff_top_n,
+                                          scorer=scorer,
+                                          num_workers=num_workers,
+                                          use_process=True)
+    error_counters = {'tf': ErrorCounter(), 'numpy': ErrorCounter()}
+    durations = {'tf': 0., 'numpy': 0.}
+    utt_num = 0
+
+    with tf.Session() as sess:
+        ckpt = tf.train.get_checkpoint_state(network.model_dir)
+        if not ckpt:
+            raise ValueError('There are not any checkpoints.')
+        saver.restore(sess, ckpt.model_checkpoint_path)
+        print("Model restored: " + ckpt.model_checkpoint_path)
+
+        mini_batch = dataset.next_batch(batch_size=eval_batch_size)
+        while utt_num < dataset.data_num:
+            inputs, labels_true_st, inputs_seq_len, _ = next(mini_batch)
+            batch_size_each = len(inputs_seq_len)
+            labels_true = sparsetensor2list(labels_true_st, batch_size_each)
+
+            logits_value, posteriors, output_seq_len = sess.run(
+                [logits, posteriors_op, output_seq_len_op],
+                feed_dict={network.inputs: inputs,
+                           network.inputs_seq_len: inputs_seq_len,
+                           network.keep_prob_input: 1.0,
+                           network.keep_prob_hidden: 1.0})
+
+            # TensorFlow op (fed with the computed logits)
+            start_time = time.time()
+            labels_pred_st = sess.run(
+                decode_op, feed_dict={logits: logits_value,
+                                      network.inputs_seq_len: inputs_seq_len})
+            durations['tf'] += time.time() - start_time
+            error_counters['tf'].update(
+                labels_true, sparsetensor2list(labels_pred_st,
+                                               batch_size_each))
+
+            # NumPy prefix beam search
+            start_time = time.time()
+            labels_pred = batch_decoder.decode(
+                split_posteriors(posteriors, output_seq_len))
+            durations['numpy'] += time.time() - start_time
+            error_counters['numpy'].update(labels_true, labels_pred)
+
+            utt_num += batch_size_each
+
+    batch_decoder.close()
+    return dict((name, (error_counters[name].error_rate,
+                        utt_num / durations[name]))
+                for name in ['tf', 'numpy'])
+
+
+def load_scorer(arpa_path, label_type, lm_weight, insertion_bonus):
+    """Load an n-gram LM for the labels of the model.
+    Args:
+        arpa_path: path to the ARPA file
+        label_type: string, phone39 or phone48 or phone61 or character
+        lm_weight: A float value, the weight of the LM
+        insertion_bonus: A float value, the bonus per token
+    Returns:
+        An instance of `NgramScorer`
+    """
+    if label_type == 'character':
+        map_file_path = '../metric/mapping_files/ctc/char2num.txt'
+    else:
+        map_file_path = '../metric/mapping_files/ctc/phone2num_' + \
+            label_type[5:7] + '.txt'
+    vocab = load_vocabulary(map_file_path)
+    lm = load_arpa(arpa_path)
+    is_word_lm = label_type == 'character' and any(
+        len(token) > 1 for token in lm.tokens if not token.startswith('<'))
+    return NgramScorer(lm, vocab.labels, lm_weight=lm_weight,
+                       insertion_bonus=insertion_bonus,
+                       space_label='_' if is_word_lm else None)
+
+
+def main(model_path, beam_width=20, num_workers=4, cutoff_top_n=None,
+         arpa_path=None, lm_weight=0.5, insertion_bonus=0.):
+
+    # Load config file
+    with open(os.path.join(model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        corpus = config['corpus']
+        feature = config['feature']
+        param = config['param']
+
+    CTCModel = load(model_type=config['model_name'])
+    network = CTCModel(
+        batch_size=1,
+        input_size=feature['input_size'] * feature['num_stack'],
+        num_unit=param['num_unit'],
+        num_layer=param['num_layer'],
+        output_size=OUTPUT_SIZE[corpus['label_type']],
+        clip_grad=param['clip_grad'],
+        clip_activation=param['clip_activation'],
+        dropout_ratio_input=param['dropout_input'],
+        dropout_ratio_hidden=param['dropout_hidden'],
+        num_proj=param['num_proj'],
+        weight_decay=param['weight_decay'])
+    network.model_dir = model_path
+
+    dataset = DataSet(data_type='test', label_type=corpus['label_type'],
+                      batch_size=1,
+                      num_stack=feature['num_stack'],
+                      num_skip=feature['num_skip'],
+                      is_sorted=True)
+    scorer = None
+    if arpa_path is not None:
+        scorer = load_scorer(arpa_path, corpus['label_type'], lm_weight,
+                             insertion_bonus)
+    results = benchmark(network, dataset, beam_width, num_workers,
+                        cutoff_top_n=cutoff_top_n, scorer=scorer)
+    # NOTE: tf.nn.ctc_beam_search_decoder merges repeated labels in the
+    # output (merge_repeated=True), so LERs can differ slightly
+    for name, (ler, utt_per_sec) in sorted(results.items()):
+        print('%s: LER = %.3f %% / %.1f utt/sec' %
+              (name, ler * 100, utt_per_sec))
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) < 2 or len(args) > 8:
+        raise ValueError(
+            'Usage: python benchmark_ctc_decoder.py path_to_saved_model '
+            '[beam_width] [num_workers] [cutoff_top_n] [path_to_arpa] '
+            '[lm_weight] [insertion_bonus]')
+    main(model_path=args[1],
+         beam_width=int(args[2]) if len(args) >= 3 else 20,
+         num_workers=int(args[3]) if len(args) >= 4 else 4,
+         cutoff_top_n=int(args[4]) if len(args) >= 5 else None,
+         arpa_path=args[5] if len(args) >= 6 else None,
+         lm_weight=float(args[6]) if len(args) >= 7 else 0.5,
+         insertion_bonus=float(args[7]) if len(args) == 8 else 0.)
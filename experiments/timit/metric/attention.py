@@ -7,21 +7,18 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import re
-import Levenshtein
 from tqdm import tqdm
 
-from utils.labels.character import num2char
-from utils.labels.phone import num2phone, phone2num
-from .mapping import map_to_39phone
-from .edit_distance import compute_edit_distance
-from utils.sparsetensor import list2sparsetensor
+from utils.labels.vocabulary import load_vocabulary
+from .mapping import fold_to_39phone
+from utils.edit_distance import ErrorCounter, remove_labels
 from utils.exception_func import exception
 
 
 @exception
 def do_eval_per(session, decode_op, per_op, network, dataset, label_type,
-                eval_batch_size=None, is_progressbar=False, is_multitask=False):
+                eval_batch_size=None, is_progressbar=False, is_multitask=False,
+                num_workers=1):
     """Evaluate trained model by Phone Error Rate.
     Args:
         session: session of training model
@@ -33,8 +30,9 @@ def do_eval_per(session, decode_op, per_op, network, dataset, label_type,
         eval_batch_size: int, the batch size when evaluating the model
         is_progressbar: if True, visualize the progressbar
         is_multitask: if True, evaluate the multitask model
+        num_workers: int, the number of processes to compute edit distance
     Returns:
-        per_global: An average of PER
+        per_global: PER of the dataset, (S + I + D) / N by 39 phones
     """
     if label_type not in ['phone39', 'phone48', 'phone61']:
         raise ValueError(
@@ -45,6 +43,8 @@ def do_eval_per(session, decode_op, per_op, network, dataset, label_type,
     else:
         batch_size = dataset.batch_size
 
+    data_label_type = dataset.label_type
+
     # Change to training mode
     # network.is_training = True
 
@@ -52,21 +52,22 @@ def do_eval_per(session, decode_op, per_op, network, dataset, label_type,
     iteration = int(num_examples / batch_size)
     if (num_examples / batch_size) != int(num_examples / batch_size):
         iteration += 1
-    per_global = 0
+    error_counter = ErrorCounter(num_workers=num_workers)
 
     phone2num_map_file_path = '../metric/mapping_files/attention/phone2num_' + \
         label_type[5:7] + '.txt'
     phone2num_39_map_file_path = '../metric/mapping_files/attention/phone2num_39.txt'
     phone2phone_map_file_path = '../metric/mapping_files/phone2phone.txt'
+    mini_batch = dataset.next_batch(batch_size=batch_size)
     iterator = tqdm(range(iteration)) if is_progressbar else range(iteration)
     for step in iterator:
         # Create feed dictionary for next mini batch
         if not is_multitask:
-            inputs, labels_true, inputs_seq_len, labels_seq_len, _ = dataset.next_batch(
-                batch_size=batch_size)
+            inputs, labels_true, inputs_seq_len, labels_seq_len, _ = next(
+                mini_batch)
         else:
-            inputs, _, labels_true, inputs_seq_len, labels_seq_len, _ = dataset.next_batch(
-                batch_size=batch_size)
+            inputs, _, labels_true, inputs_seq_len, labels_seq_len, _ = next(
+                mini_batch)
 
         feed_dict = {
             network.inputs: inputs,
@@ -79,44 +80,33 @@ def do_eval_per(session, decode_op, per_op, network, dataset, label_type,
 
         batch_size_each = len(labels_true)
 
-        if False:
-            # Evaluate by 61 phones
-            per_local = session.run(per_op, feed_dict=feed_dict)
-            per_global += per_local * batch_size_each
+        # Evaluate by 39 phones
+        predicted_ids = session.run(decode_op, feed_dict=feed_dict)
 
-        else:
-            # Evaluate by 39 phones
-            predicted_ids = session.run(decode_op, feed_dict=feed_dict)
-            for i_batch in range(batch_size_each):
-                # Convert num to phone (list of phone strings)
-                phone_pred_seq = num2phone(
-                    predicted_ids[i_batch], phone2num_map_file_path)
-                phone_pred_list = phone_pred_seq.split(' ')
-
-                # Mapping to 39 phones (list of phone strings)
-                phone_pred_list = map_to_39phone(
-                    phone_pred_list, label_type, phone2phone_map_file_path)
-
-                # Convert phone to num (list of phone indices)
-                phone_pred_list = phone2num(
-                    phone_pred_list, phone2num_39_map_file_path)
-                predicted_ids[i_batch] = phone_pred_list
-
-            # Compute edit distance
-            labels_true_st = list2sparsetensor(labels_true)
-            labels_pred_st = list2sparsetensor(predicted_ids)
-            per_local = compute_edit_distance(
-                session, labels_true_st, labels_pred_st)
-            per_global += per_local * batch_size_each
-
-    per_global /= dataset.data_num
+        # Remove padding of the ground truth
+        labels_true = [labels_true[i_batch][:labels_seq_len[i_batch]]
+                       for i_batch in range(batch_size_each)]
+
+        # Mapping to 39 phones
+        predicted_ids = fold_to_39phone(
+            predicted_ids, label_type, phone2num_map_file_path,
+            phone2num_39_map_file_path, phone2phone_map_file_path)
+        if data_label_type != 'phone39':
+            labels_true = fold_to_39phone(
+                labels_true, data_label_type, phone2num_map_file_path,
+                phone2num_39_map_file_path, phone2phone_map_file_path)
+
+        # Compute edit distance
+        error_counter.update(labels_true, predicted_ids)
+
+    per_global = error_counter.error_rate
 
     return per_global
 
 
 @exception
 def do_eval_cer(session, decode_op, network, dataset, eval_batch_size=None,
-                is_progressbar=False, is_multitask=False):
+                is_progressbar=False, is_multitask=False, num_workers=1):
     """Evaluate trained model by Character Error Rate.
     Args:
         session: session of training model
@@ -126,8 +116,9 @@ def do_eval_cer(session, decode_op, network, dataset, eval_batch_size=None,
         eval_batch_size: int, batch size when evaluating the model
         is_progressbar: if True, visualize the progressbar
         is_multitask: if True, evaluate the multitask model
+        num_workers: int, the number of processes to compute edit distance
     Return:
-        cer_mean: An average of CER
+        cer_mean: CER of the dataset, (S + I + D) / N
     """
     if eval_batch_size is not None:
         batch_size = eval_batch_size
@@ -141,18 +132,23 @@ def do_eval_cer(session, decode_op, network, dataset, eval_batch_size=None,
     iteration = int(num_examples / batch_size)
     if (num_examples / batch_size) != int(num_examples / batch_size):
         iteration += 1
-    cer_sum = 0
+    error_counter = ErrorCounter(num_workers=num_workers)
 
     map_file_path = '../metric/mapping_files/attention/char2num.txt'
+    vocab = load_vocabulary(map_file_path)
+    silence_index = vocab.label2num['_']
+    sos_index = vocab.label2num['<']
+    eos_index = vocab.label2num['>']
+    mini_batch = dataset.next_batch(batch_size=batch_size)
     iterator = tqdm(range(iteration)) if is_progressbar else range(iteration)
     for step in iterator:
         # Create feed dictionary for next mini batch
         if not is_multitask:
-            inputs, labels_true, inputs_seq_len, labels_seq_len, _ = dataset.next_batch(
-                batch_size=batch_size)
+            inputs, labels_true, inputs_seq_len, labels_seq_len, _ = next(
+                mini_batch)
         else:
-            inputs, labels_true, _, inputs_seq_len, labels_seq_len, _ = dataset.next_batch(
-                batch_size=batch_size)
+            inputs, labels_true, _, inputs_seq_len, labels_seq_len, _ = next(
+                mini_batch)
 
         feed_dict = {
             network.inputs: inputs,
@@ -165,23 +161,19 @@ def do_eval_cer(session, decode_op, network, dataset, eval_batch_size=None,
 
         batch_size_each = len(labels_true)
         predicted_ids = session.run(decode_op, feed_dict=feed_dict)
-        for i_batch in range(batch_size_each):
 
-            # Convert from list to string
-            str_true = num2char(labels_true[i_batch], map_file_path)
-            str_pred = num2char(predicted_ids[i_batch], map_file_path)
+        # Remove padding of the ground truth
+        labels_true = [labels_true[i_batch][:labels_seq_len[i_batch]]
+                       for i_batch in range(batch_size_each)]
 
-            # Remove silence(_) labels
-            str_true = re.sub(r'[_<>]+', "", str_true)
-            str_pred = re.sub(r'[_]+', "", str_pred)
-            print(str_true)
-            print(str_pred)
+        # Remove silence(_) & <SOS>, <EOS> labels
+        labels_true = remove_labels(
+            labels_true, [silence_index, sos_index, eos_index])
+        predicted_ids = remove_labels(predicted_ids, [silence_index])
 
-            # Compute edit distance
-            cer_each = Levenshtein.distance(
-                str_pred, str_true) / len(list(str_true))
-            cer_sum += cer_each
+        # Compute edit distance
+        error_counter.update(labels_true, predicted_ids)
 
-    cer_mean = cer_sum / dataset.data_num
+    cer_mean = error_counter.error_rate
 
     return cer_mean
@@ -7,6 +7,42 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import numpy as np
+
+from utils.labels.vocabulary import load_vocabulary
+
+
+# Mapping dictionaries & folding tables which have been loaded
+_phone_maps = {}
+_fold_tables = {}
+
+
+def load_phone_map(label_type, map_file_path):
+    """Load the mapping from 61 or 48 phones to 39 phones. The mapping file
+       is read only at the first call for each path.
+    Args:
+        label_type: phone48 or phone61
+        map_file_path: path to the mapping file
+    Returns:
+        map_dict: dictionary from phones to 39 phones (q is mapped to '')
+    """
+    key = (label_type, map_file_path)
+    if key not in _phone_maps:
+        map_dict = {}
+        with open(map_file_path) as f:
+            for line in f:
+                line = line.strip().split()
+                if label_type == 'phone61':
+                    if line[1] != 'nan':
+                        map_dict[line[0]] = line[2]
+                    else:
+                        map_dict[line[0]] = ''
+                elif label_type == 'phone48':
+                    if line[1] != 'nan':
+                        map_dict[line[1]] = line[2]
+        _phone_maps[key] = map_dict
+    return _phone_maps[key]
+
 
 def map_to_39phone(phone_list, label_type, map_file_path):
     """Map from 61 or 48 phones to 39 phones.
@@ -20,26 +56,85 @@ def map_to_39phone(phone_list, label_type, map_file_path):
     if label_type == 'phone39':
         return phone_list
 
-    # Read a mapping file
-    map_dict = {}
-    with open(map_file_path) as f:
-        for line in f:
-            line = line.strip().split()
-            if label_type == 'phone61':
-                if line[1] != 'nan':
-                    map_dict[line[0]] = line[2]
-                else:
-                    map_dict[line[0]] = ''
-            elif label_type == 'phone48':
-                if line[1] != 'nan':
-                    map_dict[line[1]] = line[2]
-
-    # Map to 39 phones
-    for i in range(len(phone_list)):
-        phone_list[i] = map_dict[phone_list[i]]
-
-    # Ignore q (only if 61 phones)
-    while '' in phone_list:
-        phone_list.remove('')
-
-    return phone_list
+    map_dict = load_phone_map(label_type, map_file_path)
+
+    # Map to 39 phones, and ignore q (only if 61 phones)
+    return [map_dict[phone] for phone in phone_list
+            if map_dict[phone] != '']
+
+
+def load_fold_table(label_type, phone2num_map_file_path,
+                    phone2num_39_map_file_path, phone2phone_map_file_path):
+    """Load the table to fold phone indices to 39 phone indices. Labels
+       which are not phones (ex. <, > in attention mapping files) are mapped
+       to the same labels in 39 phones.
+    Args:
+        label_type: phone48 or phone61
+        phone2num_map_file_path: path to the mapping file of label_type
+        phone2num_39_map_file_path: path to the mapping file of 39 phones
+        phone2phone_map_file_path: path to the mapping file between phones
+    Returns:
+        fold_table: A numpy array. `fold_table[index]` is the index of the
+            39 phone, or -1 if the phone is removed (q)
+    """
+    key = (label_type, phone2num_map_file_path, phone2num_39_map_file_path,
+           phone2phone_map_file_path)
+    if key not in _fold_tables:
+        vocab = load_vocabulary(phone2num_map_file_path)
+        vocab_39 = load_vocabulary(phone2num_39_map_file_path)
+        map_dict = load_phone_map(label_type, phone2phone_map_file_path)
+
+        fold_table = np.full((len(vocab.labels),), -1, dtype=np.int64)
+        for num, label in vocab.num2label.items():
+            if label in map_dict:
+                label_39 = map_dict[label]
+                if label_39 != '':
+                    fold_table[num] = vocab_39.label2num[label_39]
+            else:
+                fold_table[num] = vocab_39.label2num[label]
+        _fold_tables[key] = fold_table
+    return _fold_tables[key]
+
+
+def fold_to_39phone(labels, label_type, phone2num_map_file_path,
+                    phone2num_39_map_file_path, phone2phone_map_file_path,
+                    padded_value=-1):
+    """Map a mini-batch of phone indices from 61 or 48 phones to 39 phones
+       at once.
+    Args:
+        labels: list of phone indices of each utterance, or a numpy array
+            of size `[batch_size, max_label_len]` padded with padded_value
+        label_type: phone39 or phone48 or phone61
+        phone2num_map_file_path: path to the mapping file of label_type
+        phone2num_39_map_file_path: path to the mapping file of 39 phones
+        phone2phone_map_file_path: path to the mapping file between phones
+        padded_value: int, the value used for padding
+    Returns:
+        labels_39: list of numpy arrays of 39 phone indices
+    """
+    if isinstance(labels, np.ndarray) and labels.ndim == 2:
+        mask = np.cumprod(labels != padded_value, axis=1).astype(bool)
+        label_lens = mask.sum(axis=1)
+        values = labels[mask]
+    else:
+        label_lens = np.array([len(label) for label in labels],
+                              dtype=np.int64)
+        values = np.concatenate(
+            [np.asarray(label, dtype=np.int64).reshape(-1)
+             for label in labels] + [np.zeros((0,), dtype=np.int64)])
+    values = values.astype(np.int64)
+
+    if label_type != 'phone39':
+        fold_table = load_fold_table(
+            label_type, phone2num_map_file_path, phone2num_39_map_file_path,
+            phone2phone_map_file_path)
+        values = fold_table[values]
+
+        # Remove q
+        mask = values >= 0
+        utt_indices = np.repeat(np.arange(len(label_lens)), label_lens)
+        label_lens = np.bincount(utt_indices[mask],
+                                 minlength=len(label_lens))
+        values = values[mask]
+
+    return np.split(values, np.cumsum(label_lens)[:-1])
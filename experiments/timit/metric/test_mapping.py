@@ -0,0 +1,70 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../')
+sys.path.append('../../')
+from metric.mapping import map_to_39phone, fold_to_39phone
+from utils.labels.phone import num2phone, phone2num
+
+
+class TestMapping(unittest.TestCase):
+
+    def check_folding(self, model_type, label_type):
+        phone2num_map_file_path = 'mapping_files/' + model_type + \
+            '/phone2num_' + label_type[5:7] + '.txt'
+        phone2num_39_map_file_path = 'mapping_files/' + model_type + \
+            '/phone2num_39.txt'
+        phone2phone_map_file_path = 'mapping_files/phone2phone.txt'
+        phone_num = int(label_type[5:7])
+
+        np.random.seed(0)
+        labels = [np.random.randint(0, phone_num, size=(label_len,))
+                  for label_len in [1, 5, 20, 33]]
+        labels_39 = fold_to_39phone(
+            labels, label_type, phone2num_map_file_path,
+            phone2num_39_map_file_path, phone2phone_map_file_path)
+
+        for label, label_39 in zip(labels, labels_39):
+            # Mapping through phone strings
+            phone_list = num2phone(label, phone2num_map_file_path).split(' ')
+            phone_list = map_to_39phone(phone_list, label_type,
+                                        phone2phone_map_file_path)
+            self.assertEqual(
+                phone2num(phone_list, phone2num_39_map_file_path),
+                label_39.tolist())
+
+        # Padded labels
+        labels_padded = np.full((len(labels), 40), -1, dtype=int)
+        for i_batch, label in enumerate(labels):
+            labels_padded[i_batch, :len(label)] = label
+        for label_39, label_39_padded in zip(labels_39, fold_to_39phone(
+                labels_padded, label_type, phone2num_map_file_path,
+                phone2num_39_map_file_path, phone2phone_map_file_path)):
+            self.assertEqual(label_39.tolist(), label_39_padded.tolist())
+
+    def test(self):
+        for model_type in ['ctc', 'attention']:
+            self.check_folding(model_type, 'phone61')
+            self.check_folding(model_type, 'phone48')
+
+    def test_q(self):
+        # q is removed, and the utterance of only q becomes empty
+        q_index = phone2num(['q'], 'mapping_files/ctc/phone2num_61.txt')[0]
+        labels_39 = fold_to_39phone(
+            [[q_index], [q_index, 0, q_index]], 'phone61',
+            'mapping_files/ctc/phone2num_61.txt',
+            'mapping_files/ctc/phone2num_39.txt',
+            'mapping_files/phone2phone.txt')
+        self.assertEqual([[], [0]], [label.tolist() for label in labels_39])
+
+
+if __name__ == '__main__':
+    unittest.main()
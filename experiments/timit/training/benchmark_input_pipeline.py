@@ -0,0 +1,155 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compare training throughput of CTC network between input pipelines
+   (feed_dict & queue) (TIMIT corpus).
+   Usage:
+       python benchmark_input_pipeline.py path_to_config [num_steps]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import tensorflow as tf
+import yaml
+
+sys.path.append('../')
+sys.path.append('../../')
+sys.path.append('../../../')
+from data.read_dataset_ctc import DataSet
+from models.ctc.load_model import load
+from utils.sampler import sampler_params_from_config
+from utils.input_pipeline import QueueInputPipeline
+
+OUTPUT_SIZE = {'phone61': 61, 'phone48': 48, 'phone39': 39, 'character': 30}
+
+
+def benchmark(config, dataset, input_pipeline, num_steps, num_warmup=10):
+    """Measure training steps per second.
+    Args:
+        config: dictionary of the config file
+        dataset: An instance of a `Dataset` class
+        input_pipeline: string, feed_dict or queue
+        num_steps: int, the number of steps to measure
+        num_warmup: int, the number of steps before measurement
+    Returns:
+        steps_per_sec: A float value
+        mean_queue_size: A float value, mean number of mini-batches in the
+            queue at each step (0 in feed_dict)
+    """
+    feature = config['feature']
+    param = config['param']
+
+    with tf.Graph().as_default():
+        CTCModel = load(model_type=config['model_name'])
+        network = CTCModel(
+            batch_size=param['batch_size'],
+            input_size=feature['input_size'] * feature['num_stack'],
+            num_unit=param['num_unit'],
+            num_layer=param['num_layer'],
+            output_size=OUTPUT_SIZE[config['corpus']['label_type']],
+            parameter_init=param['weight_init'],
+            clip_grad=param['clip_grad'],
+            clip_activation=param['clip_activation'],
+            dropout_ratio_input=param['dropout_input'],
+            dropout_ratio_hidden=param['dropout_hidden'],
+            num_proj=param['num_proj'],
+            weight_decay=param['weight_decay'])
+
+        if input_pipeline == 'queue':
+            pipeline = QueueInputPipeline(dataset)
+            pipeline.feed_network(network)
+        else:
+            network.inputs = tf.placeholder(
+                tf.float32,
+                shape=[None, None, network.input_size],
+                name='input')
+            indices_pl = tf.placeholder(tf.int64, name='indices')
+            values_pl = tf.placeholder(tf.int32, name='values')
+            shape_pl = tf.placeholder(tf.int64, name='shape')
+            network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+            network.inputs_seq_len = tf.placeholder(tf.int64,
+                                                    shape=[None],
+                                                    name='inputs_seq_len')
+
+        loss_op, _ = network.compute_loss(network.inputs,
+                                          network.labels,
+                                          network.inputs_seq_len)
+        train_op = network.train(loss_op,
+                                 optimizer=param['optimizer'],
+                                 learning_rate_init=param['learning_rate'],
+                                 is_scheduled=False)
+        init_op = tf.global_variables_initializer()
+
+        with tf.Session() as sess:
+            sess.run(init_op)
+            coord = tf.train.Coordinator()
+            threads = tf.train.start_queue_runners(sess=sess, coord=coord)
+
+            mini_batch = dataset.next_batch()
+            queue_size_sum = 0
+            for step in range(num_warmup + num_steps):
+                if step == num_warmup:
+                    start_time = time.time()
+
+                feed_dict = {
+                    network.keep_prob_input: network.dropout_ratio_input,
+                    network.keep_prob_hidden: network.dropout_ratio_hidden
+                }
+                if input_pipeline == 'feed_dict':
+                    inputs, labels_st, inputs_seq_len, _ = next(mini_batch)
+                    feed_dict[network.inputs] = inputs
+                    feed_dict[network.labels] = labels_st
+                    feed_dict[network.inputs_seq_len] = inputs_seq_len
+                    sess.run(train_op, feed_dict=feed_dict)
+                else:
+                    _, queue_size = sess.run(
+                        [train_op, pipeline.queue_size], feed_dict=feed_dict)
+                    if step >= num_warmup:
+                        queue_size_sum += queue_size
+
+            duration = time.time() - start_time
+
+            coord.request_stop()
+            coord.join(threads)
+
+    return num_steps / duration, queue_size_sum / num_steps
+
+
+def main(config_path, num_steps=100):
+
+    # Load a config file (.yml)
+    with open(config_path, "r") as f:
+        config = yaml.load(f)
+        corpus = config['corpus']
+        feature = config['feature']
+        param = config['param']
+
+    dataset = DataSet(data_type='train', label_type=corpus['label_type'],
+                      batch_size=param['batch_size'],
+                      num_stack=feature['num_stack'],
+                      num_skip=feature['num_skip'],
+                      is_sorted=True,
+                      sampler_params=sampler_params_from_config(param))
+
+    for input_pipeline in ['feed_dict', 'queue']:
+        # Start from the same mini-batch
+        dataset.sampler.reset(seed=0)
+        steps_per_sec, mean_queue_size = benchmark(
+            config, dataset, input_pipeline, num_steps)
+        print('%s: %.3f steps/sec (mean queue size: %.2f)' %
+              (input_pipeline, steps_per_sec, mean_queue_size))
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) not in [2, 3]:
+        raise ValueError(
+            'Usage: python benchmark_input_pipeline.py path_to_config '
+            '[num_steps]')
+    main(config_path=args[1],
+         num_steps=int(args[2]) if len(args) == 3 else 100)
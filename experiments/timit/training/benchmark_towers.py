@@ -0,0 +1,173 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Measure scaling of data-parallel training of CTC network with towers
+   (TIMIT corpus). Each tower processes batch_size utterances per step, and
+   the throughput with num_tower towers is compared with one tower.
+   Usage:
+       python benchmark_towers.py path_to_config num_tower [gpu|cpu]
+           [num_steps]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+import yaml
+
+sys.path.append('../')
+sys.path.append('../../')
+sys.path.append('../../../')
+from data.read_dataset_ctc import DataSet
+from models.ctc.load_model import load
+from utils.sampler import sampler_params_from_config
+from utils.tower import CTCTowers, tower_devices, tower_session_config
+from utils.tower import tower_step_times, parallel_efficiency
+from utils.tower import scaling_efficiency
+
+OUTPUT_SIZE = {'phone61': 61, 'phone48': 48, 'phone39': 39, 'character': 30}
+
+
+def benchmark(config, dataset, num_tower, device_type, num_steps,
+              num_warmup=10, intra_op_threads=None):
+    """Measure training throughput with towers.
+    Args:
+        config: dictionary of the config file
+        dataset: An instance of a `Dataset` class whose num_gpu is num_tower
+        num_tower: int, the number of towers
+        device_type: string, gpu or cpu
+        num_steps: int, the number of steps to measure
+        num_warmup: int, the number of steps before measurement
+        intra_op_threads: int, the number of intra-op threads of each tower
+            on CPU devices
+    Returns:
+        frames_per_sec: A float value
+        tower_times: A numpy array of size `[num_tower]`, mean busy seconds
+            of each tower in a step
+        efficiency: A float value, mean parallel efficiency of steps
+    """
+    feature = config['feature']
+    param = config['param']
+
+    devices, ps_device = tower_devices(num_tower, device_type)
+    with tf.Graph().as_default(), tf.device(ps_device):
+        CTCModel = load(model_type=config['model_name'])
+        network = CTCModel(
+            batch_size=param['batch_size'],
+            input_size=feature['input_size'] * feature['num_stack'],
+            num_unit=param['num_unit'],
+            num_layer=param['num_layer'],
+            output_size=OUTPUT_SIZE[config['corpus']['label_type']],
+            parameter_init=param['weight_init'],
+            clip_grad=param['clip_grad'],
+            clip_activation=param['clip_activation'],
+            dropout_ratio_input=param['dropout_input'],
+            dropout_ratio_hidden=param['dropout_hidden'],
+            num_proj=param['num_proj'],
+            weight_decay=param['weight_decay'])
+
+        towers = CTCTowers(network, devices=devices, ps_device=ps_device)
+        train_op = network.train_towers(
+            towers.losses, towers.weights,
+            optimizer=param['optimizer'],
+            learning_rate_init=param['learning_rate'],
+            is_scheduled=False)
+        init_op = tf.global_variables_initializer()
+
+        config_proto = tower_session_config(num_tower, device_type,
+                                            intra_op_threads)
+        run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+        with tf.Session(config=config_proto) as sess:
+            sess.run(init_op)
+
+            mini_batch = dataset.next_batch()
+            frame_num, duration = 0, 0.
+            tower_times, efficiencies = [], []
+            step = 0
+            while step < num_warmup + num_steps:
+                inputs, labels_st, inputs_seq_len, _ = next(mini_batch)
+                if num_tower > 1 and len(inputs) < num_tower:
+                    continue
+                if num_tower == 1:
+                    # The reader does not split mini-batches
+                    inputs, labels_st, inputs_seq_len = \
+                        [inputs], [labels_st], [inputs_seq_len]
+                feed_dict = towers.feed_dict(inputs, labels_st,
+                                             inputs_seq_len)
+                feed_dict[network.keep_prob_input] = \
+                    network.dropout_ratio_input
+                feed_dict[network.keep_prob_hidden] = \
+                    network.dropout_ratio_hidden
+
+                if step < num_warmup:
+                    sess.run(train_op, feed_dict=feed_dict)
+                else:
+                    # Tracing slows steps down, so throughput is measured
+                    # in untraced steps
+                    start_time = time.time()
+                    sess.run(train_op, feed_dict=feed_dict)
+                    duration += time.time() - start_time
+                    frame_num += sum(np.sum(x) for x in inputs_seq_len)
+
+                    run_metadata = tf.RunMetadata()
+                    start_time = time.time()
+                    sess.run(train_op, feed_dict=feed_dict,
+                             options=run_options, run_metadata=run_metadata)
+                    step_time = time.time() - start_time
+                    tower_times_step = tower_step_times(run_metadata,
+                                                        devices)
+                    tower_times.append(tower_times_step)
+                    efficiencies.append(
+                        parallel_efficiency(tower_times_step, step_time))
+                step += 1
+
+    return (frame_num / duration, np.mean(tower_times, axis=0),
+            np.mean(efficiencies))
+
+
+def main(config_path, num_tower, device_type='gpu', num_steps=50):
+
+    # Load a config file (.yml)
+    with open(config_path, "r") as f:
+        config = yaml.load(f)
+        corpus = config['corpus']
+        feature = config['feature']
+        param = config['param']
+
+    frames_per_sec = {}
+    for num_tower_i in sorted(set([1, num_tower])):
+        dataset = DataSet(data_type='train', label_type=corpus['label_type'],
+                          batch_size=param['batch_size'],
+                          num_stack=feature['num_stack'],
+                          num_skip=feature['num_skip'],
+                          is_sorted=True, num_gpu=num_tower_i,
+                          sampler_params=sampler_params_from_config(param))
+        # Start from the same mini-batch
+        dataset.sampler.reset(seed=0)
+        frames_per_sec[num_tower_i], tower_times, efficiency = benchmark(
+            config, dataset, num_tower_i, device_type, num_steps,
+            intra_op_threads=param.get('intra_op_threads'))
+        print('%d %s tower(s): %.1f frames/sec' %
+              (num_tower_i, device_type, frames_per_sec[num_tower_i]))
+        print('  tower step time: %s sec (parallel efficiency: %.3f)' %
+              (' '.join('%.3f' % t for t in tower_times), efficiency))
+
+    print('scaling efficiency: %.3f' % scaling_efficiency(
+        frames_per_sec[num_tower], frames_per_sec[1], num_tower))
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) not in [3, 4, 5]:
+        raise ValueError(
+            'Usage: python benchmark_towers.py path_to_config num_tower '
+            '[gpu|cpu] [num_steps]')
+    main(config_path=args[1],
+         num_tower=int(args[2]),
+         device_type=args[3] if len(args) >= 4 else 'gpu',
+         num_steps=int(args[4]) if len(args) == 5 else 50)
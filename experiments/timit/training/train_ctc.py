@@ -24,10 +24,13 @@ from metric.ctc import do_eval_per, do_eval_cer
 from utils.directory import mkdir, mkdir_join
 from utils.parameter import count_total_parameters
 from utils.csv import save_loss, save_ler
+from utils.sampler import sampler_params_from_config
+from utils.input_pipeline import QueueInputPipeline
 
 
 def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
-             label_type, num_stack, num_skip):
+             label_type, num_stack, num_skip, sampler_params=None,
+             input_pipeline='feed_dict', make_stacked_cache=False):
     """Run training. If target labels are phone, the model is evaluated by PER
     with 39 phones.
     Args:
@@ -40,46 +43,66 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
         label_type: string, phone39 or phone48 or phone61 or character
         num_stack: int, the number of frames to stack
         num_skip: int, the number of frames to skip
+        sampler_params: dict of the setting of batching for training data.
+            If None, batches of batch_size sorted by frame num.
+        input_pipeline: string, feed_dict or queue. If queue, training data
+            is fed through a queue in the graph (see utils/input_pipeline.py)
+        make_stacked_cache: if True, save stacked frames on disk at the
+            first run (see utils/stacked_cache.py)
     """
+    if input_pipeline not in ['feed_dict', 'queue']:
+        raise ValueError('input_pipeline is "feed_dict" or "queue".')
+
     # Load dataset
     train_data = DataSet(data_type='train', label_type=label_type,
                          batch_size=batch_size,
                          num_stack=num_stack, num_skip=num_skip,
-                         is_sorted=True)
+                         is_sorted=True, sampler_params=sampler_params,
+                         make_stacked_cache=make_stacked_cache)
     if label_type == 'character':
         dev_data = DataSet(data_type='dev', label_type='character',
                            batch_size=batch_size,
                            num_stack=num_stack, num_skip=num_skip,
-                           is_sorted=False)
+                           is_sorted=False,
+                           make_stacked_cache=make_stacked_cache)
         test_data = DataSet(data_type='test', label_type='character',
                             batch_size=batch_size,
                             num_stack=num_stack, num_skip=num_skip,
-                            is_sorted=False)
+                            is_sorted=False,
+                            make_stacked_cache=make_stacked_cache)
     else:
         dev_data = DataSet(data_type='dev', label_type=label_type,
                            batch_size=1,
                            num_stack=num_stack, num_skip=num_skip,
-                           is_sorted=False)
+                           is_sorted=False,
+                           make_stacked_cache=make_stacked_cache)
         test_data = DataSet(data_type='test', label_type='phone39',
                             batch_size=1,
                             num_stack=num_stack, num_skip=num_skip,
-                            is_sorted=False)
+                            is_sorted=False,
+                            make_stacked_cache=make_stacked_cache)
 
     # Tell TensorFlow that the model will be built into the default graph
     with tf.Graph().as_default():
 
-        # Define placeholders
-        network.inputs = tf.placeholder(
-            tf.float32,
-            shape=[None, None, network.input_size],
-            name='input')
-        indices_pl = tf.placeholder(tf.int64, name='indices')
-        values_pl = tf.placeholder(tf.int32, name='values')
-        shape_pl = tf.placeholder(tf.int64, name='shape')
-        network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
-        network.inputs_seq_len = tf.placeholder(tf.int64,
-                                                shape=[None],
-                                                name='inputs_seq_len')
+        if input_pipeline == 'queue':
+            # Dequeue training data in the graph. Dev & test data are fed
+            # to the same tensors by feed_dict.
+            pipeline = QueueInputPipeline(train_data)
+            pipeline.feed_network(network)
+        else:
+            # Define placeholders
+            network.inputs = tf.placeholder(
+                tf.float32,
+                shape=[None, None, network.input_size],
+                name='input')
+            indices_pl = tf.placeholder(tf.int64, name='indices')
+            values_pl = tf.placeholder(tf.int32, name='values')
+            shape_pl = tf.placeholder(tf.int64, name='shape')
+            network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+            network.inputs_seq_len = tf.placeholder(tf.int64,
+                                                    shape=[None],
+                                                    name='inputs_seq_len')
 
         # Add to the graph each operation (including model definition)
         loss_op, logits = network.compute_loss(network.inputs,
@@ -127,31 +150,36 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
             # Initialize parameters
             sess.run(init_op)
 
+            # Start loading training data in background
+            coord = tf.train.Coordinator()
+            threads = tf.train.start_queue_runners(sess=sess, coord=coord)
+
             # Train model
-            iter_per_epoch = int(train_data.data_num / batch_size)
-            train_step = train_data.data_num / batch_size
-            if train_step != int(train_step):
-                iter_per_epoch += 1
+            iter_per_epoch = train_data.sampler.num_batches
             max_steps = iter_per_epoch * epoch_num
             start_time_train = time.time()
             start_time_epoch = time.time()
             start_time_step = time.time()
             error_best = 1
+            mini_batch_train = train_data.next_batch()
+            mini_batch_dev = dev_data.next_batch()
             for step in range(max_steps):
 
                 # Create feed dictionary for next mini batch (train)
-                inputs, labels_st, inputs_seq_len, _ = train_data.next_batch()
                 feed_dict_train = {
-                    network.inputs: inputs,
-                    network.labels: labels_st,
-                    network.inputs_seq_len: inputs_seq_len,
                     network.keep_prob_input: network.dropout_ratio_input,
                     network.keep_prob_hidden: network.dropout_ratio_hidden,
                     network.lr: learning_rate
                 }
+                if input_pipeline == 'feed_dict':
+                    inputs, labels_st, inputs_seq_len, _ = next(
+                        mini_batch_train)
+                    feed_dict_train[network.inputs] = inputs
+                    feed_dict_train[network.labels] = labels_st
+                    feed_dict_train[network.inputs_seq_len] = inputs_seq_len
 
                 # Create feed dictionary for next mini batch (dev)
-                inputs, labels_st, inputs_seq_len, _ = dev_data.next_batch()
+                inputs, labels_st, inputs_seq_len, _ = next(mini_batch_dev)
                 feed_dict_dev = {
                     network.inputs: inputs,
                     network.labels: labels_st,
@@ -161,7 +189,16 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                 }
 
                 # Update parameters
-                sess.run(train_op, feed_dict=feed_dict_train)
+                if input_pipeline == 'queue' and (step + 1) % 10 == 0:
+                    # Keep the dequeued mini-batch to compute loss & ler
+                    _, inputs, labels_st, inputs_seq_len = sess.run(
+                        [train_op, network.inputs, network.labels,
+                         network.inputs_seq_len], feed_dict=feed_dict_train)
+                    feed_dict_train[network.inputs] = inputs
+                    feed_dict_train[network.labels] = labels_st
+                    feed_dict_train[network.inputs_seq_len] = inputs_seq_len
+                else:
+                    sess.run(train_op, feed_dict=feed_dict_train)
 
                 if (step + 1) % 10 == 0:
 
@@ -269,6 +306,9 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
             duration_train = time.time() - start_time_train
             print('Total time: %.3f hour' % (duration_train / 3600))
 
+            coord.request_stop()
+            coord.join(threads)
+
             # Save train & dev loss, ler
             save_loss(csv_steps, csv_loss_train, csv_loss_dev,
                       save_path=network.model_dir)
@@ -353,7 +393,10 @@ def main(config_path):
              epoch_num=param['num_epoch'],
              label_type=corpus['label_type'],
              num_stack=feature['num_stack'],
-             num_skip=feature['num_skip'])
+             num_skip=feature['num_skip'],
+             sampler_params=sampler_params_from_config(param),
+             input_pipeline=param.get('input_pipeline') or 'feed_dict',
+             make_stacked_cache=bool(feature.get('stacked_cache')))
     sys.stdout = sys.__stdout__
 
 
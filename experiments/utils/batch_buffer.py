@@ -0,0 +1,107 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Reusable buffers for padded mini-batches. Mini-batches of similar
+   shapes share preallocated memory instead of allocating new arrays at
+   every step.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+import numpy as np
+
+
+class BatchBuffer(object):
+    """Pool of buffers for padded mini-batches. A buffer is in use from
+       `empty` until the returned array is passed to `release`, and only
+       released buffers are reused, so mini-batches which are not released
+       are never overwritten.
+    Args:
+        dtype: data type of the buffers
+        frame_bucket: int, the max frame num of a mini-batch is rounded up
+            to a multiple of this, so that mini-batches with similar lengths
+            share buffers
+        max_buffer_num: int, the maximum number of buffers kept for each
+            shape. If all of them are in use, a new array is allocated
+            without being kept.
+    """
+
+    def __init__(self, dtype=np.float32, frame_bucket=16, max_buffer_num=4):
+        self.dtype = np.dtype(dtype)
+        self.frame_bucket = frame_bucket
+        self.max_buffer_num = max_buffer_num
+        # key => list of [buffer, is_in_use]
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.allocated_num = 0
+        self.reused_num = 0
+
+    def empty(self, batch_size, max_frame_num, input_size):
+        """Return an uninitialized C-contiguous array of size
+           `[batch_size, max_frame_num, input_size]`. Pass it to `release`
+           when it is no longer used.
+        Args:
+            batch_size: int, the size of mini-batch
+            max_frame_num: int, the max frame num in mini-batch
+            input_size: int, the dimensions of input vectors
+        Returns:
+            A numpy array which is a view of a buffer
+        """
+        bucket_frame_num = -(-max_frame_num // self.frame_bucket) * \
+            self.frame_bucket
+        key = (batch_size, bucket_frame_num, input_size)
+        size = batch_size * max_frame_num * input_size
+
+        with self._lock:
+            buffers = self._buffers.setdefault(key, [])
+            buf = None
+            for entry in buffers:
+                if not entry[1]:
+                    buf = entry[0]
+                    entry[1] = True
+                    self.reused_num += 1
+                    break
+            if buf is None:
+                buf = np.empty(
+                    (batch_size * bucket_frame_num * input_size,),
+                    dtype=self.dtype)
+                self.allocated_num += 1
+                if len(buffers) < self.max_buffer_num:
+                    buffers.append([buf, True])
+
+        return buf[:size].reshape((batch_size, max_frame_num, input_size))
+
+    def zeros(self, batch_size, max_frame_num, input_size):
+        """Return an array filled with 0 (see `empty`)."""
+        inputs = self.empty(batch_size, max_frame_num, input_size)
+        inputs.fill(0)
+        return inputs
+
+    def release(self, inputs):
+        """Let the buffer of an array returned by `empty` be reused. Arrays
+           which were not kept in the pool (or are not numpy arrays) are
+           ignored.
+        Args:
+            inputs: A numpy array returned by `empty` or `zeros`, or a view
+                of it
+        """
+        if not isinstance(inputs, np.ndarray):
+            return
+        with self._lock:
+            for buffers in self._buffers.values():
+                for entry in buffers:
+                    if np.may_share_memory(inputs, entry[0]):
+                        entry[1] = False
+                        return
+
+    @property
+    def nbytes(self):
+        """The total size of kept buffers in bytes."""
+        with self._lock:
+            return sum(entry[0].nbytes for buffers in self._buffers.values()
+                       for entry in buffers)
@@ -0,0 +1,339 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Incremental CTC decoders on posteriors in NumPy. Posteriors are fed
+   chunk by chunk (ex. from streaming inference), and the hypothesis is
+   available after each chunk. The blank is the last class as in
+   `tf.nn.ctc_loss`.
+   Mini-batches of posteriors (ex. `ctcBase.posteriors`) are decoded in
+   parallel by `BatchPrefixBeamSearch`.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+import functools
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+import numpy as np
+
+LOG_ZERO = -np.inf
+
+
+class GreedyDecoder(object):
+    """Best path decoding. The most probable class of each frame is
+       selected, and then repeated labels and blanks are removed.
+    Args:
+        blank_index: int, the index of the blank class
+    """
+
+    def __init__(self, blank_index):
+        self.blank_index = blank_index
+        self.reset()
+
+    def reset(self):
+        """Start a new utterance."""
+        self.labels = []
+        self.frame_num = 0
+        # The frame index where the first label is emitted
+        self.first_token_frame = None
+        # The class of the last frame, to merge repeated labels across
+        # chunks
+        self._prev_index = None
+
+    def step(self, posteriors):
+        """Decode the next chunk.
+        Args:
+            posteriors: A numpy array of size `[chunk_len, num_classes]`
+        Returns:
+            labels: list of labels emitted in this chunk
+        """
+        emitted = []
+        for i, index in enumerate(np.argmax(posteriors, axis=1).tolist()):
+            if index != self.blank_index and index != self._prev_index:
+                emitted.append(index)
+                if self.first_token_frame is None:
+                    self.first_token_frame = self.frame_num + i
+            self._prev_index = index
+        self.frame_num += len(posteriors)
+        self.labels.extend(emitted)
+        return emitted
+
+    def best(self):
+        """Return the labels decoded so far."""
+        return list(self.labels)
+
+
+class PrefixBeamSearchDecoder(object):
+    """CTC prefix beam search. Probabilities of each prefix ending in blank
+       and in a non-blank label are kept in log space, and all alignments
+       of a prefix are merged.
+    Args:
+        blank_index: int, the index of the blank class
+        beam_width: int, the number of prefixes kept after each frame
+        cutoff_top_n: int, if set, prefixes are extended only by the top n
+            labels of each frame
+        blank_skip_threshold: float, if set, frames whose blank posterior
+            is this or more are treated as blank only, and prefixes are not
+            extended
+        scorer: An object to score labels appended to prefixes, which has
+            `score(prefix, label)` returning a log-domain score (ex. weighted
+            LM log probability plus insertion bonus). The score of a prefix
+            is the sum of scores of its labels, and it is added to the CTC
+            log probability to rank prefixes. It may also have
+            `final_score(prefix)` to score the end of prefixes (see
+            `nbest`). If None, only CTC is used (see utils/ngram_lm.py for
+            an n-gram LM).
+    """
+
+    def __init__(self, blank_index, beam_width=10, cutoff_top_n=None,
+                 blank_skip_threshold=None, scorer=None):
+        if beam_width < 1:
+            raise ValueError('beam_width must be more than 0.')
+        self.blank_index = blank_index
+        self.beam_width = beam_width
+        self.cutoff_top_n = cutoff_top_n
+        self.blank_skip_threshold = blank_skip_threshold
+        self.scorer = scorer
+        self.reset()
+
+    def reset(self):
+        """Start a new utterance."""
+        # prefix => [log prob ending in blank, log prob ending in non-blank]
+        self.beams = {(): [0., LOG_ZERO]}
+        # prefix => score by the scorer
+        self.scores = {(): 0.}
+        self.frame_num = 0
+        # The frame index where the best prefix becomes non-empty
+        self.first_token_frame = None
+
+    def step(self, posteriors):
+        """Decode the next chunk.
+        Args:
+            posteriors: A numpy array of size `[chunk_len, num_classes]`
+        """
+        with np.errstate(divide='ignore'):
+            log_probs = np.log(posteriors)
+        for i in range(len(log_probs)):
+            if self.blank_skip_threshold is not None and \
+                    posteriors[i, self.blank_index] >= \
+                    self.blank_skip_threshold:
+                self._step_blank(log_probs[i, self.blank_index])
+            else:
+                self._step_frame(log_probs[i])
+            if self.first_token_frame is None and len(self.best()) > 0:
+                self.first_token_frame = self.frame_num
+            self.frame_num += 1
+
+    def _step_blank(self, log_prob_blank):
+        """Advance prefixes by a blank frame without extending them.
+        Args:
+            log_prob_blank: A float value, log posterior of blank
+        """
+        for log_ps in self.beams.values():
+            log_ps[0] = _logaddexp(log_ps[0], log_ps[1]) + log_prob_blank
+            log_ps[1] = LOG_ZERO
+
+    def _candidate_labels(self, log_prob):
+        """Select labels to extend prefixes by.
+        Args:
+            log_prob: A numpy array of size `[num_classes]`
+        Returns:
+            list of labels
+        """
+        if self.cutoff_top_n is None or \
+                self.cutoff_top_n >= len(log_prob) - 1:
+            return [c for c in range(len(log_prob)) if c != self.blank_index]
+        # The top n + 1 classes include the top n labels
+        top_n = np.argpartition(-log_prob,
+                                self.cutoff_top_n)[:self.cutoff_top_n + 1]
+        top_n = top_n[np.argsort(-log_prob[top_n])]
+        labels = [c for c in top_n.tolist() if c != self.blank_index]
+        return labels[:self.cutoff_top_n]
+
+    def _step_frame(self, log_prob):
+        """Extend prefixes by a frame.
+        Args:
+            log_prob: A numpy array of size `[num_classes]`
+        """
+        next_beams = {}
+
+        def _add(prefix, i, value):
+            if value == LOG_ZERO:
+                # Unreachable prefix
+                return
+            if prefix not in next_beams:
+                next_beams[prefix] = [LOG_ZERO, LOG_ZERO]
+            next_beams[prefix][i] = _logaddexp(next_beams[prefix][i], value)
+
+        labels = self._candidate_labels(log_prob)
+        log_prob = log_prob.tolist()
+        for prefix, (log_pb, log_pnb) in self.beams.items():
+            log_p = _logaddexp(log_pb, log_pnb)
+            # Blank
+            _add(prefix, 0, log_p + log_prob[self.blank_index])
+            last = prefix[-1] if len(prefix) > 0 else None
+            for c in labels:
+                if c == last:
+                    # Repeated labels are merged unless separated by blank
+                    _add(prefix, 1, log_pnb + log_prob[c])
+                    _add(prefix + (c,), 1, log_pb + log_prob[c])
+                else:
+                    _add(prefix + (c,), 1, log_p + log_prob[c])
+
+        # Scores of new prefixes
+        for prefix in next_beams:
+            if prefix not in self.scores:
+                self.scores[prefix] = self.scores[prefix[:-1]] + (
+                    self.scorer.score(prefix[:-1], prefix[-1])
+                    if self.scorer is not None else 0.)
+
+        self.beams = dict(sorted(
+            next_beams.items(), key=lambda x: -self._total(x[0], x[1])
+        )[:self.beam_width])
+        # Forget scores of pruned prefixes
+        self.scores = dict((prefix, self.scores[prefix])
+                           for prefix in self.beams)
+
+    def _total(self, prefix, log_ps):
+        """Return the log probability plus the score of a prefix."""
+        return _logaddexp(*log_ps) + self.scores[prefix]
+
+    def nbest(self, n=None, is_final=False):
+        """Return the most probable prefixes.
+        Args:
+            n: int, the number of prefixes. If None, all prefixes in the beam
+            is_final: if True, the utterance has ended, and the end of
+                prefixes is scored by `scorer.final_score(prefix)` if the
+                scorer has it (ex. the last word and </s> of an LM)
+        Returns:
+            list of tuples of (labels, log probability plus score)
+        """
+        final_score = getattr(self.scorer, 'final_score', None) \
+            if is_final else None
+        results = sorted(
+            ((list(prefix), self._total(prefix, log_ps) +
+              (final_score(prefix) if final_score is not None else 0.))
+             for prefix, log_ps in self.beams.items()),
+            key=lambda x: -x[1])
+        return results if n is None else results[:n]
+
+    def best(self, is_final=False):
+        """Return labels of the most probable prefix.
+        Args:
+            is_final: see `nbest`
+        """
+        return self.nbest(1, is_final=is_final)[0][0]
+
+
+def _logaddexp(a, b):
+    """`np.logaddexp` for Python floats, which is faster for scalars."""
+    if a == LOG_ZERO:
+        return b
+    if b == LOG_ZERO:
+        return a
+    if a > b:
+        return a + math.log1p(math.exp(b - a))
+    return b + math.log1p(math.exp(a - b))
+
+
+def split_posteriors(posteriors, inputs_seq_len):
+    """Split posteriors of `ctcBase.posteriors` into utterances.
+    Args:
+        posteriors: A numpy array of size `[max_time * batch_size, num_classes]`
+            (time-major)
+        inputs_seq_len: list of length of inputs of size `[batch_size]`
+    Returns:
+        list of numpy arrays of size `[frame_num, num_classes]`
+    """
+    batch_size = len(inputs_seq_len)
+    posteriors = posteriors.reshape((-1, batch_size, posteriors.shape[-1]))
+    return [posteriors[:int(inputs_seq_len[i_batch]), i_batch]
+            for i_batch in range(batch_size)]
+
+
+# Parameters of decoders shared with worker processes (set by
+# `_init_worker`)
+_worker_params = None
+
+
+def _init_worker(params):
+    global _worker_params
+    _worker_params = params
+
+
+def _decode_utterance(posteriors, params=None):
+    decoder = PrefixBeamSearchDecoder(
+        **(params if params is not None else _worker_params))
+    decoder.step(posteriors)
+    return decoder.best(is_final=True)
+
+
+class BatchPrefixBeamSearch(object):
+    """Decode utterances of mini-batches by prefix beam search with a pool
+       of workers. Each utterance is decoded by a worker.
+    Args:
+        blank_index: int, the index of the blank class
+        beam_width: int, the number of prefixes kept after each frame
+        cutoff_top_n: int, see `PrefixBeamSearchDecoder`
+        blank_skip_threshold: float, see `PrefixBeamSearchDecoder`
+        scorer: see `PrefixBeamSearchDecoder`. This is shared with worker
+            threads, or copied to worker processes once.
+        num_workers: int, the number of workers. If 1, utterances are decoded
+            in the calling thread.
+        use_process: if True, use worker processes instead of threads.
+            Decoding is CPU-bound in Python, so threads do not run in
+            parallel but processes do.
+    """
+
+    def __init__(self, blank_index, beam_width=10, cutoff_top_n=None,
+                 blank_skip_threshold=None, scorer=None, num_workers=1,
+                 use_process=True):
+        if num_workers < 1:
+            raise ValueError('num_workers must be more than 0.')
+        self.params = {'blank_index': blank_index,
+                       'beam_width': beam_width,
+                       'cutoff_top_n': cutoff_top_n,
+                       'blank_skip_threshold': blank_skip_threshold,
+                       'scorer': scorer}
+        self.num_workers = num_workers
+        self.use_process = use_process
+
+        self._pool = None
+        if num_workers > 1:
+            if use_process:
+                self._pool = Pool(num_workers, initializer=_init_worker,
+                                  initargs=(self.params,))
+            else:
+                self._pool = ThreadPool(num_workers)
+
+    def decode(self, posteriors, inputs_seq_len=None):
+        """Decode a mini-batch.
+        Args:
+            posteriors: A numpy array of size
+                `[batch_size, max_time, num_classes]`, or list of numpy arrays
+                of size `[frame_num, num_classes]`
+            inputs_seq_len: list of length of inputs of size `[batch_size]`.
+                If None, all frames of posteriors are used.
+        Returns:
+            labels_pred: list of decoded labels of size `[batch_size]`
+        """
+        if inputs_seq_len is not None:
+            posteriors = [posteriors[i_batch][:int(inputs_seq_len[i_batch])]
+                          for i_batch in range(len(inputs_seq_len))]
+        if self._pool is None:
+            return [_decode_utterance(x, self.params) for x in posteriors]
+        if self.use_process:
+            return self._pool.map(_decode_utterance, posteriors)
+        return self._pool.map(
+            functools.partial(_decode_utterance, params=self.params),
+            posteriors)
+
+    def close(self):
+        """Stop workers."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
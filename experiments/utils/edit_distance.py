@@ -0,0 +1,169 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compute edit distance between sequences of label indices in a batch.
+   Substitutions, insertions and deletions are counted separately, and
+   error rates of a corpus are computed from the sums of them.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+from multiprocessing import Pool
+import numpy as np
+import Levenshtein
+
+if sys.version_info[0] == 2:
+    chr = unichr  # NOQA
+
+# Indices are encoded as characters below the surrogate range
+MAX_INDEX = 0xD800
+
+
+def _to_string(label):
+    """Encode a sequence of indices as a string.
+    Args:
+        label: list or numpy array of indices
+    Returns:
+        string of the same length
+    """
+    label = np.asarray(label, dtype=np.int64).reshape(-1)
+    if len(label) > 0 and (label.min() < 0 or label.max() >= MAX_INDEX):
+        raise ValueError('Indices must be in [0, %d).' % MAX_INDEX)
+    return u''.join(map(chr, label.tolist()))
+
+
+def edit_operations(label_true, label_pred):
+    """Count edit operations from a ground truth to a prediction.
+    Args:
+        label_true: list or numpy array of indices of the ground truth
+        label_pred: list or numpy array of indices of the prediction
+    Returns:
+        substitution: int, the number of substitutions
+        insertion: int, the number of insertions
+        deletion: int, the number of deletions
+    """
+    substitution, insertion, deletion = 0, 0, 0
+    for op, _, _ in Levenshtein.editops(_to_string(label_true),
+                                        _to_string(label_pred)):
+        if op == 'replace':
+            substitution += 1
+        elif op == 'insert':
+            insertion += 1
+        else:
+            deletion += 1
+    return substitution, insertion, deletion
+
+
+def _edit_operations_batch(labels):
+    labels_true, labels_pred = labels
+    return [edit_operations(label_true, label_pred)
+            for label_true, label_pred in zip(labels_true, labels_pred)]
+
+
+def batch_edit_operations(labels_true, labels_pred, num_workers=1,
+                          chunk_size=256):
+    """Count edit operations of each utterance in a batch.
+    Args:
+        labels_true: list of indices of the ground truth of each utterance
+        labels_pred: list of indices of the prediction of each utterance
+        num_workers: int, if more than 1, count in worker processes
+        chunk_size: int, the number of utterances sent to a worker at once
+    Returns:
+        A numpy array of size `[batch_size, 3]`, the numbers of
+            substitutions, insertions and deletions
+    """
+    if len(labels_true) != len(labels_pred):
+        raise ValueError('The numbers of ground truths and predictions '
+                         'are not the same.')
+    if len(labels_true) == 0:
+        return np.zeros((0, 3), dtype=np.int64)
+
+    if num_workers <= 1 or len(labels_true) <= chunk_size:
+        ops = _edit_operations_batch((labels_true, labels_pred))
+    else:
+        chunks = [(labels_true[i:i + chunk_size],
+                   labels_pred[i:i + chunk_size])
+                  for i in range(0, len(labels_true), chunk_size)]
+        pool = Pool(num_workers)
+        try:
+            ops = sum(pool.map(_edit_operations_batch, chunks), [])
+        finally:
+            pool.close()
+            pool.join()
+    return np.array(ops, dtype=np.int64).reshape(-1, 3)
+
+
+class ErrorCounter(object):
+    """Accumulate edit operations over a corpus.
+    Args:
+        num_workers: int, if more than 1, count in worker processes
+    """
+
+    def __init__(self, num_workers=1):
+        self.num_workers = num_workers
+        self.substitution = 0
+        self.insertion = 0
+        self.deletion = 0
+        self.label_num = 0
+        self.utt_num = 0
+
+    def update(self, labels_true, labels_pred):
+        """Add utterances.
+        Args:
+            labels_true: list of indices of the ground truth of each
+                utterance
+            labels_pred: list of indices of the prediction of each utterance
+        Returns:
+            A numpy array of size `[batch_size, 3]`, the numbers of
+                substitutions, insertions and deletions of each utterance
+        """
+        ops = batch_edit_operations(labels_true, labels_pred,
+                                    num_workers=self.num_workers)
+        self.substitution += int(ops[:, 0].sum())
+        self.insertion += int(ops[:, 1].sum())
+        self.deletion += int(ops[:, 2].sum())
+        self.label_num += sum(len(label) for label in labels_true)
+        self.utt_num += len(labels_true)
+        return ops
+
+    @property
+    def error_num(self):
+        return self.substitution + self.insertion + self.deletion
+
+    @property
+    def error_rate(self):
+        """(S + I + D) / N, where N is the number of labels of ground
+           truths. This is WER, CER or PER depending on the labels."""
+        return self.error_num / max(self.label_num, 1)
+
+    def rates(self):
+        """Return error rates of each type.
+        Returns:
+            dictionary of error, substitution, insertion, deletion rates
+        """
+        label_num = max(self.label_num, 1)
+        return {'error': self.error_rate,
+                'substitution': self.substitution / label_num,
+                'insertion': self.insertion / label_num,
+                'deletion': self.deletion / label_num}
+
+
+def remove_labels(labels, removed_indices):
+    """Remove labels (ex. silence) from each utterance.
+    Args:
+        labels: list of indices of each utterance
+        removed_indices: list of indices to remove
+    Returns:
+        list of numpy arrays of indices
+    """
+    label_lens = np.array([len(label) for label in labels], dtype=np.int64)
+    values = np.concatenate(
+        [np.asarray(label, dtype=np.int64).reshape(-1) for label in labels] +
+        [np.zeros((0,), dtype=np.int64)])
+    mask = np.logical_not(np.isin(values, removed_indices))
+    utt_indices = np.repeat(np.arange(len(labels)), label_lens)
+    label_lens = np.bincount(utt_indices[mask], minlength=len(labels))
+    return np.split(values[mask], np.cumsum(label_lens)[:-1])
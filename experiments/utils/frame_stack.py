@@ -6,10 +6,11 @@ from __future__ import division
 from __future__ import print_function
 
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 from tqdm import tqdm
 
 
-def stack_frame(input_list, input_paths, frame_num_dict, num_stack, num_skip, is_progressbar=False):
+def stack_frame(input_list, input_paths, frame_num_dict, num_stack, num_skip, is_progressbar=False, dtype=None):
     """Stack & skip some frames. This implementation is based on
        https://arxiv.org/abs/1507.06947.
            Sak, Haşim, et al.
@@ -24,13 +25,13 @@ def stack_frame(input_list, input_paths, frame_num_dict, num_stack, num_skip, is
         num_stack: int, the number of frames to stack
         num_skip: int, the number of frames to skip
         is_progressbar: if True, visualize progressbar
+        dtype: data type of the stacked inputs. If None, the same as inputs.
     Returns:
         stacked_input_list: list of frame-stacked inputs
     """
     if num_stack < num_skip:
         raise ValueError('Error: skip must be less than stack.')
 
-    input_size = input_list[0].shape[1]
     utt_num = len(input_paths)
 
     # Setting for progressbar
@@ -41,53 +42,105 @@ def stack_frame(input_list, input_paths, frame_num_dict, num_stack, num_skip, is
         # Per utterance
         input_name = input_paths[i_utt].split('/')[-1].split('.')[0]
         frame_num = frame_num_dict[input_name]
-        frame_num_decimated = frame_num / num_skip
-        if frame_num_decimated != int(frame_num_decimated):
-            frame_num_decimated += 1
-        frame_num_decimated = int(frame_num_decimated)
-
-        stacked_frames = np.zeros(
-            (frame_num_decimated, input_size * num_stack))
-        stack_count = 0  # counter for stacked_frames
-        stack = []
-        for i_frame, frame in enumerate(input_list[i_utt]):
-            #####################
-            # final frame
-            #####################
-            if i_frame == len(input_list[i_utt]) - 1:
-                # Stack the final frame
-                stack.append(frame)
-
-                while stack_count != int(frame_num_decimated):
-                    # Concatenate stacked frames
-                    for i_stack in range(len(stack)):
-                        stacked_frames[stack_count][input_size *
-                                                    i_stack:input_size * (i_stack + 1)] = stack[i_stack]
-                    stack_count += 1
-
-                    # Delete some frames to skip
-                    for _ in range(num_skip):
-                        if len(stack) != 0:
-                            stack.pop(0)
-
-            ########################
-            # first & middle frames
-            ########################
-            elif len(stack) < num_stack:
-                # Stack some frames until stack is filled
-                stack.append(frame)
-
-                if len(stack) == num_stack:
-                    # Concatenate stacked frames
-                    for i_stack in range(num_stack):
-                        stacked_frames[stack_count][input_size *
-                                                    i_stack:input_size * (i_stack + 1)] = stack[i_stack]
-                    stack_count += 1
-
-                    # Delete some frames to skip
-                    for _ in range(num_skip):
-                        stack.pop(0)
-
-        stacked_input_list.append(stacked_frames)
+        stacked_input_list.append(stack_frame_utt(
+            input_list[i_utt][:frame_num], num_stack, num_skip, dtype))
 
     return stacked_input_list
+
+
+def stack_frame_utt(inputs, num_stack, num_skip, dtype=None):
+    """Stack & skip frames of a single utterance.
+       The i-th output frame is the concatenation of the input frames
+       `[i * num_skip, i * num_skip + num_stack)`. Frames beyond the end of
+       the utterance are filled with 0, and the number of output frames is
+       `ceil(frame_num / num_skip)`.
+       When the utterance does not need padding, the result is a read-only
+       strided view of `inputs` and no data is copied.
+    Args:
+        inputs: A numpy array of size `[frame_num, input_size]`
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        dtype: data type of the stacked inputs. If None, the same as inputs.
+    Returns:
+        stacked_inputs: A numpy array of size
+            `[ceil(frame_num / num_skip), input_size * num_stack]`
+    """
+    if num_stack < num_skip:
+        raise ValueError('Error: skip must be less than stack.')
+
+    if dtype is not None:
+        inputs = inputs.astype(dtype, copy=False)
+
+    frame_num, input_size = inputs.shape
+    frame_num_decimated = -(-frame_num // num_skip)
+
+    # The number of frames needed to fill the last stacked frame
+    frame_num_padded = (frame_num_decimated - 1) * num_skip + num_stack
+
+    if frame_num_padded > frame_num:
+        padded_inputs = np.zeros((frame_num_padded, input_size),
+                                 dtype=inputs.dtype)
+        padded_inputs[:frame_num] = inputs
+        inputs = padded_inputs
+    else:
+        inputs = np.ascontiguousarray(inputs)
+
+    # Consecutive frames of a C-contiguous array are adjacent in memory, so
+    # each stacked frame is just a window of `input_size * num_stack` values
+    item_stride = inputs.strides[1]
+    return as_strided(inputs,
+                      shape=(frame_num_decimated, input_size * num_stack),
+                      strides=(inputs.strides[0] * num_skip, item_stride),
+                      writeable=False)
+
+
+def stack_frame_batch(inputs, num_stack, num_skip, inputs_seq_len=None):
+    """Stack & skip frames of a padded mini-batch at once.
+    Args:
+        inputs: A numpy array of size `[batch_size, max_time, input_size]`
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        inputs_seq_len: A numpy array of size `[batch_size]`. If given,
+            stacked frames which reach beyond the length of each utterance
+            are filled with 0 (the same as `stack_frame_utt`). If None,
+            `inputs` is expected to be padded with 0.
+    Returns:
+        stacked_inputs: A numpy array of size
+            `[batch_size, ceil(max_time / num_skip), input_size * num_stack]`
+        stacked_inputs_seq_len: A numpy array of size `[batch_size]`, or None
+            if `inputs_seq_len` is None
+    """
+    if num_stack < num_skip:
+        raise ValueError('Error: skip must be less than stack.')
+
+    batch_size, max_time, input_size = inputs.shape
+    max_time_decimated = -(-max_time // num_skip)
+    max_time_padded = (max_time_decimated - 1) * num_skip + num_stack
+
+    padded_inputs = np.zeros((batch_size, max_time_padded, input_size),
+                             dtype=inputs.dtype)
+    padded_inputs[:, :max_time] = inputs
+
+    stacked_inputs = as_strided(
+        padded_inputs,
+        shape=(batch_size, max_time_decimated, input_size * num_stack),
+        strides=(padded_inputs.strides[0],
+                 padded_inputs.strides[1] * num_skip,
+                 padded_inputs.strides[2]),
+        writeable=False)
+
+    if inputs_seq_len is None:
+        return stacked_inputs, None
+
+    inputs_seq_len = np.asarray(inputs_seq_len)
+    stacked_inputs_seq_len = -(-inputs_seq_len // num_skip)
+
+    # Index of the input frame placed in each slot of the stacked frames
+    frame_index = (np.arange(max_time_decimated)[:, None] * num_skip +
+                   np.arange(num_stack)[None, :])
+    mask = frame_index[None, :, :] < inputs_seq_len[:, None, None]
+    mask = np.repeat(mask, input_size, axis=2)
+    stacked_inputs = np.where(mask, stacked_inputs,
+                              np.zeros((), dtype=inputs.dtype))
+
+    return stacked_inputs, stacked_inputs_seq_len
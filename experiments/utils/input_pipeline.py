@@ -0,0 +1,130 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Input pipeline which resides in the graph for CTC models.
+   Mini-batches are loaded by queue runners in background threads, and
+   padding of inputs and construction of sparse labels are done in the
+   graph. A training step only dequeues a mini-batch which is ready, so it
+   never waits for feeding from Python.
+   The dataset must have `batch_indices(batch_size)` and
+   `utterances(indices)` (see timit/data/read_dataset_ctc.py).
+   This uses FIFOQueue and QueueRunner because requirements.txt pins
+   TensorFlow 1.1, which has neither tf.data nor tf.contrib.data.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+import numpy as np
+import tensorflow as tf
+
+
+def ragged2padded(values, seq_len, dense_size=None):
+    """Pad sequences concatenated along the first axis in the graph.
+    Args:
+        values: A tensor of size `[total_len]` or `[total_len, dense_size]`,
+            sequences concatenated in order
+        seq_len: A tensor of size `[batch_size]`, length of each sequence
+        dense_size: int, the size of the last axis of values. If None,
+            values are scalars.
+    Returns:
+        padded: A tensor of size `[batch_size, max_len]` or
+            `[batch_size, max_len, dense_size]` padded with 0
+        indices: A tensor of size `[total_len, 2]`, the indices of each
+            value in padded
+        dense_shape: A tensor of `[batch_size, max_len]`
+    """
+    mask = tf.sequence_mask(tf.cast(seq_len, tf.int32))
+    # tf.where returns indices in row-major order, which is the order of
+    # the concatenated values
+    indices = tf.where(mask)
+    dense_shape = tf.cast(tf.shape(mask), tf.int64)
+    if dense_size is None:
+        padded = tf.scatter_nd(indices, values, dense_shape)
+    else:
+        padded = tf.scatter_nd(
+            indices, values,
+            tf.concat([dense_shape, tf.constant([dense_size], tf.int64)], 0))
+    return padded, indices, dense_shape
+
+
+class QueueInputPipeline(object):
+    """Feed mini-batches of a dataset to a CTC model through a queue in the
+       graph. The queue runners are added to the `QUEUE_RUNNERS` collection,
+       so start them with `tf.train.start_queue_runners`.
+    Args:
+        dataset: An instance of a `Dataset` class
+        batch_size: int, the size of mini-batch. If None, use the
+            mini-batches planned by the sampler of the dataset.
+        capacity: int, the maximum number of mini-batches in the queue
+        num_threads: int, the number of threads to load mini-batches
+        name: string, the name of the name scope
+    """
+
+    def __init__(self, dataset, batch_size=None, capacity=8, num_threads=1,
+                 name='input_pipeline'):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.input_size = dataset.input_size
+        self._lock = threading.Lock()
+
+        dtypes = [tf.float32, tf.int64, tf.int32, tf.int64]
+        with tf.name_scope(name):
+            batch = tf.py_func(self._load_batch, [], dtypes,
+                               stateful=True, name='load_batch')
+            self.queue = tf.FIFOQueue(capacity, dtypes, name='batch_queue')
+            enqueue_op = self.queue.enqueue(batch)
+            tf.train.add_queue_runner(
+                tf.train.QueueRunner(self.queue, [enqueue_op] * num_threads))
+            self.queue_size = self.queue.size()
+
+            inputs, inputs_seq_len, labels, labels_seq_len = \
+                self.queue.dequeue()
+            inputs.set_shape([None, self.input_size])
+            inputs_seq_len.set_shape([None])
+            labels.set_shape([None])
+            labels_seq_len.set_shape([None])
+
+            # Padding
+            self.inputs, _, _ = ragged2padded(
+                inputs, inputs_seq_len, dense_size=self.input_size)
+            self.inputs_seq_len = inputs_seq_len
+
+            # Sparse labels
+            _, label_indices, label_shape = ragged2padded(
+                labels, labels_seq_len)
+            self.labels = tf.SparseTensor(label_indices, labels, label_shape)
+
+    def _load_batch(self):
+        """Load the next mini-batch. This is called in the queue runners.
+        Returns:
+            inputs: A numpy array of size `[total_frame_num, input_size]`
+            inputs_seq_len: A numpy array of size `[batch_size]`
+            labels: A numpy array of size `[total_label_num]`
+            labels_seq_len: A numpy array of size `[batch_size]`
+        """
+        with self._lock:
+            indices, _ = self.dataset.batch_indices(self.batch_size)
+        input_list, label_list, _ = self.dataset.utterances(indices)
+
+        inputs_seq_len = np.array([x.shape[0] for x in input_list],
+                                  dtype=np.int64)
+        labels_seq_len = np.array([len(x) for x in label_list],
+                                  dtype=np.int64)
+        inputs = np.concatenate(input_list).astype(np.float32)
+        labels = np.concatenate(
+            [np.asarray(x, dtype=np.int32).reshape(-1) for x in label_list])
+        return inputs, inputs_seq_len, labels, labels_seq_len
+
+    def feed_network(self, network):
+        """Set the dequeued tensors as the inputs of the network. Tensors of
+           the pipeline can still be overridden by feed_dict, so evaluation
+           functions which feed mini-batches work as they are.
+        Args:
+            network: An instance of a CTC model
+        """
+        network.inputs = self.inputs
+        network.labels = self.labels
+        network.inputs_seq_len = self.inputs_seq_len
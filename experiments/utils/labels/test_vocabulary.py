@@ -0,0 +1,49 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append('../../')
+from utils.labels.vocabulary import load_vocabulary
+from utils.labels.character import char2num, num2char
+from utils.labels.phone import phone2num, num2phone
+
+
+class TestVocabulary(unittest.TestCase):
+
+    def setUp(self):
+        f, self.map_file_path = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(f, 'w') as f:
+            for i, label in enumerate(['_', 'a', 'b', 'aa', 'sil']):
+                f.write(label + '  ' + str(i) + '\n')
+
+    def tearDown(self):
+        os.remove(self.map_file_path)
+
+    def test_vocabulary(self):
+        vocab = load_vocabulary(self.map_file_path)
+        self.assertEqual(5, len(vocab))
+        self.assertEqual([3, 0, 4], vocab.encode(['aa', '_', 'sil']).tolist())
+        self.assertEqual(['aa', '_', 'sil'], vocab.decode([3, 0, 4]))
+        self.assertEqual([], vocab.decode([]))
+        self.assertRaises(KeyError, vocab.decode, [5])
+
+        # Loaded only once
+        self.assertIs(vocab, load_vocabulary(self.map_file_path))
+
+    def test_convert(self):
+        self.assertEqual([1, 0, 2], char2num('a_b', self.map_file_path))
+        self.assertEqual('a_b', num2char([1, 0, 2], self.map_file_path))
+        self.assertEqual([3, 4], phone2num(['aa', 'sil'], self.map_file_path))
+        self.assertEqual('aa sil', num2phone([3, 4], self.map_file_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
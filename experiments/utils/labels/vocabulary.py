@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Vocabulary read from a mapping file. Each line of the mapping file is
+   `label index`. Mapping files are read only once per path.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+import numpy as np
+
+# Vocabularies which have been loaded
+_vocabularies = {}
+_lock = threading.Lock()
+
+
+class Vocabulary(object):
+    """Mapping between labels and indices.
+    Args:
+        map_file_path: path to the mapping file
+    """
+
+    def __init__(self, map_file_path):
+        self.map_file_path = map_file_path
+        self.label2num = {}
+        self.num2label = {}
+        with open(map_file_path, 'r') as f:
+            for line in f:
+                line = line.strip().split()
+                if len(line) == 0:
+                    continue
+                self.label2num[line[0]] = int(line[1])
+                self.num2label[int(line[1])] = line[0]
+
+        # Lookup table from index to label
+        self.labels = np.empty((max(self.num2label.keys()) + 1,),
+                               dtype=object)
+        for num, label in self.num2label.items():
+            self.labels[num] = label
+
+    def __len__(self):
+        return len(self.label2num)
+
+    def encode(self, labels):
+        """Convert from labels to indices.
+        Args:
+            labels: list of labels (string)
+        Returns:
+            A numpy array of indices
+        """
+        return np.array([self.label2num[label] for label in labels],
+                        dtype=np.int64)
+
+    def decode(self, nums):
+        """Convert from indices to labels.
+        Args:
+            nums: list or numpy array of indices
+        Returns:
+            list of labels (string)
+        """
+        nums = np.asarray(nums, dtype=np.int64)
+        if len(nums) > 0 and (nums.min() < 0 or
+                              nums.max() >= len(self.labels)):
+            raise KeyError('Index out of the vocabulary: %s' % nums)
+        labels = self.labels[nums]
+        if any(label is None for label in labels):
+            raise KeyError('Index out of the vocabulary: %s' % nums)
+        return labels.tolist()
+
+
+def load_vocabulary(map_file_path):
+    """Load a vocabulary. The mapping file is read only at the first call
+       for each path.
+    Args:
+        map_file_path: path to the mapping file
+    Returns:
+        An instance of `Vocabulary`
+    """
+    with _lock:
+        if map_file_path not in _vocabularies:
+            _vocabularies[map_file_path] = Vocabulary(map_file_path)
+        return _vocabularies[map_file_path]
@@ -0,0 +1,321 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Back-off n-gram language model read from an ARPA file, and the scorer to
+   fuse it into CTC prefix beam search (shallow fusion, see
+   utils/ctc_decoder.py).
+   N-grams are kept in a trie of sorted arrays: n-grams of each order are
+   sorted by their context and the last token, and children of a node of
+   order n are a contiguous range of order n + 1, found by binary search.
+   Usage:
+       lm = load_arpa('char_3gram.arpa')
+       scorer = NgramScorer(lm, vocab.labels, lm_weight=0.5,
+                            insertion_bonus=1.0)
+       decoder = PrefixBeamSearchDecoder(blank_index, beam_width=20,
+                                         scorer=scorer)
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+import numpy as np
+
+BOS = '<s>'
+EOS = '</s>'
+UNK = '<unk>'
+# log10 probability of unknown tokens when the LM has no <unk>
+UNK_LOG10_PROB = -100.
+
+
+class NgramLM(object):
+    """Back-off n-gram language model.
+    Args:
+        ngrams: list of dictionaries of each order (1-gram, 2-gram, ...)
+            key => tuple of tokens
+            value => tuple of (log10 probability, log10 back-off weight)
+        max_cache_size: int, the maximum number of cached lookups. The cache
+            is cleared when it grows beyond this.
+    """
+
+    def __init__(self, ngrams, max_cache_size=1000000):
+        if len(ngrams) == 0 or len(ngrams[0]) == 0:
+            raise ValueError('There are no unigrams.')
+        self.order = len(ngrams)
+        self.max_cache_size = max_cache_size
+
+        # Token ids are the indices of unigrams
+        self.tokens = [ngram[0] for ngram in ngrams[0].keys()]
+        self.token2id = dict((token, i) for i, token in enumerate(self.tokens))
+        self.unk_id = self.token2id.get(UNK)
+
+        # Arrays of each order. words[n][i] is the last token of the i-th
+        # (n+1)-gram, and children of the i-th (n+1)-gram are
+        # [child_start[n][i], child_start[n][i + 1]) of order n + 2.
+        self.words, self.probs, self.backoffs, self.child_start = \
+            [], [], [], []
+        parent_index = None
+        for n, ngrams_n in enumerate(ngrams):
+            entries = sorted(
+                (tuple(self.token2id[token] for token in ngram), values)
+                for ngram, values in ngrams_n.items())
+            if n > 0:
+                try:
+                    parents = np.array(
+                        [parent_index[ids[:-1]] for ids, _ in entries],
+                        dtype=np.int64)
+                except KeyError as e:
+                    raise ValueError('The context of a %d-gram is missing: %s'
+                                     % (n + 1, e))
+                self.child_start.append(np.searchsorted(
+                    parents, np.arange(len(self.words[-1]) + 1)))
+            self.words.append(np.array([ids[-1] for ids, _ in entries],
+                                       dtype=np.int32))
+            self.probs.append(np.array([values[0] for _, values in entries],
+                                       dtype=np.float32))
+            self.backoffs.append(np.array([values[1] for _, values in entries],
+                                          dtype=np.float32))
+            parent_index = dict((ids, i) for i, (ids, _) in enumerate(entries))
+
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def token_id(self, token):
+        """Return the id of a token, or the id of <unk> (None if the LM has
+           no <unk>) for unknown tokens."""
+        return self.token2id.get(token, self.unk_id)
+
+    def _find(self, ids):
+        """Find an n-gram in the trie.
+        Args:
+            ids: tuple of token ids
+        Returns:
+            int, the index of the n-gram in arrays of its order, or -1
+        """
+        node = ids[0]
+        for n in range(1, len(ids)):
+            start = self.child_start[n - 1][node]
+            end = self.child_start[n - 1][node + 1]
+            i = start + np.searchsorted(self.words[n][start:end], ids[n])
+            if i == end or self.words[n][i] != ids[n]:
+                return -1
+            node = i
+        return node
+
+    def begin_state(self):
+        """Return the state at the beginning of a sentence."""
+        bos_id = self.token2id.get(BOS)
+        return (bos_id,) if bos_id is not None and self.order > 1 else ()
+
+    def log10_prob(self, state, token_id):
+        """Compute the log10 probability of a token with back-off.
+        Args:
+            state: tuple of token ids of the context (see `begin_state`)
+            token_id: int, the id of the token. If None, the token is
+                unknown.
+        Returns:
+            log10_prob: A float value
+            next_state: tuple of token ids of the context of the next token
+        """
+        key = (state, token_id)
+        result = self._cache.get(key)
+        if result is not None:
+            return result
+
+        if token_id is None:
+            # Unknown token without <unk>. The context is reset.
+            result = (UNK_LOG10_PROB, ())
+        else:
+            log10_prob = 0.
+            context = state
+            while True:
+                node = self._find(context + (token_id,))
+                if node >= 0:
+                    log10_prob += float(self.probs[len(context)][node])
+                    break
+                # Back off to the shorter context
+                node = self._find(context)
+                if node >= 0:
+                    log10_prob += float(self.backoffs[len(context) - 1][node])
+                context = context[1:]
+            result = (log10_prob, self._next_state(state, token_id))
+
+        if len(self._cache) >= self.max_cache_size:
+            self._cache.clear()
+        self._cache[key] = result
+        return result
+
+    def _next_state(self, state, token_id):
+        """Return the longest context in the LM for the next token."""
+        if self.order == 1:
+            return ()
+        next_state = (state + (token_id,))[-(self.order - 1):]
+        while len(next_state) > 0 and self._find(next_state) < 0:
+            next_state = next_state[1:]
+        return next_state
+
+    def score_sentence(self, tokens, is_final=True):
+        """Compute the log10 probability of a sentence.
+        Args:
+            tokens: list of tokens
+            is_final: if True, include the probability of </s>
+        Returns:
+            A float value
+        """
+        state = self.begin_state()
+        log10_prob = 0.
+        for token in tokens:
+            log10_prob_token, state = self.log10_prob(
+                state, self.token_id(token))
+            log10_prob += log10_prob_token
+        if is_final and EOS in self.token2id:
+            log10_prob += self.log10_prob(state, self.token2id[EOS])[0]
+        return log10_prob
+
+
+def load_arpa(arpa_path):
+    """Load an n-gram language model in the ARPA format.
+    Args:
+        arpa_path: path to the ARPA file
+    Returns:
+        An instance of `NgramLM`
+    """
+    ngram_nums = []
+    ngrams = []
+    order = 0
+    with open(arpa_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            if line == '\\data\\':
+                order = 0
+            elif line == '\\end\\':
+                break
+            elif line.startswith('ngram ') and order == 0:
+                ngram_nums.append(int(line.split('=')[1]))
+            elif line.startswith('\\') and line.endswith('-grams:'):
+                order = int(line[1:-len('-grams:')])
+                while len(ngrams) < order:
+                    ngrams.append({})
+            elif order > 0:
+                fields = line.split()
+                if len(fields) < order + 1:
+                    raise ValueError('Invalid %d-gram: %s' % (order, line))
+                backoff = float(fields[order + 1]) \
+                    if len(fields) > order + 1 else 0.
+                ngrams[order - 1][tuple(fields[1:order + 1])] = \
+                    (float(fields[0]), backoff)
+
+    for n, ngram_num in enumerate(ngram_nums):
+        if n >= len(ngrams) or len(ngrams[n]) != ngram_num:
+            raise ValueError('The number of %d-grams is not %d in %s.' %
+                             (n + 1, ngram_num, arpa_path))
+    return NgramLM(ngrams)
+
+
+class NgramScorer(object):
+    """Score labels appended to prefixes in CTC prefix beam search by an
+       n-gram LM. The score of a token is
+       `lm_weight * log p(token | context) + insertion_bonus` in natural log.
+       LM states of prefixes are cached, so each label costs one lookup.
+    Args:
+        lm: An instance of `NgramLM`
+        labels: list of tokens of each label index (ex. `Vocabulary.labels`)
+        lm_weight: A float value, the weight of the LM
+        insertion_bonus: A float value, the bonus per token to balance
+            deletions caused by the LM
+        space_label: string, if set, the LM is word-level and labels are
+            characters. Words are separated by this label and scored when
+            they are completed. If None, each label is a token of the LM.
+        max_cache_size: int, the maximum number of cached prefixes. The
+            cache is cleared when it grows beyond this.
+    """
+
+    def __init__(self, lm, labels, lm_weight=0.5, insertion_bonus=0.,
+                 space_label=None, max_cache_size=100000):
+        self.lm = lm
+        self.labels = list(labels)
+        self.lm_weight = lm_weight
+        self.insertion_bonus = insertion_bonus
+        self.space_label = space_label
+        self.max_cache_size = max_cache_size
+
+        self._label_ids = [lm.token_id(label) if label is not None else None
+                           for label in self.labels]
+        self._space_index = self.labels.index(space_label) \
+            if space_label is not None else None
+        # prefix => (LM state, labels of the word being spelled)
+        self._states = {}
+
+    def _token_score(self, state, token_id):
+        log10_prob, next_state = self.lm.log10_prob(state, token_id)
+        return (self.lm_weight * log10_prob * math.log(10) +
+                self.insertion_bonus, next_state)
+
+    def _word_id(self, word):
+        return self.lm.token_id(''.join(self.labels[c] for c in word))
+
+    def _state(self, prefix):
+        """Return the state of a prefix, walking from the longest cached
+           ancestor."""
+        n = len(prefix)
+        while n > 0 and prefix[:n] not in self._states:
+            n -= 1
+        state = self._states.get(prefix[:n], (self.lm.begin_state(), ()))
+        for i in range(n, len(prefix)):
+            state = self._extend(state, prefix[i])[1]
+        return state
+
+    def _extend(self, state, label):
+        """Append a label.
+        Returns:
+            score: A float value
+            next_state: tuple of (LM state, labels of the word)
+        """
+        lm_state, word = state
+        if self._space_index is None:
+            score, lm_state = self._token_score(lm_state,
+                                                self._label_ids[label])
+            return score, (lm_state, ())
+        if label != self._space_index:
+            return 0., (lm_state, word + (label,))
+        if len(word) == 0:
+            # Repeated spaces
+            return 0., state
+        score, lm_state = self._token_score(lm_state, self._word_id(word))
+        return score, (lm_state, ())
+
+    def score(self, prefix, label):
+        """Score a label appended to a prefix.
+        Args:
+            prefix: tuple of labels
+            label: int, the appended label
+        Returns:
+            A float value, log-domain score
+        """
+        score, next_state = self._extend(self._state(prefix), label)
+        if len(self._states) >= self.max_cache_size:
+            self._states.clear()
+        self._states[prefix + (label,)] = next_state
+        return score
+
+    def final_score(self, prefix):
+        """Score the end of a sentence (the last word and </s>).
+        Args:
+            prefix: tuple of labels
+        Returns:
+            A float value, log-domain score
+        """
+        lm_state, word = self._state(prefix)
+        score = 0.
+        if len(word) > 0:
+            score, lm_state = self._token_score(lm_state, self._word_id(word))
+        eos_id = self.lm.token2id.get(EOS)
+        if eos_id is not None:
+            score += self.lm_weight * \
+                self.lm.log10_prob(lm_state, eos_id)[0] * math.log(10)
+        return score
@@ -0,0 +1,252 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Make mini-batches in the background while the model is trained.
+   Usage:
+       prefetcher = BatchPrefetcher(train_data, num_workers=4, seed=1)
+       for inputs, labels_st, inputs_seq_len, input_names in prefetcher:
+           ...
+       prefetcher.close()
+   The batches are the same as those of `DataSet.next_batch`. As with
+   `next_batch`, a mini-batch is released to the buffers of the dataset
+   (see utils/batch_buffer.py) when the next one is requested.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+import threading
+from collections import deque
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# The end of the batch stream
+_END = object()
+
+# The dataset shared with worker processes (set by `_init_worker`)
+_worker_dataset = None
+
+
+def _init_worker(dataset):
+    global _worker_dataset
+    _worker_dataset = dataset
+
+
+def _make_batch_in_worker(indices):
+    batch = _worker_dataset.make_batch(indices)
+    # The result is pickled to the main process before this worker makes
+    # the next mini-batch, so the buffer can be reused right away
+    _release(_worker_dataset, batch)
+    return batch
+
+
+def _release(dataset, batch):
+    """Release the buffer of a mini-batch if the dataset has buffers."""
+    release = getattr(dataset, 'release', None)
+    if release is not None:
+        release(batch[0])
+
+
+class _ProducerError(object):
+    """Wrap an exception raised in the background."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class BatchPrefetcher(object):
+    """Make mini-batches of a dataset with background workers and keep them
+       in a bounded queue.
+       Mini-batches are selected by the sampler of the dataset in the
+       producer thread and made by the workers, and they are returned in the
+       order of selection. So the sequence of mini-batches depends only on
+       the seed of the sampler, not on `num_workers` or the timing of
+       workers.
+    Args:
+        dataset: A `DataSet` which has `sampler`, `batch_indices` and
+            `make_batch` (ctc, multitask_ctc and attention of TIMIT and CSJ)
+        batch_size: int, the size of mini-batch. If None, use that of dataset
+        num_workers: int, the number of workers to make mini-batches
+        use_process: if True, use worker processes instead of threads.
+            The dataset is shared with workers by fork. This is useful when
+            making mini-batches is CPU-bound (frame stacking, padding).
+        queue_size: int, the maximum number of mini-batches kept in the queue
+        seed: int, if set, restart the sampler of the dataset with this seed
+        num_epoch: int, stop after this number of epochs. If None, make
+            mini-batches until `close` is called.
+    """
+
+    def __init__(self, dataset, batch_size=None, num_workers=1,
+                 use_process=False, queue_size=8, seed=None, num_epoch=None):
+        if num_workers < 1:
+            raise ValueError('num_workers must be more than 0.')
+        if queue_size < 1:
+            raise ValueError('queue_size must be more than 0.')
+        if use_process and dataset.num_gpu > 1:
+            raise ValueError(
+                'Worker processes cannot split mini-batch for multiple GPUs.')
+
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.use_process = use_process
+        self.queue_size = queue_size
+        self.num_epoch = num_epoch
+        self.epoch = 0
+
+        if seed is not None:
+            dataset.sampler.reset(seed)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop_event = threading.Event()
+        self._is_finished = False
+        # The mini-batch returned last, released at the next request
+        self._last_batch = None
+
+        # Metrics
+        self._batch_num = 0
+        self._queue_size_sum = 0
+        self._starved_num = 0
+        self._wait_time = 0.
+
+        if use_process:
+            self._pool = Pool(num_workers, initializer=_init_worker,
+                              initargs=(dataset,))
+        else:
+            self._pool = ThreadPool(num_workers)
+
+        self._thread = threading.Thread(target=self._produce)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _make_batch_async(self, indices):
+        if self.use_process:
+            return self._pool.apply_async(_make_batch_in_worker, (indices,))
+        return self._pool.apply_async(self.dataset.make_batch, (indices,))
+
+    def _put(self, item):
+        """Put an item into the queue unless the prefetcher is stopped.
+        Returns:
+            True if the item was put
+        """
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce(self):
+        pending = deque()
+        is_selecting = True
+        try:
+            while not self._stop_event.is_set():
+                # Keep all workers busy
+                while is_selecting and len(pending) < self.num_workers:
+                    indices, next_epoch_flag = self.dataset.batch_indices(
+                        self.batch_size)
+                    pending.append(self._make_batch_async(indices))
+                    if next_epoch_flag:
+                        self.epoch += 1
+                        if self.num_epoch is not None and \
+                                self.epoch >= self.num_epoch:
+                            # Stop at the end of the epoch
+                            is_selecting = False
+                if len(pending) == 0:
+                    break
+
+                result = pending.popleft()
+                while not result.ready():
+                    if self._stop_event.is_set():
+                        return
+                    result.wait(0.1)
+                if not self._put(result.get()):
+                    return
+        except Exception as e:
+            self._put(_ProducerError(e))
+        finally:
+            if self._stop_event.is_set():
+                self._pool.terminate()
+            else:
+                self._pool.close()
+                self._put(_END)
+            self._pool.join()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._last_batch is not None:
+            _release(self.dataset, self._last_batch)
+            self._last_batch = None
+        if self._is_finished:
+            raise StopIteration
+
+        queue_size = self._queue.qsize()
+        self._queue_size_sum += queue_size
+        if queue_size == 0:
+            self._starved_num += 1
+
+        start_time = time.time()
+        item = self._queue.get()
+        self._wait_time += time.time() - start_time
+
+        if item is _END:
+            self._is_finished = True
+            raise StopIteration
+        if isinstance(item, _ProducerError):
+            self._is_finished = True
+            raise item.error
+
+        self._batch_num += 1
+        self._last_batch = item
+        return item
+
+    next = __next__  # Python 2
+
+    def stats(self):
+        """Return metrics of the queue.
+        Returns:
+            A dictionary of
+                queue_size: the number of mini-batches in the queue now
+                capacity: the maximum number of mini-batches in the queue
+                batch_num: the number of mini-batches returned so far
+                mean_queue_size: mean queue size when mini-batches were
+                    requested
+                starved_num: the number of requests which found the queue
+                    empty (the training loop waited for the workers)
+                wait_time: total time (sec) spent waiting for mini-batches
+        """
+        request_num = self._batch_num + (1 if self._is_finished else 0)
+        return {
+            'queue_size': self._queue.qsize(),
+            'capacity': self.queue_size,
+            'batch_num': self._batch_num,
+            'mean_queue_size': self._queue_size_sum / max(request_num, 1),
+            'starved_num': self._starved_num,
+            'wait_time': self._wait_time
+        }
+
+    def close(self):
+        """Stop the workers and discard the mini-batches in the queue."""
+        self._stop_event.set()
+        self._is_finished = True
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,378 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Select mini-batches of an epoch with a cursor on a permutation.
+   Usage (report padding ratio of each mode):
+       python sampler.py path_to_frame_num.pickle batch_size [num_buckets]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import pickle
+import numpy as np
+
+SAMPLER_MODES = ['sorted', 'shuffled', 'bucketed', 'budget']
+BUDGET_TYPES = ['total', 'padded']
+
+
+class EpochSampler(object):
+    """Select indices of mini-batches epoch by epoch.
+       The order of an epoch is made once at the beginning of the epoch,
+       and each mini-batch is a slice of it, so selecting a mini-batch costs
+       O(batch_size) regardless of the size of the dataset. The order is
+       determined by `seed` and the epoch, so an epoch can be resumed from
+       `state()`.
+    Args:
+        data_num: int, the number of utterances
+        batch_size: int, the size of mini-batch
+        mode: string, sorted or shuffled or bucketed or budget
+            sorted: in the order of indices (readers sort utterances by
+                frame num), and shuffled in each mini-batch
+            shuffled: a random permutation in each epoch
+            bucketed: utterances of similar frame num are grouped into
+                mini-batches, and the order of mini-batches is shuffled
+                in each epoch. If neither bucket_boundaries nor num_buckets
+                is set, each mini-batch is a run of utterances sorted by
+                frame num. Otherwise utterances are shuffled in each bucket.
+            budget: utterances sorted by frame num are packed into
+                mini-batches up to frame_budget frames (at most batch_size
+                utterances), and the order of mini-batches is shuffled in
+                each epoch. The number of mini-batches is the same in all
+                epochs.
+        frame_nums: list or numpy array of the frame num of each utterance.
+            This is needed in bucketed and budget mode.
+        seed: int, the seed of the random generator. If None, a seed is
+            chosen at random.
+        bucket_boundaries: list of frame nums. The bucket i contains
+            utterances of `boundaries[i-1] <= frame_num < boundaries[i]`.
+        num_buckets: int, if set instead of bucket_boundaries, boundaries
+            are chosen so that each bucket has the same number of utterances
+        frame_budget: int, in bucketed mode, if set, the size of mini-batch
+            of each bucket is `frame_budget // (max frame num in the bucket)`
+            (at most batch_size), so that padded mini-batches have about the
+            same number of frames. In budget mode, the maximum number of
+            frames of a mini-batch.
+        budget_type: string, total or padded. In budget mode, frames of a
+            mini-batch are counted as the total frames of utterances (total)
+            or `batch size * max frame num` including padding (padded).
+    """
+
+    def __init__(self, data_num, batch_size, mode='shuffled',
+                 frame_nums=None, seed=None, bucket_boundaries=None,
+                 num_buckets=None, frame_budget=None, budget_type='padded'):
+        if mode not in SAMPLER_MODES:
+            raise ValueError('mode is one of %s.' % ', '.join(
+                '"%s"' % m for m in SAMPLER_MODES))
+        if batch_size < 1:
+            raise ValueError('batch_size must be more than 0.')
+        if mode in ['bucketed', 'budget']:
+            if frame_nums is None:
+                raise ValueError('Set frame_nums in %s mode.' % mode)
+            if len(frame_nums) != data_num:
+                raise ValueError('The length of frame_nums must be data_num.')
+        if mode == 'budget':
+            if frame_budget is None:
+                raise ValueError('Set frame_budget in budget mode.')
+            if budget_type not in BUDGET_TYPES:
+                raise ValueError('budget_type is "total" or "padded".')
+
+        self.data_num = data_num
+        self.batch_size = batch_size
+        self.mode = mode
+        if frame_nums is not None:
+            frame_nums = np.asarray(frame_nums)
+        self.frame_nums = frame_nums
+        self.frame_budget = frame_budget
+        self.budget_type = budget_type
+
+        # Group utterances into buckets
+        self.bucket_boundaries = None
+        if mode == 'bucketed':
+            if bucket_boundaries is None and num_buckets is not None:
+                bucket_boundaries = auto_bucket_boundaries(frame_nums,
+                                                           num_buckets)
+            if bucket_boundaries is None and frame_budget is not None:
+                raise ValueError(
+                    'Set bucket_boundaries or num_buckets with frame_budget.')
+        if mode == 'bucketed' and bucket_boundaries is not None:
+            self.bucket_boundaries = np.sort(bucket_boundaries)
+            bucket_ids = np.searchsorted(self.bucket_boundaries, frame_nums,
+                                         side='right')
+            self._buckets = [np.flatnonzero(bucket_ids == i)
+                             for i in range(len(self.bucket_boundaries) + 1)]
+            self._buckets = [bucket for bucket in self._buckets
+                             if len(bucket) > 0]
+
+            # The size of mini-batch of each bucket
+            self.bucket_batch_sizes = []
+            for bucket in self._buckets:
+                if frame_budget is None:
+                    self.bucket_batch_sizes.append(batch_size)
+                else:
+                    max_frame_num = int(np.max(frame_nums[bucket]))
+                    self.bucket_batch_sizes.append(
+                        max(1, min(batch_size,
+                                   frame_budget // max(max_frame_num, 1))))
+
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """Restart from the first epoch.
+        Args:
+            seed: int, the seed of the random generator. If None, a seed is
+                chosen at random.
+        """
+        if seed is None:
+            seed = np.random.randint(0, 2 ** 31 - 1)
+        self.seed = seed
+        self.epoch = 0
+        self.cursor = 0
+        self._order = None
+        self._batch_ends = None
+
+    def _make_batches(self, rand_state):
+        """Make mini-batches of the current epoch.
+        Args:
+            rand_state: An instance of `np.random.RandomState`
+        Returns:
+            batches: list of numpy arrays of indices
+        """
+        if self.bucket_boundaries is not None:
+            # Shuffle within buckets, and then across buckets
+            batches = []
+            for bucket, batch_size in zip(self._buckets,
+                                          self.bucket_batch_sizes):
+                bucket = rand_state.permutation(bucket)
+                batches.extend([bucket[i:i + batch_size]
+                                for i in range(0, len(bucket), batch_size)])
+            return [batches[i] for i in rand_state.permutation(len(batches))]
+
+        if self.mode == 'budget':
+            # Sort by frame num, breaking ties at random. Packing depends
+            # only on the sorted frame nums, so the number of mini-batches
+            # does not change between epochs.
+            order = np.lexsort((rand_state.rand(self.data_num),
+                                self.frame_nums))
+            batches = self._pack(order)
+            return [batches[i] for i in rand_state.permutation(len(batches))]
+
+        if self.mode == 'shuffled':
+            order = rand_state.permutation(self.data_num)
+        elif self.mode == 'sorted':
+            order = np.arange(self.data_num)
+        else:
+            # Sort by frame num, breaking ties at random
+            order = np.lexsort((rand_state.rand(self.data_num),
+                                self.frame_nums))
+
+        batches = [order[i:i + self.batch_size]
+                   for i in range(0, self.data_num, self.batch_size)]
+
+        if self.mode != 'shuffled':
+            # Shuffle selected mini-batch
+            for batch in batches:
+                rand_state.shuffle(batch)
+        if self.mode == 'bucketed':
+            batches = [batches[i]
+                       for i in rand_state.permutation(len(batches))]
+        return batches
+
+    def _pack(self, order):
+        """Pack utterances into mini-batches up to the frame budget.
+        Args:
+            order: A numpy array of indices sorted by frame num
+        Returns:
+            batches: list of numpy arrays of indices
+        """
+        batches = []
+        start, frame_num_total, frame_num_max = 0, 0, 0
+        for i, frame_num in enumerate(self.frame_nums[order].tolist()):
+            batch_size = i - start
+            if self.budget_type == 'total':
+                frame_num_batch = frame_num_total + frame_num
+            else:
+                frame_num_batch = (batch_size + 1) * \
+                    max(frame_num_max, frame_num)
+            if batch_size > 0 and (batch_size == self.batch_size or
+                                   frame_num_batch > self.frame_budget):
+                batches.append(order[start:i])
+                start, frame_num_total, frame_num_max = i, 0, 0
+            frame_num_total += frame_num
+            frame_num_max = max(frame_num_max, frame_num)
+        batches.append(order[start:])
+        return batches
+
+    def _make_plan(self):
+        rand_state = np.random.RandomState(
+            (self.seed + self.epoch) % (2 ** 32))
+        batches = self._make_batches(rand_state)
+        self._order = np.concatenate(batches)
+        self._batch_ends = np.cumsum([len(batch) for batch in batches])
+
+    @property
+    def num_batches(self):
+        """The number of mini-batches in the current epoch."""
+        if self._order is None:
+            self._make_plan()
+        return len(self._batch_ends)
+
+    def next(self, batch_size=None):
+        """Select indices of the next mini-batch.
+        Args:
+            batch_size: int, the size of mini-batch. If None, mini-batches
+                planned for the epoch are returned.
+        Returns:
+            indices: A numpy array of indices of the mini-batch
+            next_epoch_flag: if True, this mini-batch is the last one of
+                the epoch
+        """
+        if self._order is None:
+            self._make_plan()
+
+        if batch_size is None:
+            i_batch = np.searchsorted(self._batch_ends, self.cursor,
+                                      side='right')
+            end = int(self._batch_ends[i_batch])
+        else:
+            end = min(self.cursor + batch_size, self.data_num)
+        indices = self._order[self.cursor:end]
+
+        if end >= self.data_num:
+            self.epoch += 1
+            self.cursor = 0
+            self._order = None
+            self._batch_ends = None
+            return indices, True
+        self.cursor = end
+        return indices, False
+
+    def state(self):
+        """Return the state to resume from."""
+        return {'seed': self.seed, 'epoch': self.epoch, 'cursor': self.cursor}
+
+    def load_state(self, state):
+        """Resume from the state returned by `state()`."""
+        self.seed = state['seed']
+        self.epoch = state['epoch']
+        self.cursor = state['cursor']
+        self._order = None
+        self._batch_ends = None
+
+
+def sampler_params_from_config(param):
+    """Read the setting of the sampler from `param` of a config file.
+       ex.)
+           param:
+               batch_size: 64
+               sampler: budget  # sorted, shuffled, bucketed or budget
+               frame_budget: 20000
+               budget_type: padded
+    Args:
+        param: dictionary of `param` in the config
+    Returns:
+        sampler_params: dictionary of keyword arguments of `EpochSampler`,
+            or None if `sampler` is not set
+    """
+    if param.get('sampler') is None:
+        return None
+    sampler_params = {'mode': param['sampler']}
+    for key in ['bucket_boundaries', 'num_buckets', 'frame_budget',
+                'budget_type']:
+        if param.get(key) is not None:
+            sampler_params[key] = param[key]
+    return sampler_params
+
+
+def auto_bucket_boundaries(frame_nums, num_buckets):
+    """Choose bucket boundaries so that each bucket has about the same
+       number of utterances.
+    Args:
+        frame_nums: list or numpy array of frame nums
+        num_buckets: int, the number of buckets
+    Returns:
+        boundaries: A numpy array of frame nums of size `[<= num_buckets - 1]`
+    """
+    if num_buckets < 1:
+        raise ValueError('num_buckets must be more than 0.')
+    quantiles = np.linspace(0, 100, num_buckets + 1)[1:-1]
+    boundaries = np.ceil(np.percentile(frame_nums, quantiles)).astype(int)
+    return np.unique(boundaries)
+
+
+def padding_ratio(batches, frame_nums):
+    """Compute the ratio of padded frames in mini-batches.
+    Args:
+        batches: list of indices of mini-batches
+        frame_nums: numpy array of frame nums
+    Returns:
+        ratio: float, (padded frames) / (all frames including padding)
+    """
+    frame_num_real, frame_num_padded = 0, 0
+    for indices in batches:
+        batch_frame_nums = frame_nums[indices]
+        frame_num_real += int(np.sum(batch_frame_nums))
+        frame_num_padded += len(indices) * int(np.max(batch_frame_nums))
+    if frame_num_padded == 0:
+        return 0.
+    return 1 - frame_num_real / frame_num_padded
+
+
+def padding_report(frame_nums, batch_size, num_buckets=10,
+                   frame_budget=None, seed=0):
+    """Compare the padding ratio of an epoch among sampler modes.
+    Args:
+        frame_nums: list or numpy array of frame nums
+        batch_size: int, the size of mini-batch
+        num_buckets: int, the number of buckets in bucketed mode
+        frame_budget: int, the frame budget in bucketed mode
+        seed: int, the seed of the random generator
+    Returns:
+        report: dictionary of
+            key => mode (sorted, shuffled, bucketed)
+            value => tuple of (padding ratio, the number of mini-batches)
+    """
+    frame_nums = np.asarray(frame_nums)
+    samplers = {
+        'sorted': EpochSampler(len(frame_nums), batch_size, mode='sorted',
+                               seed=seed),
+        'shuffled': EpochSampler(len(frame_nums), batch_size,
+                                 mode='shuffled', seed=seed),
+        'bucketed': EpochSampler(len(frame_nums), batch_size,
+                                 mode='bucketed', frame_nums=frame_nums,
+                                 seed=seed, num_buckets=num_buckets,
+                                 frame_budget=frame_budget)
+    }
+    # Indices of the sorted mode are in the order of frame num
+    sorted_frame_nums = np.sort(frame_nums)
+
+    report = {}
+    for mode, sampler in samplers.items():
+        batches = []
+        next_epoch_flag = False
+        while not next_epoch_flag:
+            indices, next_epoch_flag = sampler.next()
+            batches.append(indices)
+        report[mode] = (padding_ratio(
+            batches, sorted_frame_nums if mode == 'sorted' else frame_nums),
+            len(batches))
+    return report
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) not in [3, 4]:
+        raise ValueError(
+            ("Usage: python sampler.py path_to_frame_num.pickle batch_size "
+             "[num_buckets]"))
+    with open(args[1], 'rb') as f:
+        frame_num_dict = pickle.load(f)
+    num_buckets = int(args[3]) if len(args) == 4 else 10
+    report = padding_report(list(frame_num_dict.values()), int(args[2]),
+                            num_buckets=num_buckets)
+    for mode in ['shuffled', 'sorted', 'bucketed']:
+        print('%s: padding ratio = %.3f (%d mini-batches)' %
+              (mode, report[mode][0], report[mode][1]))
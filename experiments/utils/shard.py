@@ -0,0 +1,233 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Pack a dataset of per-utterance .npy files into a contiguous shard and
+   read it through memory mapping.
+   A shard is a directory which contains
+       inputs.npy: all input features concatenated along the time axis,
+           `[total_frame_num, input_size]`
+       input_offsets.npy: offsets of each utterance in inputs.npy,
+           `[utt_num + 1]`
+       labels.npy: all labels concatenated, `[total_label_num]`
+       label_offsets.npy: offsets of each utterance in labels.npy,
+           `[utt_num + 1]`
+       names.txt: utterance names (one per line)
+   Usage:
+       python shard.py path_to_dataset [path_to_dataset ...]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join, isdir, isfile, relpath, splitext
+import sys
+import pickle
+import numpy as np
+from tqdm import tqdm
+
+SHARD_DIR_NAME = 'shard'
+FRAME_NUM_DICT_NAMES = ['frame_num.pickle', 'frame_num_dict.pickle']
+
+
+def pack_shard(input_paths, label_paths, input_names, save_path,
+               dtype=np.float32, is_progressbar=False):
+    """Pack inputs & labels into one shard.
+    Args:
+        input_paths: list of paths to input data (.npy)
+        label_paths: list of paths to label data (.npy)
+        input_names: list of utterance names
+        save_path: path to the shard directory
+        dtype: data type of the packed input features
+        is_progressbar: if True, visualize progressbar
+    """
+    if not (len(input_paths) == len(label_paths) == len(input_names)):
+        raise ValueError('The numbers of inputs, labels and names differ.')
+    if not isdir(save_path):
+        os.makedirs(save_path)
+    elif isfile(join(save_path, 'names.txt')):
+        # Invalidate the old shard until packing finishes
+        os.remove(join(save_path, 'names.txt'))
+
+    # Read only headers to compute offsets
+    input_offsets = np.zeros((len(input_paths) + 1,), dtype=np.int64)
+    label_offsets = np.zeros((len(label_paths) + 1,), dtype=np.int64)
+    input_size = None
+    for i, (input_path, label_path) in enumerate(zip(input_paths,
+                                                     label_paths)):
+        input_shape = np.load(input_path, mmap_mode='r').shape
+        if input_size is None:
+            input_size = input_shape[1]
+        elif input_size != input_shape[1]:
+            raise ValueError('Input size of %s is %d, expected %d.' %
+                             (input_path, input_shape[1], input_size))
+        input_offsets[i + 1] = input_offsets[i] + input_shape[0]
+        label_offsets[i + 1] = label_offsets[i] + \
+            np.load(label_path, mmap_mode='r').shape[0]
+
+    inputs = np.lib.format.open_memmap(
+        join(save_path, 'inputs.npy'), mode='w+', dtype=dtype,
+        shape=(int(input_offsets[-1]), input_size))
+    labels = np.lib.format.open_memmap(
+        join(save_path, 'labels.npy'), mode='w+', dtype=np.int32,
+        shape=(int(label_offsets[-1]),))
+
+    iterator = range(len(input_paths))
+    if is_progressbar:
+        iterator = tqdm(iterator)
+    for i in iterator:
+        inputs[input_offsets[i]:input_offsets[i + 1]] = np.load(
+            input_paths[i])
+        labels[label_offsets[i]:label_offsets[i + 1]] = np.load(
+            label_paths[i])
+    inputs.flush()
+    labels.flush()
+    del inputs, labels
+
+    np.save(join(save_path, 'input_offsets.npy'), input_offsets)
+    np.save(join(save_path, 'label_offsets.npy'), label_offsets)
+    with open(join(save_path, 'names.txt'), 'w') as f:
+        for input_name in input_names:
+            f.write(input_name + '\n')
+
+
+def frame_num_dict_path(dataset_path):
+    """Return the path to the frame number dictionary of the dataset.
+    Args:
+        dataset_path: path to the dataset
+    Returns:
+        path to the pickle file
+    """
+    for frame_num_dict_name in FRAME_NUM_DICT_NAMES:
+        path = join(dataset_path, frame_num_dict_name)
+        if isfile(path):
+            return path
+    raise ValueError('There is no frame number dictionary in %s.' %
+                     dataset_path)
+
+
+def load_frame_num_dict(dataset_path):
+    """Load the frame number dictionary of the dataset.
+    Args:
+        dataset_path: path to the dataset
+    Returns:
+        frame_num_dict:
+            key => utterance name
+            value => the number of frames
+    """
+    with open(frame_num_dict_path(dataset_path), 'rb') as f:
+        return pickle.load(f)
+
+
+def find_input_paths(dataset_path):
+    """Find input files (TIMIT: input/*.npy, CSJ: input/speaker/*.npy).
+    Args:
+        dataset_path: path to the dataset
+    Returns:
+        rel_paths:
+            key => utterance name
+            value => path to the input file relative to `input/`
+    """
+    input_dir = join(dataset_path, 'input')
+    rel_paths = {}
+    for root, _, file_names in os.walk(input_dir):
+        for file_name in file_names:
+            input_name, ext = splitext(file_name)
+            if ext == '.npy':
+                rel_paths[input_name] = relpath(join(root, file_name),
+                                                input_dir)
+    return rel_paths
+
+
+def pack_dataset(dataset_path, dtype=np.float32, is_progressbar=False):
+    """Pack a dataset directory (`input/` and `label/` which contain .npy
+       files, and the frame number dictionary) into `dataset_path/shard`.
+       Utterances are stored in ascending order of frame num.
+    Args:
+        dataset_path: path to the dataset
+        dtype: data type of the packed input features
+        is_progressbar: if True, visualize progressbar
+    Returns:
+        save_path: path to the shard directory
+    """
+    frame_num_dict = load_frame_num_dict(dataset_path)
+    input_dir = join(dataset_path, 'input')
+    rel_paths = find_input_paths(dataset_path)
+
+    input_paths, label_paths, input_names = [], [], []
+    for input_name, _ in sorted(frame_num_dict.items(), key=lambda x: x[1]):
+        input_paths.append(join(input_dir, rel_paths[input_name]))
+        label_paths.append(join(dataset_path, 'label',
+                                rel_paths[input_name]))
+        input_names.append(input_name)
+
+    save_path = join(dataset_path, SHARD_DIR_NAME)
+    pack_shard(input_paths, label_paths, input_names, save_path,
+               dtype=dtype, is_progressbar=is_progressbar)
+    return save_path
+
+
+class ShardReader(object):
+    """Read a packed shard through memory mapping. Utterances are returned
+       as slices of the memory-mapped arrays, so no file is opened per
+       utterance.
+    Args:
+        shard_path: path to the shard directory
+    """
+
+    def __init__(self, shard_path):
+        self.shard_path = shard_path
+        self.inputs = np.load(join(shard_path, 'inputs.npy'), mmap_mode='r')
+        self.labels = np.load(join(shard_path, 'labels.npy'), mmap_mode='r')
+        self.input_offsets = np.load(join(shard_path, 'input_offsets.npy'))
+        self.label_offsets = np.load(join(shard_path, 'label_offsets.npy'))
+        with open(join(shard_path, 'names.txt'), 'r') as f:
+            self.input_names = [line.strip() for line in f]
+        self.name2index = dict(
+            (input_name, i) for i, input_name in enumerate(self.input_names))
+        self.input_size = self.inputs.shape[1]
+
+    def __len__(self):
+        return len(self.input_names)
+
+    def frame_num(self, input_name):
+        """Return the number of frames of the utterance."""
+        i = self.name2index[input_name]
+        return int(self.input_offsets[i + 1] - self.input_offsets[i])
+
+    def input(self, input_name):
+        """Return input features of size `[frame_num, input_size]`."""
+        i = self.name2index[input_name]
+        return self.inputs[self.input_offsets[i]:self.input_offsets[i + 1]]
+
+    def label(self, input_name):
+        """Return labels of size `[label_num]`."""
+        i = self.name2index[input_name]
+        return self.labels[self.label_offsets[i]:self.label_offsets[i + 1]]
+
+
+def open_shard(dataset_path):
+    """Open the shard of the dataset if it has been packed.
+    Args:
+        dataset_path: path to the dataset
+    Returns:
+        An instance of `ShardReader`, or None if there is no shard
+    """
+    shard_path = join(dataset_path, SHARD_DIR_NAME)
+    # names.txt is written last, so a partially packed shard is ignored
+    if not isfile(join(shard_path, 'names.txt')):
+        return None
+    return ShardReader(shard_path)
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) < 2:
+        raise ValueError(
+            ("Set paths to datasets.\n"
+             "Usage: python shard.py path_to_dataset [path_to_dataset ...]"))
+    for dataset_path in args[1:]:
+        print('=> Packing ' + dataset_path + '...')
+        print('   saved in ' + pack_dataset(dataset_path, is_progressbar=True))
@@ -6,59 +6,91 @@ from __future__ import division
 from __future__ import print_function
 
 import numpy as np
-import tensorflow as tf
 
 
-def list2sparsetensor(labels):
+def list2sparsetensor(labels, padded_value=-1, dtype=np.int64):
     """Convert labels from list to sparse tensor.
     Args:
-        labels: list of labels
+        labels: A numpy array of size `[batch_size, max_label_len]` padded
+            with padded_value, or list of labels of each utterance (ragged)
+        padded_value: int, the value used for padding. Labels after the
+            first padded_value in each utterance are ignored.
+            Plaese see details in some_timit/data/read_dataset_ctc.py
+        dtype: data type of values
     Returns:
         labels_st: sparse tensor of labels, list of indices, values, dense_shape
     """
-    indices, values = [], []
-    for i_utt, each_label in enumerate(labels):
-        for i_l, l in enumerate(each_label):
-            # -1 means empty
-            # Plaese see details in
-            # some_timit/data/read_dataset_ctc.py
-            if l == -1:
-                break
-            indices.append([i_utt, i_l])
-            values.append(l)
-    dense_shape = [len(labels), np.asarray(indices).max(0)[1] + 1]
-    labels_st = [np.array(indices), np.array(values), np.array(dense_shape)]
+    if isinstance(labels, np.ndarray) and labels.ndim == 2:
+        # Mask labels before the first padded value
+        mask = np.cumprod(labels != padded_value, axis=1).astype(bool)
+        indices = np.argwhere(mask)
+        values = labels[mask]
+        max_label_len = mask.sum(axis=1).max() if len(labels) > 0 else 0
+        dense_shape = [len(labels), max_label_len]
+        return [indices.astype(np.int64), values.astype(dtype, copy=False),
+                np.array(dense_shape, dtype=np.int64)]
 
-    return labels_st
+    return ragged2sparsetensor(labels, padded_value=padded_value, dtype=dtype)
+
+
+def ragged2sparsetensor(labels, padded_value=-1, dtype=np.int64):
+    """Convert labels of different lengths to sparse tensor without making
+       the padded matrix.
+    Args:
+        labels: list of labels of each utterance
+        padded_value: int, labels after the first padded_value in each
+            utterance are ignored
+        dtype: data type of values
+    Returns:
+        labels_st: sparse tensor of labels, list of indices, values, dense_shape
+    """
+    batch_size = len(labels)
+    label_lens = np.array([len(label) for label in labels], dtype=np.int64)
+    if label_lens.sum() == 0:
+        return [np.zeros((0, 2), dtype=np.int64),
+                np.zeros((0,), dtype=dtype),
+                np.array([batch_size, 0], dtype=np.int64)]
+
+    values = np.concatenate(
+        [np.asarray(label, dtype=np.int64).reshape(-1) for label in labels])
+    utt_indices = np.repeat(np.arange(batch_size), label_lens)
+    starts = np.cumsum(label_lens) - label_lens
+    positions = np.arange(len(values)) - np.repeat(starts, label_lens)
+
+    # Count padded values before each label in the same utterance
+    padded_num = np.cumsum(values == padded_value)
+    padded_num_before_utt = np.concatenate(([0], padded_num))[starts]
+    mask = padded_num - np.repeat(padded_num_before_utt, label_lens) == 0
+
+    indices = np.stack([utt_indices[mask], positions[mask]], axis=1)
+    values = values[mask].astype(dtype, copy=False)
+    label_lens = np.bincount(utt_indices[mask], minlength=batch_size)
+    dense_shape = [batch_size, label_lens.max()]
+    return [indices, values, np.array(dense_shape, dtype=np.int64)]
 
 
 def sparsetensor2list(labels_st, batch_size):
     """Convert labels from sparse tensor to list.
     Args:
-        labels_st: A SparseTensor of labels
+        labels_st: A SparseTensor of labels (`tf.SparseTensorValue` or list
+            of [indices, values, shape])
+        batch_size: int, the size of mini-batch
     Returns:
-        labels: list of labels
+        labels: list of labels. Utterances which have no label are empty
+            lists.
     """
-    if isinstance(labels_st, tf.SparseTensorValue):
+    if hasattr(labels_st, 'indices'):
+        # tf.SparseTensorValue
         indices = labels_st.indices
         values = labels_st.values
     else:
         # expected to list of [indices, values, shape]
         indices = labels_st[0]
         values = labels_st[1]
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1, 2)
+    values = np.asarray(values)
 
-    labels = []
-    batch_boundary = np.where(indices[:, 1] == 0)[0]
-
-    # TODO: fix error occurred when ctc models do not output any labels
-    # print(batch_boundary)
-    # if len(batch_boundary) != batch_size:
-    #     batch_boundary = np.array(batch_boundary.tolist() + [max(batch_boundary) + 1])
-    # print(indices)
-
-    for i in range(batch_size - 1):
-        label_each_wav = values[batch_boundary[i]:batch_boundary[i + 1]]
-        labels.append(label_each_wav.tolist())
-    labels.append(values[batch_boundary[-1]:].tolist())
-
-    return labels
+    # Indices are sorted in row-major order
+    label_lens = np.bincount(indices[:, 0], minlength=batch_size)
+    boundaries = np.cumsum(label_lens)[:-1]
+    return [label.tolist() for label in np.split(values, boundaries)]
@@ -0,0 +1,262 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Cache of frame-stacked input features on disk. Stacked inputs of all
+   utterances are written once for each (num_stack, num_skip), and readers
+   open them through memory mapping instead of stacking frames at startup
+   (TIMIT) or per mini-batch (CSJ).
+   A cache is a directory `dataset_path/stacked/stack{num_stack}_skip{num_skip}`
+   which contains
+       inputs.npy: stacked inputs concatenated along the time axis,
+           `[total_frame_num, input_size * num_stack]`
+       input_offsets.npy: offsets of each utterance in inputs.npy,
+           `[utt_num + 1]`
+       names.txt: utterance names (one per line)
+       manifest.json: version, parameters and the hash of them & the source
+           data. This is written last, and the cache is used only when the
+           hash matches.
+   Usage:
+       python stacked_cache.py path_to_dataset num_stack num_skip
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join, isdir, isfile, getmtime, getsize
+import sys
+import json
+import shutil
+import hashlib
+import numpy as np
+from tqdm import tqdm
+
+if __name__ == '__main__':
+    # Importers have `utils` on their path already. Only a script run from
+    # this directory needs the parent directory.
+    sys.path.append('../')
+from utils.frame_stack import stack_frame_utt
+from utils.shard import (open_shard, find_input_paths, frame_num_dict_path,
+                         load_frame_num_dict)
+
+STACKED_CACHE_DIR_NAME = 'stacked'
+# Increment when the format or stacking changes
+CACHE_VERSION = 1
+
+
+def stacked_cache_path(dataset_path, num_stack, num_skip):
+    """Return the path to the cache directory.
+    Args:
+        dataset_path: path to the dataset
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+    Returns:
+        path to the cache directory
+    """
+    return join(dataset_path, STACKED_CACHE_DIR_NAME,
+                'stack%d_skip%d' % (num_stack, num_skip))
+
+
+def manifest_hash(dataset_path, frame_num_dict, num_stack, num_skip,
+                  dtype=np.float32):
+    """Compute the hash of parameters & the source data. The source data is
+       identified by the frame number dictionary (all utterance names and
+       frame nums), and the size & modified time of the dictionary file, the
+       input directory and the shard.
+    Args:
+        dataset_path: path to the dataset
+        frame_num_dict:
+            key => utterance name
+            value => the number of frames
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        dtype: data type of the stacked inputs
+    Returns:
+        string, hex digest
+    """
+    sha1 = hashlib.sha1()
+    sha1.update(('%d %d %d %s\n' % (CACHE_VERSION, num_stack, num_skip,
+                                    np.dtype(dtype).str)).encode('utf-8'))
+    for path in [frame_num_dict_path(dataset_path),
+                 join(dataset_path, 'input'),
+                 join(dataset_path, 'shard', 'inputs.npy')]:
+        if isfile(path) or isdir(path):
+            sha1.update(('%s %d %f\n' % (os.path.basename(path),
+                                         getsize(path),
+                                         getmtime(path))).encode('utf-8'))
+    for input_name, frame_num in sorted(frame_num_dict.items()):
+        sha1.update(('%s %d\n' % (input_name, frame_num)).encode('utf-8'))
+    return sha1.hexdigest()
+
+
+def save_stacked_cache(dataset_path, input_names, stacked_inputs,
+                       frame_num_dict, num_stack, num_skip, dtype=np.float32,
+                       is_progressbar=False):
+    """Write stacked inputs into the cache.
+    Args:
+        dataset_path: path to the dataset
+        input_names: list of utterance names
+        stacked_inputs: list or iterator of stacked inputs in the order of
+            input_names
+        frame_num_dict:
+            key => utterance name
+            value => the number of frames (before frame skipping)
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        dtype: data type of the stacked inputs
+        is_progressbar: if True, visualize progressbar
+    Returns:
+        save_path: path to the cache directory
+    """
+    save_path = stacked_cache_path(dataset_path, num_stack, num_skip)
+    # Write into a temporary directory, and replace the old cache at last
+    tmp_path = save_path + '.tmp%d' % os.getpid()
+    if isdir(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    frame_nums = np.array([frame_num_dict[input_name]
+                           for input_name in input_names], dtype=np.int64)
+    input_offsets = np.zeros((len(input_names) + 1,), dtype=np.int64)
+    input_offsets[1:] = np.cumsum(-(-frame_nums // num_skip))
+
+    iterator = enumerate(stacked_inputs)
+    if is_progressbar:
+        iterator = tqdm(iterator, total=len(input_names))
+    inputs = None
+    for i, stacked in iterator:
+        if inputs is None:
+            inputs = np.lib.format.open_memmap(
+                join(tmp_path, 'inputs.npy'), mode='w+', dtype=dtype,
+                shape=(int(input_offsets[-1]), stacked.shape[1]))
+        if stacked.shape[0] != input_offsets[i + 1] - input_offsets[i]:
+            raise ValueError('Frame num of %s is %d, expected %d.' %
+                             (input_names[i], stacked.shape[0],
+                              input_offsets[i + 1] - input_offsets[i]))
+        inputs[input_offsets[i]:input_offsets[i + 1]] = stacked
+    if inputs is None:
+        raise ValueError('There is no utterance.')
+    inputs.flush()
+    del inputs
+
+    np.save(join(tmp_path, 'input_offsets.npy'), input_offsets)
+    with open(join(tmp_path, 'names.txt'), 'w') as f:
+        for input_name in input_names:
+            f.write(input_name + '\n')
+    with open(join(tmp_path, 'manifest.json'), 'w') as f:
+        json.dump({'version': CACHE_VERSION,
+                   'hash': manifest_hash(dataset_path, frame_num_dict,
+                                         num_stack, num_skip, dtype),
+                   'num_stack': num_stack,
+                   'num_skip': num_skip,
+                   'dtype': np.dtype(dtype).str,
+                   'utt_num': len(input_names)}, f, indent=4)
+
+    if isdir(save_path):
+        shutil.rmtree(save_path)
+    os.rename(tmp_path, save_path)
+    return save_path
+
+
+class StackedCacheReader(object):
+    """Read stacked inputs from the cache through memory mapping.
+    Args:
+        cache_path: path to the cache directory
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self.inputs = np.load(join(cache_path, 'inputs.npy'), mmap_mode='r')
+        self.input_offsets = np.load(join(cache_path, 'input_offsets.npy'))
+        with open(join(cache_path, 'names.txt'), 'r') as f:
+            self.input_names = [line.strip() for line in f]
+        self.name2index = dict(
+            (input_name, i) for i, input_name in enumerate(self.input_names))
+        self.input_size = self.inputs.shape[1]
+
+    def __len__(self):
+        return len(self.input_names)
+
+    def __contains__(self, input_name):
+        return input_name in self.name2index
+
+    def input(self, input_name):
+        """Return stacked inputs of size
+           `[ceil(frame_num / num_skip), input_size * num_stack]`."""
+        i = self.name2index[input_name]
+        return self.inputs[self.input_offsets[i]:self.input_offsets[i + 1]]
+
+
+def open_stacked_cache(dataset_path, frame_num_dict, num_stack, num_skip,
+                       dtype=np.float32):
+    """Open the cache if it is up to date.
+    Args:
+        dataset_path: path to the dataset
+        frame_num_dict:
+            key => utterance name
+            value => the number of frames
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        dtype: data type of the stacked inputs
+    Returns:
+        An instance of `StackedCacheReader`, or None if there is no cache or
+            it is stale
+    """
+    cache_path = stacked_cache_path(dataset_path, num_stack, num_skip)
+    manifest_path = join(cache_path, 'manifest.json')
+    if not isfile(manifest_path):
+        return None
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('hash') != manifest_hash(dataset_path, frame_num_dict,
+                                             num_stack, num_skip, dtype):
+        return None
+    return StackedCacheReader(cache_path)
+
+
+def build_stacked_cache(dataset_path, num_stack, num_skip, dtype=np.float32,
+                        is_progressbar=False):
+    """Stack frames of all utterances in the dataset and write the cache.
+       Inputs are read from the shard if it has been packed.
+    Args:
+        dataset_path: path to the dataset
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        dtype: data type of the stacked inputs
+        is_progressbar: if True, visualize progressbar
+    Returns:
+        save_path: path to the cache directory
+    """
+    frame_num_dict = load_frame_num_dict(dataset_path)
+    input_names = [input_name for input_name, _ in sorted(
+        frame_num_dict.items(), key=lambda x: x[1])]
+    shard = open_shard(dataset_path)
+    rel_paths = find_input_paths(dataset_path) if shard is None else None
+
+    def stacked_inputs():
+        for input_name in input_names:
+            if shard is not None:
+                inputs = shard.input(input_name)
+            else:
+                inputs = np.load(join(dataset_path, 'input',
+                                      rel_paths[input_name]))
+            yield stack_frame_utt(inputs[:frame_num_dict[input_name]],
+                                  num_stack, num_skip, dtype=dtype)
+
+    return save_stacked_cache(dataset_path, input_names, stacked_inputs(),
+                              frame_num_dict, num_stack, num_skip,
+                              dtype=dtype, is_progressbar=is_progressbar)
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) != 4:
+        raise ValueError(
+            ("Set a path to the dataset and stacking parameters.\n"
+             "Usage: python stacked_cache.py path_to_dataset num_stack "
+             "num_skip"))
+    print('=> Stacking frames of ' + args[1] + '...')
+    print('   saved in ' + build_stacked_cache(
+        args[1], int(args[2]), int(args[3]), is_progressbar=True))
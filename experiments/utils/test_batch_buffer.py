@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../')
+from utils.batch_buffer import BatchBuffer
+
+
+class TestBatchBuffer(unittest.TestCase):
+
+    def test_shape(self):
+        batch_buffer = BatchBuffer(dtype=np.float32, frame_bucket=16)
+        inputs = batch_buffer.empty(4, 10, 3)
+        self.assertEqual((4, 10, 3), inputs.shape)
+        self.assertEqual(np.float32, inputs.dtype)
+        self.assertTrue(inputs.flags['C_CONTIGUOUS'])
+        self.assertTrue(np.all(batch_buffer.zeros(2, 5, 3) == 0))
+
+    def test_reuse(self):
+        batch_buffer = BatchBuffer(frame_bucket=16, max_buffer_num=2)
+
+        # Mini-batches in use are not overwritten
+        inputs1 = batch_buffer.zeros(4, 10, 3)
+        inputs2 = batch_buffer.empty(4, 12, 3)
+        inputs2.fill(1)
+        self.assertEqual(2, batch_buffer.allocated_num)
+        self.assertTrue(np.all(inputs1 == 0))
+        self.assertFalse(np.shares_memory(inputs1, inputs2))
+
+        # Dropping references does not release a buffer
+        first_utt = inputs1[0]
+        del inputs1
+        inputs3 = batch_buffer.empty(4, 16, 3)
+        self.assertEqual(3, batch_buffer.allocated_num)
+        self.assertFalse(np.shares_memory(first_utt, inputs3))
+
+        # Released buffers are reused for the same bucket
+        batch_buffer.release(first_utt)
+        batch_buffer.release(inputs3)  # Not kept in the pool
+        inputs4 = batch_buffer.empty(4, 9, 3)
+        self.assertEqual(3, batch_buffer.allocated_num)
+        self.assertEqual(1, batch_buffer.reused_num)
+        self.assertTrue(np.shares_memory(first_utt, inputs4))
+
+        # Different bucket
+        inputs5 = batch_buffer.empty(4, 17, 3)
+        self.assertEqual(4, batch_buffer.allocated_num)
+        self.assertEqual(
+            2 * 4 * 16 * 3 * 4 + 4 * 32 * 3 * 4, batch_buffer.nbytes)
+
+        # Lists of towers (copies) are ignored
+        batch_buffer.release([inputs2, inputs4])
+        self.assertFalse(np.shares_memory(
+            inputs5, batch_buffer.empty(4, 20, 3)))
+
+
+if __name__ == '__main__':
+    unittest.main()
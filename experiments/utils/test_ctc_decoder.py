@@ -0,0 +1,163 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import itertools
+import unittest
+import numpy as np
+
+sys.path.append('../')
+from utils.ctc_decoder import GreedyDecoder, PrefixBeamSearchDecoder
+from utils.ctc_decoder import BatchPrefixBeamSearch, split_posteriors
+
+
+def collapse(path, blank_index):
+    labels = []
+    prev = None
+    for c in path:
+        if c != blank_index and c != prev:
+            labels.append(c)
+        prev = c
+    return tuple(labels)
+
+
+def random_posteriors(frame_num, num_classes, seed):
+    np.random.seed(seed)
+    logits = np.random.randn(frame_num, num_classes) * 2
+    return np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+
+
+class PenaltyScorer(object):
+    """Penalize a label."""
+
+    def __init__(self, label, penalty):
+        self.label = label
+        self.penalty = penalty
+
+    def score(self, prefix, label):
+        return -self.penalty if label == self.label else 0.
+
+
+class TestCTCDecoder(unittest.TestCase):
+
+    def test_greedy(self):
+        blank_index = 3
+        indices = [3, 0, 0, 3, 0, 1, 1, 3, 2, 2]
+        posteriors = np.eye(4)[indices]
+        decoder = GreedyDecoder(blank_index)
+        self.assertEqual([0, 0, 1, 2], decoder.step(posteriors))
+        self.assertEqual(1, decoder.first_token_frame)
+
+        # Repeated labels across chunks are merged
+        decoder.reset()
+        emitted = [decoder.step(posteriors[i:i + 3])
+                   for i in range(0, len(indices), 3)]
+        self.assertEqual([[0], [0, 1], [2], []], emitted)
+        self.assertEqual([0, 0, 1, 2], decoder.best())
+
+    def test_prefix_beam_search(self):
+        blank_index, frame_num, num_classes = 2, 5, 3
+        posteriors = random_posteriors(frame_num, num_classes, seed=0)
+
+        # Probabilities of all label sequences by enumerating paths
+        probs = {}
+        for path in itertools.product(range(num_classes), repeat=frame_num):
+            labels = collapse(path, blank_index)
+            prob = np.prod(posteriors[np.arange(frame_num), path])
+            probs[labels] = probs.get(labels, 0) + prob
+
+        # No pruning with a beam of all prefixes
+        decoder = PrefixBeamSearchDecoder(blank_index, beam_width=1000)
+        decoder.step(posteriors)
+        nbest = decoder.nbest()
+        self.assertEqual(len(probs), len(nbest))
+        for labels, log_prob in nbest:
+            self.assertAlmostEqual(probs[tuple(labels)], np.exp(log_prob))
+        self.assertEqual(list(max(probs, key=probs.get)), decoder.best())
+
+    def test_chunk(self):
+        posteriors = random_posteriors(30, 5, seed=1)
+        decoder = PrefixBeamSearchDecoder(blank_index=4, beam_width=8)
+        decoder.step(posteriors)
+        nbest = decoder.nbest()
+
+        decoder.reset()
+        for i in range(0, 30, 7):
+            decoder.step(posteriors[i:i + 7])
+        self.assertEqual([x[0] for x in nbest],
+                         [x[0] for x in decoder.nbest()])
+        self.assertEqual(30, decoder.frame_num)
+        self.assertTrue(0 <= decoder.first_token_frame < 30)
+
+    def test_pruning(self):
+        posteriors = random_posteriors(30, 6, seed=2)
+        decoder = PrefixBeamSearchDecoder(blank_index=5, beam_width=8)
+        decoder.step(posteriors)
+
+        # Top n of all labels is the same as no pruning
+        decoder_top_n = PrefixBeamSearchDecoder(blank_index=5, beam_width=8,
+                                                cutoff_top_n=5)
+        decoder_top_n.step(posteriors)
+        self.assertEqual(decoder.nbest(), decoder_top_n.nbest())
+
+        # Only the best label of each frame is the same as greedy decoding
+        # when the best label is not blank
+        posteriors[:, 5] = 0
+        decoder_top_1 = PrefixBeamSearchDecoder(blank_index=5, beam_width=1,
+                                                cutoff_top_n=1)
+        decoder_top_1.step(posteriors)
+        greedy = GreedyDecoder(blank_index=5)
+        greedy.step(posteriors)
+        self.assertEqual(greedy.best(), decoder_top_1.best())
+
+        # Frames of blank are skipped
+        posteriors = np.eye(4)[[3, 0, 3, 3, 0, 3, 1, 1, 3]] * 0.9 + 0.025
+        decoder = PrefixBeamSearchDecoder(blank_index=3, beam_width=4,
+                                          blank_skip_threshold=0.9)
+        decoder.step(posteriors)
+        self.assertEqual([0, 0, 1], decoder.best())
+
+    def test_scorer(self):
+        posteriors = np.eye(3)[[0, 2, 1, 2]] * 0.8 + 0.2 / 3
+        decoder = PrefixBeamSearchDecoder(blank_index=2, beam_width=10)
+        decoder.step(posteriors)
+        self.assertEqual([0, 1], decoder.best())
+
+        decoder = PrefixBeamSearchDecoder(
+            blank_index=2, beam_width=10, scorer=PenaltyScorer(0, 10.))
+        decoder.step(posteriors)
+        self.assertEqual([1], decoder.best())
+
+    def test_batch(self):
+        posteriors = [random_posteriors(frame_num, 5, seed=frame_num)
+                      for frame_num in [10, 20, 15, 5]]
+        labels_pred = []
+        for x in posteriors:
+            decoder = PrefixBeamSearchDecoder(blank_index=4, beam_width=5)
+            decoder.step(x)
+            labels_pred.append(decoder.best())
+
+        for num_workers, use_process in [(1, False), (2, False), (2, True)]:
+            batch_decoder = BatchPrefixBeamSearch(
+                blank_index=4, beam_width=5, num_workers=num_workers,
+                use_process=use_process)
+            self.assertEqual(labels_pred, batch_decoder.decode(posteriors))
+            batch_decoder.close()
+
+        # Time-major posteriors of `ctcBase.posteriors`
+        inputs_seq_len = [len(x) for x in posteriors]
+        padded = np.zeros((len(posteriors), 20, 5))
+        for i_batch, x in enumerate(posteriors):
+            padded[i_batch, :len(x)] = x
+        posteriors_2d = padded.transpose((1, 0, 2)).reshape((-1, 5))
+        for x, y in zip(posteriors,
+                        split_posteriors(posteriors_2d, inputs_seq_len)):
+            self.assertTrue(np.array_equal(x, y))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+import Levenshtein
+
+sys.path.append('../')
+from utils.edit_distance import edit_operations, batch_edit_operations
+from utils.edit_distance import ErrorCounter, remove_labels, _to_string
+
+
+def random_labels(rand_state, batch_size, num_classes=40, max_len=30):
+    return [rand_state.randint(0, num_classes,
+                               size=rand_state.randint(0, max_len)).tolist()
+            for _ in range(batch_size)]
+
+
+class TestEditDistance(unittest.TestCase):
+
+    def test(self):
+        print("Edit distance working check.")
+        self.check_operations()
+        self.check_workers()
+        self.check_counter()
+        self.check_remove_labels()
+
+    def check_operations(self):
+        self.assertEqual(edit_operations([1, 2, 3], [1, 2, 3]), (0, 0, 0))
+        self.assertEqual(edit_operations([1, 2, 3], [1, 4, 3]), (1, 0, 0))
+        self.assertEqual(edit_operations([1, 2, 3], [1, 2, 5, 3]), (0, 1, 0))
+        self.assertEqual(edit_operations([1, 2, 3], [1, 3]), (0, 0, 1))
+        self.assertEqual(edit_operations([], [1, 3]), (0, 2, 0))
+
+        # Indices larger than 255 are not merged
+        self.assertEqual(edit_operations([300, 556], [44, 300]), (0, 1, 1))
+
+        rand_state = np.random.RandomState(0)
+        labels_true = random_labels(rand_state, 100)
+        labels_pred = random_labels(rand_state, 100)
+        for label_true, label_pred in zip(labels_true, labels_pred):
+            self.assertEqual(
+                sum(edit_operations(label_true, label_pred)),
+                Levenshtein.distance(_to_string(label_true),
+                                     _to_string(label_pred)))
+
+        with self.assertRaises(ValueError):
+            edit_operations([-1], [1])
+
+    def check_workers(self):
+        rand_state = np.random.RandomState(1)
+        labels_true = random_labels(rand_state, 100)
+        labels_pred = random_labels(rand_state, 100)
+        ops = batch_edit_operations(labels_true, labels_pred)
+        ops_pool = batch_edit_operations(labels_true, labels_pred,
+                                         num_workers=2, chunk_size=16)
+        self.assertEqual(ops.shape, (100, 3))
+        self.assertTrue(np.array_equal(ops, ops_pool))
+
+    def check_counter(self):
+        counter = ErrorCounter()
+        counter.update([[1, 2, 3, 4]], [[1, 5, 3]])
+        counter.update([[1, 2, 3, 4, 5, 6]], [[1, 2, 3, 4, 5, 6, 7]])
+        self.assertEqual(counter.utt_num, 2)
+        self.assertEqual(counter.label_num, 10)
+        self.assertEqual(counter.error_num, 3)
+        rates = counter.rates()
+        self.assertAlmostEqual(rates['error'], 0.3)
+        self.assertAlmostEqual(rates['substitution'], 0.1)
+        self.assertAlmostEqual(rates['insertion'], 0.1)
+        self.assertAlmostEqual(rates['deletion'], 0.1)
+
+    def check_remove_labels(self):
+        labels = remove_labels([[0, 1, 0, 2], [0], [], [3]], [0])
+        self.assertEqual([label.tolist() for label in labels],
+                         [[1, 2], [], [], [3]])
+
+
+if __name__ == '__main__':
+    unittest.main()
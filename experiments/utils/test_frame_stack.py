@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../')
+from utils.frame_stack import stack_frame, stack_frame_utt, stack_frame_batch
+
+
+def stack_frame_loop(inputs, num_stack, num_skip):
+    """The per-frame implementation which `stack_frame` used before it was
+       vectorized. This is kept as the reference."""
+    input_size = inputs.shape[1]
+    frame_num = inputs.shape[0]
+    frame_num_decimated = frame_num / num_skip
+    if frame_num_decimated != int(frame_num_decimated):
+        frame_num_decimated += 1
+    frame_num_decimated = int(frame_num_decimated)
+
+    stacked_frames = np.zeros((frame_num_decimated, input_size * num_stack))
+    stack_count = 0
+    stack = []
+    for i_frame, frame in enumerate(inputs):
+        if i_frame == len(inputs) - 1:
+            stack.append(frame)
+            while stack_count != int(frame_num_decimated):
+                for i_stack in range(len(stack)):
+                    stacked_frames[stack_count][input_size *
+                                                i_stack:input_size * (i_stack + 1)] = stack[i_stack]
+                stack_count += 1
+                for _ in range(num_skip):
+                    if len(stack) != 0:
+                        stack.pop(0)
+        elif len(stack) < num_stack:
+            stack.append(frame)
+            if len(stack) == num_stack:
+                for i_stack in range(num_stack):
+                    stacked_frames[stack_count][input_size *
+                                                i_stack:input_size * (i_stack + 1)] = stack[i_stack]
+                stack_count += 1
+                for _ in range(num_skip):
+                    stack.pop(0)
+
+    return stacked_frames
+
+
+class TestFrameStack(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.input_size = 5
+        self.frame_nums = [1, 2, 3, 4, 5, 7, 10, 11, 12, 29]
+        self.input_list = [np.random.randn(frame_num, self.input_size)
+                           for frame_num in self.frame_nums]
+
+    def test_utt(self):
+        for num_stack, num_skip in [(1, 1), (3, 1), (3, 2), (3, 3),
+                                    (4, 2), (5, 3)]:
+            for inputs in self.input_list:
+                stacked = stack_frame_utt(inputs, num_stack, num_skip)
+                stacked_ref = stack_frame_loop(inputs, num_stack, num_skip)
+                self.assertEqual(stacked_ref.shape, stacked.shape)
+                self.assertTrue(np.array_equal(stacked_ref, stacked))
+
+    def test_no_copy(self):
+        inputs = np.random.randn(12, self.input_size)
+        stacked = stack_frame_utt(inputs, num_stack=3, num_skip=3)
+        self.assertTrue(np.shares_memory(inputs, stacked))
+
+    def test_dtype(self):
+        for inputs in self.input_list:
+            stacked = stack_frame_utt(inputs, 3, 2, dtype=np.float32)
+            self.assertEqual(np.float32, stacked.dtype)
+            self.assertTrue(np.allclose(
+                stack_frame_loop(inputs, 3, 2), stacked, atol=1e-6))
+
+    def test_list(self):
+        input_paths = ['/dataset/input/utt' + str(i) + '.npy'
+                       for i in range(len(self.input_list))]
+        frame_num_dict = {'utt' + str(i): frame_num
+                          for i, frame_num in enumerate(self.frame_nums)}
+        stacked_list = stack_frame(self.input_list, input_paths,
+                                   frame_num_dict, num_stack=3, num_skip=2)
+        for inputs, stacked in zip(self.input_list, stacked_list):
+            self.assertTrue(np.array_equal(
+                stack_frame_loop(inputs, 3, 2), stacked))
+
+    def test_batch(self):
+        num_stack, num_skip = 3, 2
+        max_time = max(self.frame_nums)
+        inputs = np.random.randn(
+            len(self.input_list), max_time, self.input_size)
+        for i_batch, data_i in enumerate(self.input_list):
+            inputs[i_batch, :data_i.shape[0]] = data_i
+        inputs_seq_len = np.array(self.frame_nums)
+
+        stacked, stacked_seq_len = stack_frame_batch(
+            inputs, num_stack, num_skip, inputs_seq_len)
+        for i_batch, data_i in enumerate(self.input_list):
+            stacked_ref = stack_frame_loop(data_i, num_stack, num_skip)
+            frame_num = stacked_ref.shape[0]
+            self.assertEqual(frame_num, stacked_seq_len[i_batch])
+            self.assertTrue(np.array_equal(
+                stacked_ref, stacked[i_batch, :frame_num]))
+            self.assertTrue(np.all(stacked[i_batch, frame_num:] == 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
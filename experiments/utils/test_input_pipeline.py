@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../')
+from utils.input_pipeline import QueueInputPipeline
+from utils.sampler import EpochSampler
+from utils.sparsetensor import list2sparsetensor
+
+
+class ToyDataSet(object):
+    """A dataset which has the same interface as `DataSet` of readers."""
+
+    def __init__(self, data_num, batch_size):
+        self.input_size = 3
+        self.input_list = [np.full((i % 7 + 1, 3), i, dtype=np.float32)
+                           for i in range(data_num)]
+        self.label_list = [np.arange(i % 4 + 1) + i for i in range(data_num)]
+        self.sampler = EpochSampler(data_num, batch_size, mode='sorted')
+        self.selected_indices = []
+
+    def batch_indices(self, batch_size=None):
+        indices, next_epoch_flag = self.sampler.next(batch_size)
+        self.selected_indices.append(indices)
+        return indices, next_epoch_flag
+
+    def utterances(self, indices):
+        return ([self.input_list[i] for i in indices],
+                [self.label_list[i] for i in indices],
+                [str(i) for i in indices])
+
+
+class TestInputPipeline(unittest.TestCase):
+
+    def test(self):
+        print("Input pipeline working check.")
+        dataset = ToyDataSet(data_num=20, batch_size=6)
+
+        with tf.Graph().as_default():
+            pipeline = QueueInputPipeline(dataset, capacity=2)
+            with tf.Session() as sess:
+                coord = tf.train.Coordinator()
+                threads = tf.train.start_queue_runners(sess=sess,
+                                                       coord=coord)
+                # 20 utterances in 4 mini-batches
+                for step in range(4):
+                    inputs, labels_st, inputs_seq_len = sess.run(
+                        [pipeline.inputs, pipeline.labels,
+                         pipeline.inputs_seq_len])
+
+                    # Mini-batches are dequeued in the order of selection
+                    indices = dataset.selected_indices[step]
+                    self.assertEqual(len(indices), 6 if step < 3 else 2)
+                    input_list, label_list, _ = dataset.utterances(indices)
+                    self.assertEqual(
+                        inputs.shape,
+                        (len(indices), max(len(x) for x in input_list), 3))
+                    for i_batch, x in enumerate(input_list):
+                        self.assertEqual(inputs_seq_len[i_batch], len(x))
+                        self.assertTrue(
+                            np.array_equal(inputs[i_batch, :len(x)], x))
+                        self.assertTrue(
+                            np.all(inputs[i_batch, len(x):] == 0))
+
+                    indices_true, values_true, shape_true = \
+                        list2sparsetensor(label_list)
+                    self.assertTrue(
+                        np.array_equal(labels_st.indices, indices_true))
+                    self.assertTrue(
+                        np.array_equal(labels_st.values, values_true))
+                    self.assertTrue(
+                        np.array_equal(labels_st.dense_shape, shape_true))
+
+                coord.request_stop()
+                coord.join(threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
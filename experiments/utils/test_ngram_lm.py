@@ -0,0 +1,133 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import math
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append('../')
+from utils.ngram_lm import load_arpa, NgramScorer
+from utils.ctc_decoder import PrefixBeamSearchDecoder
+
+ARPA = """
+\\data\\
+ngram 1=5
+ngram 2=4
+ngram 3=2
+
+\\1-grams:
+-1.0\t<s>\t-0.5
+-0.6\ta\t-0.3
+-0.8\tb\t-0.2
+-1.2\tc
+-0.9\t</s>
+
+\\2-grams:
+-0.2\t<s> a\t-0.1
+-0.4\ta b\t-0.25
+-0.3\tb a
+-0.5\tb </s>
+
+\\3-grams:
+-0.1\t<s> a b
+-0.05\ta b </s>
+
+\\end\\
+"""
+
+
+class TestNgramLM(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        arpa_path = os.path.join(self.tmp_path, 'lm.arpa')
+        with open(arpa_path, 'w') as f:
+            f.write(ARPA)
+        self.lm = load_arpa(arpa_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def log10_prob(self, context, token):
+        ids = tuple(self.lm.token_id(x) for x in context)
+        return self.lm.log10_prob(ids, self.lm.token_id(token))
+
+    def test_log10_prob(self):
+        a, b = self.lm.token_id('a'), self.lm.token_id('b')
+        self.assertEqual(3, self.lm.order)
+
+        # Found n-grams
+        log10_prob, state = self.log10_prob(['<s>', 'a'], 'b')
+        self.assertAlmostEqual(-0.1, log10_prob, places=6)
+        self.assertEqual((a, b), state)
+        self.assertAlmostEqual(-0.05, self.log10_prob(['a', 'b'], '</s>')[0],
+                               places=6)
+
+        # Back off: p(c | a b) = bo(a b) + bo(b) + p(c)
+        log10_prob, state = self.log10_prob(['a', 'b'], 'c')
+        self.assertAlmostEqual(-0.25 - 0.2 - 1.2, log10_prob, places=6)
+        # "b c" is not in the LM
+        self.assertEqual((self.lm.token_id('c'),), state)
+
+        # p(a | b b) = p(a | b)
+        log10_prob, state = self.log10_prob(['b', 'b'], 'a')
+        self.assertAlmostEqual(-0.3, log10_prob, places=6)
+        self.assertEqual((b, a), state)
+
+        self.assertAlmostEqual(-0.2 - 0.1 - 0.05,
+                               self.lm.score_sentence(['a', 'b']), places=5)
+
+    def test_scorer(self):
+        labels = ['a', 'b', 'c']
+        scorer = NgramScorer(self.lm, labels, lm_weight=0.5,
+                             insertion_bonus=1.)
+        score = scorer.score((), 0) + scorer.score((0,), 1)
+        self.assertAlmostEqual(0.5 * (-0.2 - 0.1) * math.log(10) + 2, score,
+                               places=5)
+        self.assertAlmostEqual(0.5 * -0.05 * math.log(10),
+                               scorer.final_score((0, 1)), places=5)
+
+        # The state of a prefix is recomputed after the cache is cleared
+        scorer._states.clear()
+        self.assertAlmostEqual(0.5 * -0.05 * math.log(10),
+                               scorer.final_score((0, 1)), places=5)
+
+    def test_word_scorer(self):
+        # Words of the LM are spelled by characters separated by "_"
+        lm = self.lm
+        labels = ['a', 'b', '_']
+        scorer = NgramScorer(lm, labels, lm_weight=1.0, space_label='_')
+        self.assertEqual(0., scorer.score((), 0))
+        score = scorer.score((0,), 2)
+        self.assertAlmostEqual(-0.2 * math.log(10), score, places=5)
+        self.assertEqual(0., scorer.score((0, 2), 2))
+        # "ab" is an unknown word
+        self.assertAlmostEqual((-100 - 0.9) * math.log(10),
+                               scorer.final_score((0, 1)), places=3)
+
+    def test_fusion(self):
+        # CTC prefers "a c", and the LM prefers "a b"
+        labels = ['a', 'b', 'c']
+        posteriors = np.array([[0.8, 0.05, 0.05, 0.1],
+                               [0.05, 0.4, 0.45, 0.1]])
+        decoder = PrefixBeamSearchDecoder(blank_index=3, beam_width=10)
+        decoder.step(posteriors)
+        self.assertEqual([0, 2], decoder.best(is_final=True))
+
+        scorer = NgramScorer(self.lm, labels, lm_weight=0.5)
+        decoder = PrefixBeamSearchDecoder(blank_index=3, beam_width=10,
+                                          scorer=scorer)
+        decoder.step(posteriors)
+        self.assertEqual([0, 1], decoder.best(is_final=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
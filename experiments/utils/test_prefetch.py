@@ -0,0 +1,125 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import unittest
+import numpy as np
+
+sys.path.append('../')
+from utils.prefetch import BatchPrefetcher
+from utils.sampler import EpochSampler
+from utils.batch_buffer import BatchBuffer
+
+
+class ToyDataSet(object):
+    """A dataset which has the same interface as `DataSet` of readers."""
+
+    def __init__(self, data_num, batch_size, delay=0.):
+        self.data_num = data_num
+        self.batch_size = batch_size
+        self.num_gpu = 1
+        self.delay = delay
+        self.input_list = [np.full((i % 7 + 1, 2), i, dtype=np.float32)
+                           for i in range(data_num)]
+        self.sampler = EpochSampler(data_num, batch_size, mode='shuffled')
+
+    def batch_indices(self, batch_size=None):
+        return self.sampler.next(batch_size)
+
+    def make_batch(self, indices):
+        # Make later batches faster to shuffle the order of completion
+        time.sleep(self.delay * (indices[0] % 3))
+        max_frame_num = max(self.input_list[i].shape[0] for i in indices)
+        inputs = np.zeros((len(indices), max_frame_num, 2), dtype=np.float32)
+        for i_batch, i in enumerate(indices):
+            inputs[i_batch, :self.input_list[i].shape[0]] = self.input_list[i]
+        return inputs, list(indices)
+
+
+class BufferedToyDataSet(ToyDataSet):
+    """`ToyDataSet` which makes mini-batches in reused buffers."""
+
+    def __init__(self, data_num, batch_size):
+        ToyDataSet.__init__(self, data_num, batch_size)
+        self.batch_buffer = BatchBuffer(frame_bucket=8)
+
+    def make_batch(self, indices):
+        max_frame_num = max(self.input_list[i].shape[0] for i in indices)
+        inputs = self.batch_buffer.zeros(len(indices), max_frame_num, 2)
+        for i_batch, i in enumerate(indices):
+            inputs[i_batch, :self.input_list[i].shape[0]] = self.input_list[i]
+        return inputs, list(indices)
+
+    def release(self, inputs):
+        self.batch_buffer.release(inputs)
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def read_all(self, num_workers, use_process=False, seed=1):
+        dataset = ToyDataSet(data_num=50, batch_size=8, delay=0.002)
+        with BatchPrefetcher(dataset, num_workers=num_workers,
+                             use_process=use_process, queue_size=2,
+                             seed=seed, num_epoch=2) as prefetcher:
+            batches = [indices for _, indices in prefetcher]
+            stats = prefetcher.stats()
+        return batches, stats
+
+    def test_deterministic(self):
+        batches, stats = self.read_all(num_workers=1)
+        # 50 utterances in 7 mini-batches per epoch
+        self.assertEqual(14, len(batches))
+        self.assertEqual(14, stats['batch_num'])
+        for epoch in range(2):
+            indices = sum(batches[epoch * 7:(epoch + 1) * 7], [])
+            self.assertEqual(list(range(50)), sorted(indices))
+
+        self.assertEqual(batches, self.read_all(num_workers=4)[0])
+        self.assertEqual(batches, self.read_all(num_workers=3,
+                                                use_process=True)[0])
+        self.assertNotEqual(batches, self.read_all(num_workers=1, seed=2)[0])
+
+    def test_stats(self):
+        _, stats = self.read_all(num_workers=2)
+        self.assertEqual(2, stats['capacity'])
+        self.assertEqual(0, stats['queue_size'])
+        self.assertTrue(0 <= stats['mean_queue_size'] <= 2)
+        self.assertTrue(stats['starved_num'] <= stats['batch_num'] + 1)
+
+    def test_close(self):
+        dataset = ToyDataSet(data_num=50, batch_size=8)
+        prefetcher = BatchPrefetcher(dataset, num_workers=2, queue_size=2)
+        for _ in range(20):
+            inputs, indices = next(prefetcher)
+            self.assertEqual(len(indices), inputs.shape[0])
+        prefetcher.close()
+        self.assertFalse(prefetcher._thread.is_alive())
+        self.assertRaises(StopIteration, next, prefetcher)
+
+    def test_release(self):
+        dataset = BufferedToyDataSet(data_num=50, batch_size=8)
+        with BatchPrefetcher(dataset, num_workers=2, queue_size=2,
+                             num_epoch=3) as prefetcher:
+            for inputs, indices in prefetcher:
+                # Mini-batches in the queue or in use are not overwritten
+                for i_batch, i in enumerate(indices):
+                    frame_num = dataset.input_list[i].shape[0]
+                    self.assertTrue(np.all(inputs[i_batch, :frame_num] == i))
+                    self.assertTrue(np.all(inputs[i_batch, frame_num:] == 0))
+        self.assertTrue(dataset.batch_buffer.reused_num > 0)
+
+    def test_error(self):
+        dataset = ToyDataSet(data_num=10, batch_size=4)
+        dataset.input_list = None
+        prefetcher = BatchPrefetcher(dataset)
+        self.assertRaises(TypeError, next, prefetcher)
+        prefetcher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../')
+from utils.sampler import EpochSampler, auto_bucket_boundaries
+from utils.sampler import padding_ratio, padding_report
+from utils.sampler import sampler_params_from_config
+
+
+class TestEpochSampler(unittest.TestCase):
+
+    def read_epoch(self, sampler, batch_size=None):
+        batches = []
+        while True:
+            indices, next_epoch_flag = sampler.next(batch_size)
+            batches.append(indices)
+            if next_epoch_flag:
+                return batches
+
+    def check_epoch(self, batches, data_num, batch_size):
+        self.assertEqual(list(range(data_num)),
+                         sorted(np.concatenate(batches).tolist()))
+        for indices in batches:
+            self.assertTrue(0 < len(indices) <= batch_size)
+
+    def test_sorted(self):
+        sampler = EpochSampler(23, 5, mode='sorted', seed=0)
+        batches = self.read_epoch(sampler)
+        self.check_epoch(batches, 23, 5)
+        self.assertEqual(5, len(batches))
+        for i, indices in enumerate(batches):
+            self.assertEqual(list(range(i * 5, min(i * 5 + 5, 23))),
+                             sorted(indices))
+
+    def test_shuffled(self):
+        sampler = EpochSampler(23, 5, mode='shuffled', seed=0)
+        epoch1 = self.read_epoch(sampler)
+        epoch2 = self.read_epoch(sampler)
+        self.check_epoch(epoch1, 23, 5)
+        self.check_epoch(epoch2, 23, 5)
+        self.assertNotEqual(np.concatenate(epoch1).tolist(),
+                            np.concatenate(epoch2).tolist())
+        self.assertEqual(2, sampler.epoch)
+
+        # Change batch_size in the middle of an epoch
+        sampler.next(5)
+        batches = self.read_epoch(sampler, batch_size=7)
+        self.assertEqual([7, 7, 4], [len(indices) for indices in batches])
+
+    def test_bucketed(self):
+        frame_nums = np.random.RandomState(0).randint(1, 1000, size=100)
+        sampler = EpochSampler(100, 10, mode='bucketed',
+                               frame_nums=frame_nums, seed=0)
+        batches = self.read_epoch(sampler)
+        self.check_epoch(batches, 100, 10)
+        # Each mini-batch is a run of the sorted frame nums
+        sorted_frame_nums = np.sort(frame_nums)
+        for indices in batches:
+            batch_frame_nums = np.sort(frame_nums[indices])
+            start = np.searchsorted(sorted_frame_nums, batch_frame_nums[0])
+            self.assertEqual(
+                sorted_frame_nums[start:start + 10].tolist(),
+                batch_frame_nums.tolist())
+
+        self.assertRaises(ValueError, EpochSampler, 100, 10, 'bucketed')
+
+    def test_bucket_boundaries(self):
+        frame_nums = np.random.RandomState(0).randint(1, 1000, size=200)
+        boundaries = [100, 300, 600]
+        sampler = EpochSampler(200, 16, mode='bucketed',
+                               frame_nums=frame_nums, seed=0,
+                               bucket_boundaries=boundaries)
+        batches = self.read_epoch(sampler)
+        self.check_epoch(batches, 200, 16)
+        for indices in batches:
+            bucket_ids = np.searchsorted(boundaries, frame_nums[indices],
+                                         side='right')
+            self.assertEqual(1, len(set(bucket_ids)))
+
+        # Batches are shuffled within and across buckets
+        epoch2 = self.read_epoch(sampler)
+        self.assertNotEqual([indices.tolist() for indices in batches],
+                            [indices.tolist() for indices in epoch2])
+
+    def test_frame_budget(self):
+        frame_nums = np.random.RandomState(0).randint(1, 1000, size=500)
+        sampler = EpochSampler(500, 64, mode='bucketed',
+                               frame_nums=frame_nums, seed=0,
+                               num_buckets=8, frame_budget=4000)
+        batches = self.read_epoch(sampler)
+        self.check_epoch(batches, 500, 64)
+        for indices in batches:
+            self.assertTrue(
+                len(indices) * np.max(frame_nums[indices]) <= 4000)
+
+        self.assertRaises(ValueError, EpochSampler, 500, 64, 'bucketed',
+                          frame_nums, None, None, None, 4000)
+
+    def test_budget(self):
+        frame_nums = np.random.RandomState(0).randint(1, 500, size=300)
+        for budget_type in ['total', 'padded']:
+            sampler = EpochSampler(300, 16, mode='budget',
+                                   frame_nums=frame_nums, seed=0,
+                                   frame_budget=2000,
+                                   budget_type=budget_type)
+            num_batches = sampler.num_batches
+            for _ in range(3):
+                batches = self.read_epoch(sampler)
+                self.check_epoch(batches, 300, 16)
+                self.assertEqual(num_batches, len(batches))
+                for indices in batches:
+                    if budget_type == 'total':
+                        frame_num_batch = np.sum(frame_nums[indices])
+                    else:
+                        frame_num_batch = len(indices) * \
+                            np.max(frame_nums[indices])
+                    if len(indices) > 1:
+                        self.assertTrue(frame_num_batch <= 2000)
+
+        self.assertRaises(ValueError, EpochSampler, 300, 16, 'budget',
+                          frame_nums)
+
+    def test_config(self):
+        self.assertIsNone(sampler_params_from_config({'batch_size': 32}))
+        self.assertIsNone(sampler_params_from_config({'sampler': None}))
+        param = {'batch_size': 32, 'sampler': 'budget',
+                 'frame_budget': 10000, 'budget_type': None}
+        self.assertEqual({'mode': 'budget', 'frame_budget': 10000},
+                         sampler_params_from_config(param))
+
+    def test_auto_bucket_boundaries(self):
+        frame_nums = np.arange(1, 1001)
+        boundaries = auto_bucket_boundaries(frame_nums, 4)
+        self.assertEqual([251, 501, 751], boundaries.tolist())
+        counts = np.bincount(np.searchsorted(boundaries, frame_nums,
+                                             side='right'))
+        self.assertEqual([250, 250, 250, 250], counts.tolist())
+
+    def test_padding_ratio(self):
+        frame_nums = np.array([10, 5, 5, 10])
+        self.assertEqual(0.25, padding_ratio([[0, 1], [2, 3]], frame_nums))
+        self.assertEqual(0., padding_ratio([[0, 3], [1, 2]], frame_nums))
+
+        frame_nums = np.random.RandomState(0).randint(1, 1000, size=1000)
+        report = padding_report(frame_nums, 32, num_buckets=10)
+        self.assertTrue(report['bucketed'][0] < report['shuffled'][0])
+        self.assertTrue(report['sorted'][0] <= report['bucketed'][0])
+
+    def test_resume(self):
+        sampler = EpochSampler(50, 4, mode='shuffled', seed=3)
+        self.read_epoch(sampler)
+        sampler.next()
+        state = sampler.state()
+        rest = self.read_epoch(sampler)
+
+        sampler_resumed = EpochSampler(50, 4, mode='shuffled')
+        sampler_resumed.load_state(state)
+        rest_resumed = self.read_epoch(sampler_resumed)
+        self.assertEqual([indices.tolist() for indices in rest],
+                         [indices.tolist() for indices in rest_resumed])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join
+import sys
+import shutil
+import pickle
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append('../')
+from utils.shard import pack_dataset, open_shard
+
+
+class TestShard(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.dataset_path = tempfile.mkdtemp()
+        os.makedirs(join(self.dataset_path, 'input', 'A01'))
+        os.makedirs(join(self.dataset_path, 'label', 'A01'))
+
+        self.inputs, self.labels, frame_num_dict = {}, {}, {}
+        for i, frame_num in enumerate([7, 3, 12, 5]):
+            input_name = 'A01_' + str(i)
+            self.inputs[input_name] = np.random.randn(
+                frame_num, 4).astype(np.float32)
+            self.labels[input_name] = np.random.randint(
+                0, 10, size=(i + 1,)).astype(np.int32)
+            frame_num_dict[input_name] = frame_num
+            np.save(join(self.dataset_path, 'input', 'A01',
+                         input_name + '.npy'), self.inputs[input_name])
+            np.save(join(self.dataset_path, 'label', 'A01',
+                         input_name + '.npy'), self.labels[input_name])
+        with open(join(self.dataset_path, 'frame_num.pickle'), 'wb') as f:
+            pickle.dump(frame_num_dict, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.dataset_path)
+
+    def test_pack(self):
+        self.assertIsNone(open_shard(self.dataset_path))
+        pack_dataset(self.dataset_path)
+        shard = open_shard(self.dataset_path)
+
+        self.assertEqual(len(self.inputs), len(shard))
+        self.assertEqual(4, shard.input_size)
+        # Sorted by frame num
+        self.assertEqual(['A01_1', 'A01_3', 'A01_0', 'A01_2'],
+                         shard.input_names)
+        for input_name in self.inputs.keys():
+            self.assertEqual(self.inputs[input_name].shape[0],
+                             shard.frame_num(input_name))
+            self.assertTrue(np.array_equal(self.inputs[input_name],
+                                           shard.input(input_name)))
+            self.assertTrue(np.array_equal(self.labels[input_name],
+                                           shard.label(input_name)))
+        del shard
+
+
+if __name__ == '__main__':
+    unittest.main()
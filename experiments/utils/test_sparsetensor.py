@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../')
+from utils.sparsetensor import list2sparsetensor, sparsetensor2list
+
+
+def list2sparsetensor_loop(labels):
+    """The loop implementation used before it was vectorized."""
+    indices, values = [], []
+    for i_utt, each_label in enumerate(labels):
+        for i_l, l in enumerate(each_label):
+            if l == -1:
+                break
+            indices.append([i_utt, i_l])
+            values.append(l)
+    dense_shape = [len(labels), np.asarray(indices).max(0)[1] + 1]
+    return [np.array(indices), np.array(values), np.array(dense_shape)]
+
+
+class TestSparseTensor(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.labels = [np.random.randint(0, 30, size=(label_len,))
+                       for label_len in [5, 1, 8, 3, 8]]
+        self.labels_padded = np.full((5, 10), -1, dtype=int)
+        for i_batch, label in enumerate(self.labels):
+            self.labels_padded[i_batch, :len(label)] = label
+
+    def check_equal(self, labels_st_ref, labels_st):
+        for array_ref, array in zip(labels_st_ref, labels_st):
+            self.assertTrue(np.array_equal(array_ref, array))
+
+    def test_padded(self):
+        self.check_equal(list2sparsetensor_loop(self.labels_padded),
+                         list2sparsetensor(self.labels_padded))
+
+        # Labels after -1 are ignored
+        self.labels_padded[2, 4] = -1
+        self.check_equal(list2sparsetensor_loop(self.labels_padded),
+                         list2sparsetensor(self.labels_padded))
+
+    def test_ragged(self):
+        self.check_equal(list2sparsetensor_loop(self.labels_padded),
+                         list2sparsetensor(self.labels))
+        labels = [label.tolist() + [-1, 3] for label in self.labels]
+        self.check_equal(list2sparsetensor_loop(self.labels_padded),
+                         list2sparsetensor(labels))
+
+    def test_dtype(self):
+        for labels in [self.labels_padded, self.labels, [[], []]]:
+            indices, values, dense_shape = list2sparsetensor(
+                labels, dtype=np.int32)
+            self.assertEqual(np.int64, indices.dtype)
+            self.assertEqual(np.int32, values.dtype)
+            self.assertEqual(np.int64, dense_shape.dtype)
+
+    def test_empty(self):
+        labels = [[], [3, 4], [], [5]]
+        indices, values, dense_shape = list2sparsetensor(labels)
+        self.assertEqual([[1, 0], [1, 1], [3, 0]], indices.tolist())
+        self.assertEqual([4, 2], dense_shape.tolist())
+        self.assertEqual(labels, sparsetensor2list(
+            [indices, values, dense_shape], batch_size=4))
+
+        labels_st = list2sparsetensor(np.full((3, 4), -1, dtype=int))
+        self.assertEqual([3, 0], labels_st[2].tolist())
+        self.assertEqual([[], [], []],
+                         sparsetensor2list(labels_st, batch_size=3))
+
+    def test_round_trip(self):
+        labels_st = list2sparsetensor(self.labels_padded)
+        labels = sparsetensor2list(labels_st, batch_size=5)
+        self.assertEqual([label.tolist() for label in self.labels], labels)
+
+
+if __name__ == '__main__':
+    unittest.main()
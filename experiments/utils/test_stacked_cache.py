@@ -0,0 +1,109 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join, isdir
+import sys
+import shutil
+import pickle
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append('../')
+from utils.stacked_cache import (build_stacked_cache, open_stacked_cache,
+                                 save_stacked_cache, stacked_cache_path)
+from utils.frame_stack import stack_frame_utt
+from utils.shard import pack_dataset
+
+
+class TestStackedCache(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.dataset_path = tempfile.mkdtemp()
+        os.makedirs(join(self.dataset_path, 'input', 'A01'))
+        os.makedirs(join(self.dataset_path, 'label', 'A01'))
+
+        self.inputs, self.frame_num_dict = {}, {}
+        for i, frame_num in enumerate([7, 3, 12, 5]):
+            input_name = 'A01_' + str(i)
+            self.inputs[input_name] = np.random.randn(frame_num, 4)
+            self.frame_num_dict[input_name] = frame_num
+            np.save(join(self.dataset_path, 'input', 'A01',
+                         input_name + '.npy'), self.inputs[input_name])
+            np.save(join(self.dataset_path, 'label', 'A01',
+                         input_name + '.npy'), np.arange(i + 1))
+        with open(join(self.dataset_path, 'frame_num.pickle'), 'wb') as f:
+            pickle.dump(self.frame_num_dict, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.dataset_path)
+
+    def check_cache(self, num_stack, num_skip):
+        cache = open_stacked_cache(self.dataset_path, self.frame_num_dict,
+                                   num_stack, num_skip)
+        self.assertIsNotNone(cache)
+        self.assertEqual(len(self.inputs), len(cache))
+        self.assertEqual(4 * num_stack, cache.input_size)
+        for input_name, inputs in self.inputs.items():
+            stacked = cache.input(input_name)
+            self.assertEqual(np.float32, stacked.dtype)
+            self.assertTrue(np.allclose(
+                stack_frame_utt(inputs, num_stack, num_skip), stacked,
+                atol=1e-6))
+
+    def test_build(self):
+        self.assertIsNone(open_stacked_cache(
+            self.dataset_path, self.frame_num_dict, 3, 2))
+        build_stacked_cache(self.dataset_path, 3, 2)
+        self.check_cache(3, 2)
+
+        # The cache is kept for each parameter
+        self.assertIsNone(open_stacked_cache(
+            self.dataset_path, self.frame_num_dict, 3, 3))
+        self.assertIsNone(open_stacked_cache(
+            self.dataset_path, self.frame_num_dict, 3, 2, dtype=np.float64))
+
+        # Read from the shard. Packing the dataset makes old caches stale.
+        pack_dataset(self.dataset_path)
+        self.assertIsNone(open_stacked_cache(
+            self.dataset_path, self.frame_num_dict, 3, 2))
+        build_stacked_cache(self.dataset_path, 3, 3)
+        self.check_cache(3, 3)
+
+    def test_save(self):
+        input_names = sorted(self.inputs.keys())
+        save_stacked_cache(
+            self.dataset_path, input_names,
+            [stack_frame_utt(self.inputs[input_name], 2, 2)
+             for input_name in input_names],
+            self.frame_num_dict, 2, 2)
+        self.check_cache(2, 2)
+        # Temporary directories are removed
+        self.assertEqual(['stack2_skip2'],
+                         os.listdir(join(self.dataset_path, 'stacked')))
+
+        # Stale after the source data changes
+        self.frame_num_dict['A01_0'] = 6
+        self.assertIsNone(open_stacked_cache(
+            self.dataset_path, self.frame_num_dict, 2, 2))
+
+        # Overwrite
+        save_stacked_cache(
+            self.dataset_path, input_names,
+            [stack_frame_utt(
+                self.inputs[input_name][:self.frame_num_dict[input_name]],
+                2, 2) for input_name in input_names],
+            self.frame_num_dict, 2, 2)
+        self.assertTrue(isdir(stacked_cache_path(self.dataset_path, 2, 2)))
+        self.assertIsNotNone(open_stacked_cache(
+            self.dataset_path, self.frame_num_dict, 2, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../')
+sys.path.append('../../')
+from utils.tower import CTCTowers, tower_devices, tower_session_config
+from utils.tower import tower_step_times, parallel_efficiency
+from utils.tower import scaling_efficiency
+from utils.tower_split import balance_towers
+from utils.sparsetensor import list2sparsetensor
+from models.ctc.load_model import load
+
+
+class TestTower(unittest.TestCase):
+
+    def test_devices(self):
+        self.assertEqual((['/gpu:0', '/gpu:1'], '/cpu:0'),
+                         tower_devices(2, 'gpu'))
+        self.assertEqual((['/cpu:1', '/cpu:2', '/cpu:3'], '/cpu:0'),
+                         tower_devices(3, 'cpu'))
+
+        config = tower_session_config(2, 'cpu', intra_op_threads=3)
+        self.assertEqual(3, config.device_count['CPU'])
+        self.assertEqual(6, config.intra_op_parallelism_threads)
+
+    def test_step_times(self):
+        run_metadata = tf.RunMetadata()
+        for device, spans in [
+                ('/job:localhost/replica:0/task:0/cpu:1', [(10, 5), (20, 10)]),
+                ('/job:localhost/replica:0/task:0/device:CPU:2', [(0, 40)]),
+                ('/job:localhost/replica:0/task:0/gpu:0/stream:all',
+                 [(0, 1000000)])]:
+            dev_stats = run_metadata.step_stats.dev_stats.add()
+            dev_stats.device = device
+            for start, duration in spans:
+                node_stats = dev_stats.node_stats.add()
+                node_stats.all_start_micros = start
+                node_stats.all_end_rel_micros = duration
+
+        times = tower_step_times(run_metadata, ['/cpu:1', '/cpu:2', '/cpu:3'])
+        self.assertTrue(np.allclose([20e-6, 40e-6, 0], times))
+        self.assertTrue(np.allclose(
+            [1.], tower_step_times(run_metadata, ['/gpu:0'])))
+
+        self.assertAlmostEqual(0.75, parallel_efficiency([3, 3], 4))
+        self.assertAlmostEqual(0.5, scaling_efficiency(300, 150, 4))
+
+    def test_towers(self):
+        losses, _ = self.check_towers([9, 3, 7, 5, 8, 4])
+
+        # The weighted mean of losses of towers is the loss of the whole
+        # mini-batch
+        self.assertAlmostEqual(losses[0], losses[1], places=4)
+
+    def test_fewer_utterances(self):
+        # The last mini-batch of an epoch may have fewer utterances than
+        # towers
+        losses, params = self.check_towers([9])
+        self.assertAlmostEqual(losses[0], losses[1], places=4)
+        # The unused tower does not change the update
+        for name in params[0]:
+            self.assertTrue(np.allclose(params[0][name], params[1][name],
+                                        atol=1e-6))
+
+    def check_towers(self, frame_nums):
+        """Train one step with 1 and 2 towers.
+        Args:
+            frame_nums: list of frame nums of utterances of a mini-batch
+        Returns:
+            losses: list of losses of 1 and 2 towers
+            params: list of dictionaries of parameters after the update
+        """
+        np.random.seed(0)
+        batch_size, input_size, num_classes = len(frame_nums), 5, 4
+        inputs = np.zeros((batch_size, max(frame_nums), input_size),
+                          dtype=np.float32)
+        for i, frame_num in enumerate(frame_nums):
+            inputs[i, :frame_num] = np.random.randn(frame_num, input_size)
+        inputs_seq_len = np.array(frame_nums, dtype=np.int64)
+        labels = np.full((batch_size, 3), -1, dtype=np.int32)
+        for i in range(batch_size):
+            labels[i, :i % 3 + 1] = np.random.randint(num_classes,
+                                                      size=i % 3 + 1)
+
+        losses, params = [], []
+        for num_tower in [1, 2]:
+            devices, ps_device = tower_devices(num_tower, 'cpu')
+            with tf.Graph().as_default(), tf.device(ps_device):
+                tf.set_random_seed(0)
+                network = load('blstm_ctc')(
+                    batch_size=batch_size, input_size=input_size,
+                    num_unit=8, num_layer=2, output_size=num_classes,
+                    clip_grad=5.0)
+                towers = CTCTowers(network, devices, ps_device=ps_device)
+                train_op = network.train_towers(
+                    towers.losses, towers.weights, optimizer='sgd',
+                    learning_rate_init=0.1, clip_grad_by_norm=True)
+
+                # Variables are shared
+                var_names = [v.name for v in tf.trainable_variables()]
+                self.assertEqual(len(set(var_names)), len(var_names))
+                for name in var_names:
+                    self.assertFalse(name.startswith('tower'))
+
+                shards = balance_towers(frame_nums, num_tower)
+                feed_dict = towers.feed_dict(
+                    [inputs[t, :inputs_seq_len[t].max()] for t in shards],
+                    [list2sparsetensor(labels[t], dtype=np.int32)
+                     for t in shards],
+                    [inputs_seq_len[t] for t in shards])
+                feed_dict[network.keep_prob_input] = 1.0
+                feed_dict[network.keep_prob_hidden] = 1.0
+
+                config = tower_session_config(num_tower, 'cpu',
+                                              intra_op_threads=1)
+                with tf.Session(config=config) as sess:
+                    sess.run(tf.global_variables_initializer())
+                    # Initialize all towers with the same parameters
+                    values = dict((v.name, np.random.RandomState(
+                        len(v.name)).uniform(-0.1, 0.1, v.shape.as_list()))
+                        for v in tf.trainable_variables())
+                    for v in tf.trainable_variables():
+                        v.load(values[v.name], sess)
+                    loss, _ = sess.run([towers.loss, train_op],
+                                       feed_dict=feed_dict)
+                    self.assertTrue(np.isfinite(loss))
+                    losses.append(loss)
+                    params.append(dict(
+                        (v.name, sess.run(v))
+                        for v in tf.trainable_variables()))
+        return losses, params
+
+    def test_not_shared(self):
+
+        class ToyNetwork(object):
+            input_size = 3
+
+            def compute_loss(self, inputs, labels, inputs_seq_len,
+                             num_gpu=1, scope=None):
+                W = tf.Variable(tf.zeros([3]))
+                return tf.reduce_sum(inputs * W), inputs
+
+        with tf.Graph().as_default():
+            with self.assertRaises(ValueError):
+                CTCTowers(ToyNetwork(), ['/cpu:0', '/cpu:0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
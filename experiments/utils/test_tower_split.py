@@ -0,0 +1,61 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../')
+from utils.tower_split import balance_towers
+
+
+class TestTowerSplit(unittest.TestCase):
+
+    def check_towers(self, towers, batch_size):
+        self.assertEqual(list(range(batch_size)),
+                         sorted(np.concatenate(towers).tolist()))
+        for tower in towers:
+            self.assertTrue(len(tower) > 0)
+            self.assertEqual(sorted(tower.tolist()), tower.tolist())
+
+    def test_balance(self):
+        frame_nums = [100, 10, 90, 20, 50, 50, 30, 40]
+        towers = balance_towers(frame_nums, 2)
+        self.check_towers(towers, 8)
+        totals = [np.sum(np.array(frame_nums)[t]) for t in towers]
+        self.assertEqual([200, 190], totals)
+
+        # Not equal utterance nums
+        towers = balance_towers([300, 10, 20, 30, 40], 2)
+        self.check_towers(towers, 5)
+        self.assertEqual([[0], [1, 2, 3, 4]], [t.tolist() for t in towers])
+
+        # Random
+        np.random.seed(0)
+        frame_nums = np.random.randint(100, 1000, size=64)
+        towers = balance_towers(frame_nums, 4)
+        self.check_towers(towers, 64)
+        totals = [frame_nums[t].sum() for t in towers]
+        self.assertTrue(max(totals) - min(totals) <= frame_nums.max())
+
+    def test_uneven(self):
+        # Fewer utterances than towers
+        towers = balance_towers([5, 3, 4], 4)
+        self.check_towers(towers, 3)
+        self.assertEqual(3, len(towers))
+
+        # The same frame nums are split by utterance num
+        towers = balance_towers([7] * 6, 4)
+        self.check_towers(towers, 6)
+        self.assertEqual([2, 2, 1, 1], [len(t) for t in towers])
+
+        towers = balance_towers([7, 8], 1)
+        self.assertEqual([[0, 1]], [t.tolist() for t in towers])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../')
+from utils.utterance_cache import UtteranceCache, utterance_nbytes
+from utils.frame_stack import stack_frame_utt
+
+
+class TestUtteranceCache(unittest.TestCase):
+
+    def test_nbytes(self):
+        inputs = np.zeros((10, 4), dtype=np.float32)
+        label = np.arange(3, dtype=np.int32)
+        self.assertEqual(160 + 12, utterance_nbytes((inputs, label, 'utt')))
+
+        # Strided views are counted as the original array (padded to 12
+        # frames)
+        stacked = stack_frame_utt(inputs, num_stack=3, num_skip=1)
+        self.assertEqual(3 * 160, stacked.nbytes)
+        self.assertEqual(192, utterance_nbytes(stacked))
+        stacked = stack_frame_utt(inputs, num_stack=2, num_skip=2)
+        self.assertEqual(160, utterance_nbytes(stacked))
+
+    def test_lru(self):
+        cache = UtteranceCache(max_bytes=400)
+        utt = [np.zeros((i + 1, 25), dtype=np.float32) for i in range(3)]
+        self.assertTrue(cache.put('utt0', utt[0]))
+        self.assertTrue(cache.put('utt1', utt[1]))
+        self.assertEqual(300, cache.nbytes)
+
+        # utt0 is used more recently than utt1
+        self.assertIs(utt[0], cache.get('utt0'))
+        self.assertIsNone(cache.get('utt2'))
+        self.assertTrue(cache.put('utt2', utt[2]))
+        self.assertNotIn('utt1', cache)
+        self.assertIn('utt0', cache)
+        self.assertEqual(400, cache.nbytes)
+
+        # Too large
+        self.assertFalse(cache.put('large', np.zeros((5, 25), np.float32)))
+
+        stats = cache.stats()
+        self.assertEqual(2, stats['utt_num'])
+        self.assertEqual(1, stats['hit_num'])
+        self.assertEqual(1, stats['miss_num'])
+        self.assertEqual(1, stats['eviction_num'])
+        self.assertAlmostEqual(0.5, stats['hit_rate'])
+
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.nbytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,275 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Data-parallel replicas (towers) of a CTC model. Each tower is built on
+   its own device with its own placeholders, and all towers share the
+   variables placed on a parameter device. Mini-batches are split into
+   towers by the readers (see utils/tower_split.py), and gradients are
+   averaged by `ctcBase.train_towers`.
+   Towers run on GPUs, or on several CPU devices of one process so that
+   data parallelism can be tested without GPUs.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import re
+import multiprocessing
+import numpy as np
+import tensorflow as tf
+
+VARIABLE_OPS = ['Variable', 'VariableV2', 'VarHandleOp']
+DEVICE_TYPES = ['gpu', 'cpu']
+
+
+def tower_devices(num_tower, device_type='gpu'):
+    """Return devices of towers and the device to place variables.
+    Args:
+        num_tower: int, the number of towers
+        device_type: string, gpu or cpu. If cpu, towers are placed on
+            /cpu:1 ~ /cpu:num_tower, and /cpu:0 is kept for variables and
+            updates.
+    Returns:
+        devices: list of device names of towers
+        ps_device: string, the device to place variables
+    """
+    if device_type not in DEVICE_TYPES:
+        raise ValueError('device_type is "gpu" or "cpu".')
+    if device_type == 'gpu':
+        return ['/gpu:%d' % i for i in range(num_tower)], '/cpu:0'
+    return ['/cpu:%d' % (i + 1) for i in range(num_tower)], '/cpu:0'
+
+
+def tower_session_config(num_tower, device_type='gpu',
+                         intra_op_threads=None):
+    """Return the session config for towers.
+    Args:
+        num_tower: int, the number of towers
+        device_type: string, gpu or cpu
+        intra_op_threads: int, the number of intra-op threads of each tower
+            on CPU devices. If None, CPU cores are divided by towers.
+            NOTE: CPU devices of a process share one intra-op thread pool,
+            so the pool has `intra_op_threads * num_tower` threads and
+            inter-op parallelism runs the towers at the same time.
+    Returns:
+        config: A `tf.ConfigProto`
+    """
+    # CTC ops without GPU kernels are placed on CPU
+    config = tf.ConfigProto(allow_soft_placement=True)
+    if device_type == 'cpu':
+        if intra_op_threads is None:
+            intra_op_threads = max(
+                1, multiprocessing.cpu_count() // num_tower)
+        config.device_count['CPU'] = num_tower + 1
+        config.intra_op_parallelism_threads = intra_op_threads * num_tower
+        config.inter_op_parallelism_threads = num_tower + 1
+    return config
+
+
+def _device_key(device):
+    """Return (device type, index) of a device name, ex.)
+       /job:localhost/replica:0/task:0/device:GPU:1/stream:all -> (gpu, 1)
+    """
+    match = re.search(r'(cpu|gpu):(\d+)', device, re.IGNORECASE)
+    if match is None:
+        return None
+    return match.group(1).lower(), int(match.group(2))
+
+
+def tower_step_times(run_metadata, devices):
+    """Compute the time each tower was busy in a traced step.
+    Args:
+        run_metadata: A `tf.RunMetadata` of `session.run` with
+            `tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)`
+        devices: list of device names of towers
+    Returns:
+        list of seconds from the start of the first op to the end of the
+            last op on each device (0 if no op ran on the device)
+    """
+    spans = {}
+    for dev_stats in run_metadata.step_stats.dev_stats:
+        key = _device_key(dev_stats.device)
+        for node_stats in dev_stats.node_stats:
+            start = node_stats.all_start_micros
+            end = start + node_stats.all_end_rel_micros
+            if key in spans:
+                spans[key] = (min(spans[key][0], start),
+                              max(spans[key][1], end))
+            else:
+                spans[key] = (start, end)
+    times = []
+    for device in devices:
+        start, end = spans.get(_device_key(device), (0, 0))
+        times.append((end - start) / 1e6)
+    return times
+
+
+def parallel_efficiency(tower_times, step_time):
+    """The ratio of time towers were busy in a step. This is 1 when all
+       towers run in parallel during the whole step, and 1 / num_tower
+       when they run one by one.
+    Args:
+        tower_times: list of busy seconds of each tower
+        step_time: A float value, wall seconds of the step
+    Returns:
+        A float value
+    """
+    if step_time <= 0:
+        return 0.
+    return sum(tower_times) / (len(tower_times) * step_time)
+
+
+def scaling_efficiency(throughput, throughput_single, num_tower):
+    """The ratio of the speedup by towers to the number of towers.
+    Args:
+        throughput: A float value, ex.) frames per second with num_tower
+        throughput_single: A float value, the same with one tower
+        num_tower: int, the number of towers
+    Returns:
+        A float value, 1 for linear scaling
+    """
+    if throughput_single <= 0:
+        return 0.
+    return throughput / (num_tower * throughput_single)
+
+
+def tower_device(worker_device, ps_device='/cpu:0'):
+    """Return a device function which places variables on ps_device and
+       the other operations on worker_device.
+    Args:
+        worker_device: string, ex.) /gpu:0
+        ps_device: string, the device to place variables
+    Returns:
+        A device function for `tf.device`
+    """
+    def _device_function(op):
+        node_def = op if isinstance(op, tf.NodeDef) else op.node_def
+        if node_def.op in VARIABLE_OPS:
+            return ps_device
+        return worker_device
+    return _device_function
+
+
+class CTCTowers(object):
+    """Build the loss of a CTC model on each device.
+    Args:
+        network: An instance of a CTC model (a subclass of `ctcBase`)
+        devices: list of device names, ex.) ['/gpu:0', '/gpu:1']
+        ps_device: string, the device to place variables
+    Attributes:
+        inputs: list of placeholders of inputs of each tower
+        labels: list of SparseTensors of labels of each tower
+        inputs_seq_len: list of placeholders of inputs_seq_len of each tower
+        losses: list of operations for computing loss of each tower
+        logits: list of logits of each tower
+        is_used: list of bool placeholders (True by default). A tower fed
+            with False has weight 0.
+        weights: list of the ratio of utterances in each tower
+        loss: operation for computing the loss of the whole mini-batch
+    """
+
+    def __init__(self, network, devices, ps_device='/cpu:0'):
+        self.network = network
+        self.devices = devices
+        self.num_tower = len(devices)
+        self.inputs, self.labels, self.inputs_seq_len = [], [], []
+        self.losses, self.logits, self.is_used = [], [], []
+
+        with tf.variable_scope(tf.get_variable_scope()):
+            for i_tower, device in enumerate(devices):
+                with tf.device(tower_device(device, ps_device)), \
+                        tf.name_scope('tower%d' % i_tower) as scope:
+                    inputs = tf.placeholder(
+                        tf.float32,
+                        shape=[None, None, network.input_size],
+                        name='input')
+                    indices_pl = tf.placeholder(tf.int64, name='indices')
+                    values_pl = tf.placeholder(tf.int32, name='values')
+                    shape_pl = tf.placeholder(tf.int64, name='shape')
+                    labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+                    inputs_seq_len = tf.placeholder(tf.int64,
+                                                    shape=[None],
+                                                    name='inputs_seq_len')
+                    is_used = tf.placeholder_with_default(
+                        True, shape=[], name='is_used')
+
+                    loss, logits = network.compute_loss(
+                        inputs, labels, inputs_seq_len,
+                        num_gpu=self.num_tower, scope=scope)
+
+                    # Share variables with the first tower
+                    tf.get_variable_scope().reuse_variables()
+                    if i_tower == 0:
+                        var_num = len(tf.trainable_variables())
+                    elif len(tf.trainable_variables()) != var_num:
+                        raise ValueError(
+                            '%s does not share variables between towers. '
+                            'Create variables by tf.get_variable.' %
+                            type(network).__name__)
+
+                self.inputs.append(inputs)
+                self.labels.append(labels)
+                self.inputs_seq_len.append(inputs_seq_len)
+                self.is_used.append(is_used)
+                self.losses.append(loss)
+                self.logits.append(logits)
+
+        with tf.name_scope('tower_weights'):
+            # Unused towers are weighted by 0, so that they do not change
+            # the loss and the gradients
+            utt_nums = [tf.cast(tf.shape(x)[0], tf.float32) *
+                        tf.cast(is_used, tf.float32)
+                        for x, is_used in zip(self.inputs_seq_len,
+                                              self.is_used)]
+            total_utt_num = tf.add_n(utt_nums)
+            self.weights = [x / total_utt_num for x in utt_nums]
+            self.loss = tf.add_n(
+                [w * l for w, l in zip(self.weights, self.losses)],
+                name='total_loss')
+
+    def feed_dict(self, inputs, labels_st, inputs_seq_len):
+        """Make the feed dictionary of a mini-batch split into towers.
+           A mini-batch with fewer utterances than towers (ex. the last
+           one of an epoch) is split into fewer towers by
+           `balance_towers`. The remaining towers are fed with the first
+           utterance of the first tower and weighted by 0.
+        Args:
+            inputs: list of inputs of each tower
+            labels_st: list of SparseTensors of labels of each tower
+            inputs_seq_len: list of inputs_seq_len of each tower
+        Returns:
+            feed_dict: dictionary of placeholders of all towers
+        """
+        if not 0 < len(inputs) <= self.num_tower:
+            raise ValueError('The mini-batch is split into %d towers, '
+                             'expected 1 to %d.' %
+                             (len(inputs), self.num_tower))
+        feed_dict = {}
+        for i_tower in range(self.num_tower):
+            if i_tower < len(inputs):
+                feed_dict[self.inputs[i_tower]] = inputs[i_tower]
+                feed_dict[self.labels[i_tower]] = labels_st[i_tower]
+                feed_dict[self.inputs_seq_len[i_tower]] = \
+                    inputs_seq_len[i_tower]
+            else:
+                feed_dict[self.inputs[i_tower]] = inputs[0][:1]
+                feed_dict[self.labels[i_tower]] = _first_utterance(
+                    labels_st[0])
+                feed_dict[self.inputs_seq_len[i_tower]] = \
+                    inputs_seq_len[0][:1]
+                feed_dict[self.is_used[i_tower]] = False
+        return feed_dict
+
+
+def _first_utterance(labels_st):
+    """Return the labels of the first utterance of a SparseTensor.
+    Args:
+        labels_st: list of indices, values, dense_shape
+    Returns:
+        list of indices, values, dense_shape of size `[1, max_label_len]`
+    """
+    indices, values, dense_shape = labels_st
+    is_first = indices[:, 0] == 0
+    return [indices[is_first], values[is_first],
+            np.array([1, dense_shape[1]], dtype=dense_shape.dtype)]
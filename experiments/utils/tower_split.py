@@ -0,0 +1,46 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Split a mini-batch into towers for data-parallel training on multiple
+   devices. Utterances are assigned so that each tower has about the same
+   number of frames, and each tower is padded only to its own max frame
+   num.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import heapq
+import numpy as np
+
+
+def balance_towers(frame_nums, num_tower):
+    """Partition utterances of a mini-batch into towers with balanced total
+       frame nums. The longest utterance is assigned first to the tower
+       with the fewest frames (and then the fewest utterances).
+    Args:
+        frame_nums: list or numpy array of the frame num of each utterance
+            in the mini-batch
+        num_tower: int, the number of towers
+    Returns:
+        towers: list of numpy arrays of positions in the mini-batch (sorted
+            in ascending order). If the mini-batch has fewer utterances than
+            num_tower, there are only `len(frame_nums)` towers, so that no
+            tower is empty.
+    """
+    frame_nums = np.asarray(frame_nums)
+    num_tower = min(num_tower, len(frame_nums))
+    if num_tower <= 1:
+        return [np.arange(len(frame_nums))]
+
+    # (total frame num, utterance num, tower index)
+    heap = [(0, 0, i_tower) for i_tower in range(num_tower)]
+    tower_ids = np.empty((len(frame_nums),), dtype=np.int64)
+    for i in np.argsort(-frame_nums, kind='mergesort'):
+        total, utt_num, i_tower = heapq.heappop(heap)
+        tower_ids[i] = i_tower
+        heapq.heappush(heap, (total + frame_nums[i], utt_num + 1, i_tower))
+
+    return [np.flatnonzero(tower_ids == i_tower)
+            for i_tower in range(num_tower)]
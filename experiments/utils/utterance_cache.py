@@ -0,0 +1,147 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""LRU cache of utterances bounded by the total size in bytes. Readers
+   which load utterances from disk per mini-batch (CSJ) keep loaded and
+   frame-stacked features here, so that they are not reloaded every epoch.
+   NOTE: Each worker process of `BatchPrefetcher(use_process=True)` has its
+   own copy of the cache.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def _array_nbytes(array):
+    """Return the size of memory which an array keeps alive. Views are
+       counted as the size of the array which owns the memory, and
+       memory-mapped arrays are not counted.
+    Args:
+        array: A numpy array
+    Returns:
+        int, the size in bytes
+    """
+    while True:
+        base = array.base
+        if not isinstance(base, np.ndarray):
+            # Views made by as_strided refer to the array through an
+            # interface object
+            base = getattr(base, 'base', None)
+        if not isinstance(base, np.ndarray):
+            break
+        array = base
+    if isinstance(array, np.memmap):
+        return 0
+    return array.nbytes
+
+
+def utterance_nbytes(utterance):
+    """Return the size of numpy arrays in an utterance.
+    Args:
+        utterance: A numpy array or a tuple of numpy arrays & others
+    Returns:
+        int, the size in bytes
+    """
+    if not isinstance(utterance, (tuple, list)):
+        utterance = [utterance]
+    return sum(_array_nbytes(x) for x in utterance
+               if isinstance(x, np.ndarray))
+
+
+class UtteranceCache(object):
+    """LRU cache of utterances. Thread-safe.
+    Args:
+        max_bytes: int, the maximum total size of cached utterances in
+            bytes. Least recently used utterances are evicted beyond this.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hit_num = 0
+        self.miss_num = 0
+        self.eviction_num = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key):
+        """Return a cached utterance.
+        Args:
+            key: key of the utterance, ex.) (name, num_stack, num_skip)
+        Returns:
+            The cached utterance, or None if it is not cached
+        """
+        with self._lock:
+            if key not in self._items:
+                self.miss_num += 1
+                return None
+            # Move to the most recently used position
+            item = self._items.pop(key)
+            self._items[key] = item
+            self.hit_num += 1
+            return item[0]
+
+    def put(self, key, utterance):
+        """Cache an utterance. Least recently used utterances are evicted
+           until it fits in max_bytes.
+        Args:
+            key: key of the utterance
+            utterance: A numpy array or a tuple of numpy arrays & others
+        Returns:
+            True if the utterance is cached. An utterance larger than
+                max_bytes is not cached.
+        """
+        nbytes = utterance_nbytes(utterance)
+        if nbytes > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._items:
+                self.nbytes -= self._items.pop(key)[1]
+            while self.nbytes + nbytes > self.max_bytes:
+                _, (_, nbytes_evicted) = self._items.popitem(last=False)
+                self.nbytes -= nbytes_evicted
+                self.eviction_num += 1
+            self._items[key] = (utterance, nbytes)
+            self.nbytes += nbytes
+        return True
+
+    def clear(self):
+        """Remove all utterances. Counters are kept."""
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    @property
+    def hit_rate(self):
+        """The ratio of hits to all lookups."""
+        lookup_num = self.hit_num + self.miss_num
+        return self.hit_num / lookup_num if lookup_num > 0 else 0.
+
+    def stats(self):
+        """Return statistics to size the cache.
+        Returns:
+            dictionary of utt_num, nbytes, max_bytes, hit_num, miss_num,
+                eviction_num, hit_rate
+        """
+        with self._lock:
+            return {'utt_num': len(self._items),
+                    'nbytes': self.nbytes,
+                    'max_bytes': self.max_bytes,
+                    'hit_num': self.hit_num,
+                    'miss_num': self.miss_num,
+                    'eviction_num': self.eviction_num,
+                    'hit_rate': self.hit_rate}
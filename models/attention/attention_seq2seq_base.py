@@ -9,8 +9,8 @@ from __future__ import print_function
 
 from collections import namedtuple, OrderedDict
 import tensorflow as tf
-# from .decoders.decoder_util import transpose_batch_time, flatten_dict
-# from .decoders.beam_search_decoder_from_seq2seq import BeamSearchDecoder
+from .decoders.beam_search_decoder import BeamSearchDecoder
+from .decoders.attention_layer import scatter_window
 
 
 OPTIMIZER_CLS_NAMES = {
@@ -41,7 +41,7 @@ class AttentionBase(object):
         logits_tempareture:
         clip_grad: A float value. Range of gradient clipping (> 0)
         weight_decay: A float value. Regularization parameter for weight decay
-        beam_width: if 0, use greedy decoding
+        beam_width: int, the default beam width of beam search decoding
     """
 
     def __init__(self,
@@ -157,47 +157,6 @@ class AttentionBase(object):
         """Define model graph."""
         NotImplementedError
 
-    def choose_top_k(scores_flat, config):
-        """Chooses the top-k beams as successors.
-        Args:
-            scores:
-            config:
-        Returns:
-            next_beam_scores:
-            word_indices:
-        """
-        next_beam_scores, word_indices = tf.nn.top_k(
-            scores_flat, k=config.beam_width)
-        return next_beam_scores, word_indices
-
-    # def _beam_search_decoder_wrapper(self, decoder, beam_width=None,
-    #                                  length_penalty_weight=0.0):
-    #     """Wraps a decoder into a Beam Search decoder.
-    #     Args:
-    #         decoder: The decoder class instance
-    #         beam_width: Number of beams to use, an integer
-    #         length_penalty_weight: Weight for the length penalty factor. 0.0
-    #             disables the penalty.
-    #         choose_successors_fn: A function used to choose beam successors
-    #             based on their scores.
-    #             Maps from (scores, config) => (chosen scores, chosen_ids)
-    #     Returns:
-    #         A BeamSearchDecoder with the same interfaces as the decoder.
-    #     """
-    #     if beam_width is None:
-    #         # Greedy decoding
-    #         return decoder
-    #
-    #     config = BeamSearchConfig(
-    #         beam_width=beam_width,
-    #         vocab_size=self.num_classes,
-    #         eos_token=self.eos_index,
-    #         length_penalty_weight=length_penalty_weight,
-    #         choose_successors_fn=self.choose_top_k)
-    #
-    #     return BeamSearchDecoder(decoder=decoder,
-    #                              config=config)
-
     @property
     def decode(self):
         """Return operation for decoding."""
@@ -281,6 +240,40 @@ class AttentionBase(object):
 
         return (decoder_outputs, final_state)
 
+    def _decode_infer_beam_search(self, bridge, encoder_outputs, beam_width,
+                                  length_penalty_weight=0.0):
+        """Runs beam search decoding in inference mode. Attention keys are
+           precomputed on the encoder outputs, and then tiled once for all
+           beams with the values by `BeamSearchDecoder`.
+        Args:
+            bridge:
+            encoder_outputs: A namedtuple of
+                `(outputs final_state attention_values attention_values_length)`
+            beam_width: An int32 scalar tensor or int
+            length_penalty_weight: A float value. 0 disables the penalty.
+        Returns:
+            predicted_ids: `[batch_size, max_time]`
+            lengths: `[batch_size]`
+            scores: `[batch_size]`
+        """
+        batch_size = tf.shape(self.inputs)[0]
+        target_embedding = self._generate_target_embedding(reuse=True)
+
+        decoder = self._create_decoder(encoder_outputs, None)
+
+        beam_search_decoder = BeamSearchDecoder(
+            decoder=decoder,
+            embedding=target_embedding,
+            start_token=self.sos_index,
+            end_token=self.eos_index,
+            initial_state=bridge(reuse=True),
+            batch_size=batch_size,
+            beam_width=beam_width,
+            length_penalty_weight=length_penalty_weight,
+            logits_tempareture=self.logits_tempareture)
+
+        return beam_search_decoder()
+
     def compute_loss(self):
         """Operation for computing cross entropy sequence loss.
         Returns:
@@ -395,11 +388,15 @@ class AttentionBase(object):
         """Adds scaled noise from a 0-mean normal distribution to gradients."""
         raise NotImplementedError
 
-    def decoder(self, decode_type, beam_width=None):
+    def decoder(self, decode_type, beam_width=None,
+                length_penalty_weight=0.0):
         """Operation for decoding.
         Args:
             decode_type: greedy or beam_search
-            beam_width: beam width for beam search
+            beam_width: beam width for beam search. This is the default of
+                `self.beam_width_pl`, which can be fed at runtime.
+            length_penalty_weight: A float value. Weight of the length
+                penalty in beam search. 0 disables the penalty.
         Return:
             decoded_train: operation for decoding in training
             decoded_infer: operation for decoding in inference
@@ -407,14 +404,20 @@ class AttentionBase(object):
         if decode_type not in ['greedy', 'beam_search']:
             raise ValueError('decode_type is "greedy" or "beam_search".')
 
+        decoded_train = self.decoder_outputs_train.predicted_ids
         if decode_type == 'greedy':
-            decoded_train = self.decoder_outputs_train.predicted_ids
             decoded_infer = self.decoder_outputs_infer.predicted_ids
 
         elif decode_type == 'beam_search':
             if beam_width is None:
                 raise ValueError('Set beam_width.')
-            NotImplementedError
+            self.beam_width_pl = tf.placeholder_with_default(
+                beam_width, shape=[], name='beam_width')
+            decoded_infer, _, _ = self._decode_infer_beam_search(
+                bridge=self.bridge,
+                encoder_outputs=self.encoder_outputs,
+                beam_width=self.beam_width_pl,
+                length_penalty_weight=length_penalty_weight)
 
         return decoded_train, decoded_infer
 
@@ -439,4 +442,15 @@ class AttentionBase(object):
         return ler_op
 
     def attention_weights(self):
-        return self.decoder_outputs_infer.attention_scores
+        """Operation for attention weights of decoding in inference.
+        Return:
+            A tensor of `[batch_size, max_label_len, max_time]` for all
+            attention types. Weights of windowed attention are placed at
+            their frames, and frames out of the window are 0.
+        """
+        outputs = self.decoder_outputs_infer
+        if self.attention_layer.attention_type != 'windowed':
+            return outputs.attention_scores
+        max_time = tf.shape(self.encoder_outputs.attention_values)[1]
+        return scatter_window(outputs.attention_scores,
+                              outputs.attention_start, max_time)
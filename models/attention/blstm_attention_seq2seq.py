@@ -45,6 +45,12 @@ class BLSTMAttetion(AttentionBase):
         dropout_ratio_hidden: A float value. Dropout ratio in hidden-hidden
             layers
         weight_decay:
+        attention_type: string, bahdanau or layer_dot or windowed
+            (see `AttentionLayer`)
+        attention_window_size: int, if set, attention weights are restricted
+            to a band of this number of frames around the peak of the
+            previous alignment. This is the window size of windowed
+            attention.
     """
 
     def __init__(self,
@@ -70,6 +76,8 @@ class BLSTMAttetion(AttentionBase):
                  dropout_ratio_hidden=1.0,
                  weight_decay=0.0,
                  beam_width=0,
+                 attention_type='bahdanau',
+                 attention_window_size=None,
                  name='blstm_attention_seq2seq'):
 
         AttentionBase.__init__(self, batch_size, input_size,
@@ -100,6 +108,8 @@ class BLSTMAttetion(AttentionBase):
         self.attention_weights_tempareture = attention_weights_tempareture
         # NOTE: attention_weights_tempareture is good for narrow focus.
         # Assume that β = 1 / attention_weights_tempareture, β=2 is recommended.
+        self.attention_type = attention_type
+        self.attention_window_size = attention_window_size
 
     def _encode(self, inputs, inputs_seq_len):
         """Encode input features.
@@ -137,7 +147,8 @@ class BLSTMAttetion(AttentionBase):
         self.attention_layer = AttentionLayer(
             num_unit=self.attention_dim,
             attention_weights_tempareture=self.attention_weights_tempareture,
-            attention_type='bahdanau')
+            attention_type=self.attention_type,
+            window_size=self.attention_window_size)
 
         # Define RNN decoder
         rnn_decoder = load_decoder(model_type='lstm_decoder')
@@ -166,6 +177,7 @@ class BLSTMAttetion(AttentionBase):
 
         # Encode input features
         encoder_outputs = self._encode(self.inputs, self.inputs_seq_len)
+        self.encoder_outputs = encoder_outputs
 
         # Define decoder (initialization)
         decoder_train = self._create_decoder(encoder_outputs, self.labels)
@@ -173,16 +185,11 @@ class BLSTMAttetion(AttentionBase):
         # NOTE: initial_state and helper will be substituted in
         # self._decode_train() or self._decode_infer()
 
-        # Wrap decoder
-        # decoder_train = self._beam_search_decoder_wrapper(decoder_train,
-        #                                                   beam_width=20)
-        # decoder_infer = self._beam_search_decoder_wrapper(decoder_infer,
-        #                                                   beam_width=20)
-
         # Connect between encoder and decoder
         bridge = InitialStateBridge(
             encoder_outputs=encoder_outputs,
             decoder_state_size=decoder_train.cell.state_size)
+        self.bridge = bridge
 
         # Call decoder (divide into training and inference)
         # Training
@@ -20,6 +20,7 @@ class AttentionDecoderOutput(namedtuple(
             "predicted_ids",
             "cell_output",
             "attention_scores",
+            "attention_start",
             "attention_context"
         ])):
     """
@@ -27,12 +28,33 @@ class AttentionDecoderOutput(namedtuple(
         logits:
         predicted_ids:
         cell_output:
-        attention_scores:
+        attention_scores: Attention weights of the step. A tensor of
+            `[batch_size, max_time]` for bahdanau and layer_dot attention,
+            and `[batch_size, window_size]` over the frames from
+            `attention_start` for windowed attention
+        attention_start: An int32 tensor of `[batch_size]`, the frame of
+            `attention_scores[:, 0]`. This is 0 except for windowed attention
+            (see `attention_layer.scatter_window`)
         attention_context:
     """
     pass
 
 
+class AttentionDecoderState(namedtuple(
+        "AttentionDecoderState",
+        [
+            "cell_state",
+            "attention_focus"
+        ])):
+    """
+    Args:
+        cell_state: The state of the decoder cell
+        attention_focus: An int32 tensor of `[batch_size]`, the peak of the
+            previous alignment (see `AttentionLayer.next_focus`)
+    """
+    pass
+
+
 class AttentionDecoder(tf.contrib.seq2seq.Decoder):
     """An RNN Decoder that uses attention over an input sequence.
     Args:
@@ -51,6 +73,8 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
             An int32 Tensor of shape `[batch_size]`.
         attention_layer: The attention function to use. This function map from
             `(state, inputs)` to `(attention_weights, attention_context)`.
+            Encoder states are transformed by its `precompute` once before
+            decoding.
             For an example, see `decoders.attention_layer.AttentionLayer`.
     """
 
@@ -79,6 +103,7 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         # Not initialized yet
         self.initial_state = None
         self.helper = None
+        self.attention_keys = None
 
     def __call__(self, *args, **kwargs):
         # TODO: variable_scope
@@ -90,7 +115,9 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
             logits=self.num_classes,
             predicted_ids=tf.TensorShape([]),
             cell_output=self.cell.output_size,
-            attention_scores=tf.shape(self.attention_values)[1:-1],
+            attention_scores=self.attention_layer.weights_size(
+                self.attention_values),
+            attention_start=tf.TensorShape([]),
             attention_context=self.attention_values.get_shape()[-1])
 
     @property
@@ -100,6 +127,7 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
             predicted_ids=tf.int32,
             cell_output=tf.float32,
             attention_scores=tf.float32,
+            attention_start=tf.int32,
             attention_context=tf.float32)
 
     @property
@@ -166,8 +194,10 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         Returns:
             finished:
             first_inputs:
-            initial_state:
+            initial_state: An instance of `AttentionDecoderState`
         """
+        self.precompute_attention(reuse=self.reuse)
+
         # Create inputs for the first time step
         finished, first_inputs = self.helper.initialize()
         # NOTE: first_inputs: `[batch_size, embedding_dim]`
@@ -185,12 +215,29 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         # tf.shape(tf.concat([t3, t4], 0)) ==> [4, 3]
         # tf.shape(tf.concat([t3, t4], 1)) ==> [2, 6]
 
-        return finished, first_inputs, self.initial_state
+        initial_state = AttentionDecoderState(
+            cell_state=self.initial_state,
+            attention_focus=self.attention_layer.initial_focus(batch_size))
+
+        return finished, first_inputs, initial_state
+
+    def precompute_attention(self, reuse):
+        """Transform encoder states into keys of attention once before the
+           decoding loop, so that decoding steps do not recompute them.
+           This must be called in the variable scope of `dynamic_decode`.
+        Args:
+            reuse: if True, reuse variables of the attention layer
+        """
+        with tf.variable_scope("step", reuse=reuse):
+            self.attention_keys = self.attention_layer.precompute(
+                self.attention_encoder_states)
 
-    def compute_output(self, cell_output):
+    def compute_output(self, cell_output, attention_focus=None):
         """Computes the decoder outputs at each time.
         Args:
             cell_output: The previous state of the decoder
+            attention_focus: An int32 tensor of `[batch_size]`, the peak of
+                the previous alignment
         Returns:
             softmax_input:
             logits:
@@ -199,10 +246,11 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         """
         # Compute attention weights & context
         attention_weights, attention_context = self.attention_layer(
-            encoder_states=self.attention_encoder_states,
+            attention_keys=self.attention_keys,
             current_decoder_state=cell_output,
             values=self.attention_values,
-            values_length=self.attention_values_length)
+            values_length=self.attention_values_length,
+            attention_focus=attention_focus)
 
         # TODO: Make this a parameter: We may or may not want this.
         # Transform attention context.
@@ -269,7 +317,7 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         Args:
            time: scalar `int32` tensor.
            inputs: A input tensors.
-           state: A state tensors and TensorArrays.
+           state: An instance of `AttentionDecoderState`
            name: Name scope for any created operations.
         Returns:
             A tuple of `(outputs, naxt_state, next_inputs, finished)`
@@ -282,25 +330,33 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         """
         with tf.variable_scope("step", reuse=self.reuse):
             # Call LSTMCell
-            cell_output_prev, cell_state_prev = self.cell(inputs, state)
+            cell_output_prev, cell_state_prev = self.cell(
+                inputs, state.cell_state)
             cell_output, logits, attention_weights, attention_context = \
-                self.compute_output(cell_output_prev)
+                self.compute_output(cell_output_prev, state.attention_focus)
 
             sample_ids = self.helper.sample(time=time,
                                             outputs=logits,
                                             state=cell_state_prev)
             # TODO: Trainingのときlogitsの値はone-hotまたは一意のベクトルに変換されているか？
 
-            outputs = AttentionDecoderOutput(logits=logits,
-                                             predicted_ids=sample_ids,
-                                             cell_output=cell_output,
-                                             attention_scores=attention_weights,
-                                             attention_context=attention_context)
+            outputs = AttentionDecoderOutput(
+                logits=logits,
+                predicted_ids=sample_ids,
+                cell_output=cell_output,
+                attention_scores=attention_weights,
+                attention_start=self.attention_layer.weights_start(
+                    state.attention_focus),
+                attention_context=attention_context)
 
             finished, next_inputs, next_state = self.helper.next_inputs(
                 time=time,
                 outputs=outputs,
                 state=cell_state_prev,
                 sample_ids=sample_ids)
+            next_state = AttentionDecoderState(
+                cell_state=next_state,
+                attention_focus=self.attention_layer.next_focus(
+                    attention_weights, state.attention_focus))
 
             return (outputs, next_state, next_inputs, finished)
@@ -10,6 +10,77 @@ from __future__ import print_function
 import tensorflow as tf
 
 
+def masked_softmax(scores, mask, tempareture=1):
+    """Softmax over valid positions only. Scores are divided by the
+       tempareture once, and the maximum of valid scores is subtracted
+       before a single exp, so that neither overflow nor `-inf - (-inf)`
+       happens however the scores are masked.
+    Args:
+        scores: A tensor of shape `[batch_size, max_time]`
+        mask: A bool tensor of shape `[batch_size, max_time]`, True at valid
+            positions
+        tempareture: A float value
+    Returns:
+        A tensor of shape `[batch_size, max_time]`. Weights of masked
+            positions are exactly 0.
+    """
+    scores = tf.where(mask, scores / tempareture,
+                      tf.fill(tf.shape(scores), tf.float32.min))
+    max_scores = tf.reduce_max(scores, axis=-1, keep_dims=True)
+    exp_scores = tf.exp(scores - max_scores) * tf.to_float(mask)
+    # The sum is at least 1 (exp(0) at the maximum) if any position is
+    # valid, and rows without valid positions get zero weights
+    return exp_scores / tf.maximum(
+        tf.reduce_sum(exp_scores, axis=-1, keep_dims=True), 1.)
+
+
+def window_mask(focus, window_size, max_time):
+    """Band of `window_size` frames from `window_start` of the focus of each
+       utterance. This is the same window as windowed attention.
+    Args:
+        focus: An int32 tensor of shape `[batch_size]`
+        window_size: int, the number of frames in the band
+        max_time: An int32 scalar tensor
+    Returns:
+        A bool tensor of shape `[batch_size, max_time]`
+    """
+    start = tf.expand_dims(window_start(focus, window_size), axis=1)
+    positions = tf.expand_dims(tf.range(max_time), axis=0)
+    return tf.logical_and(positions >= start,
+                          positions < start + window_size)
+
+
+def window_start(focus, window_size):
+    """The first frame of the window of `windowed` attention. The window is
+       centered at the focus, and shifted right at the beginning of
+       utterances.
+    Args:
+        focus: An int32 tensor of shape `[batch_size]`
+        window_size: int, the number of frames in the window
+    Returns:
+        An int32 tensor of shape `[batch_size]`
+    """
+    return tf.maximum(focus - window_size // 2, 0)
+
+
+def scatter_window(weights, start, max_time):
+    """Place attention weights over windows at their frames of the input.
+    Args:
+        weights: A tensor of shape `[..., window_size]`
+        start: An int32 tensor of shape `[...]`, the first frame of each
+            window
+        max_time: An int32 scalar tensor
+    Returns:
+        A tensor of shape `[..., max_time]`. Frames out of the window (and
+        window frames beyond `max_time`) are 0.
+    """
+    window_size = tf.shape(weights)[-1]
+    positions = tf.expand_dims(start, axis=-1) + tf.range(window_size)
+    # `[..., window_size, max_time]`
+    frames = tf.one_hot(positions, max_time, dtype=weights.dtype)
+    return tf.reduce_sum(tf.expand_dims(weights, axis=-1) * frames, axis=-2)
+
+
 class AttentionLayer(object):
     """Attention layer. This implementation is based on
         https://arxiv.org/abs/1409.0473.
@@ -19,27 +90,116 @@ class AttentionLayer(object):
             arXiv preprint arXiv:1409.0473 (2014).
     Args:
         num_unit: Number of units used in the attention layer
-        attention_type: bahdanau or layer_dot
+        attention_weights_tempareture: A float value. Scores are divided by
+            this before the softmax.
+        attention_type: bahdanau or layer_dot or windowed.
+            windowed is the same as bahdanau, but each step scores only
+            `window_size` frames from `window_start` of the focus, so the
+            cost of a step does not depend on the input length. Attention
+            weights are given over the window, `[batch_size, window_size]`.
+        window_size: int, if set, attention weights are restricted to a band
+            of `window_size` frames around the peak of the previous
+            alignment (the focus), shifted right at the beginning of
+            utterances as `window_start`. The focus starts from the first
+            frame.
+            This is required by windowed attention.
     """
 
     def __init__(self, num_unit, attention_weights_tempareture,
-                 attention_type='bahdanau', name='attention_layer'):
+                 attention_type='bahdanau', window_size=None,
+                 name='attention_layer'):
         self.num_unit = num_unit
         self.attention_weights_tempareture = attention_weights_tempareture
         self.attention_type = attention_type
+        self.window_size = window_size
         self.name = name
 
+        if attention_type == 'windowed' and window_size is None:
+            raise ValueError('Set window_size for windowed attention.')
+
     def __call__(self, *args, **kwargs):
         # TODO: variable_scope
         return self._build(*args, **kwargs)
 
-    def _build(self, encoder_states, current_decoder_state, values,
-               values_length):
-        """Computes attention scores and outputs.
+    def precompute(self, encoder_states):
+        """Transform encoder states into keys of attention. This does not
+           depend on the decoder, so it is computed once per utterance
+           before decoding, and the keys are passed to each decoding step.
         Args:
-            encoder_states: The outputs of the encoder and equivalent to
-                `values`. This is used to calculate attention scores.
+            encoder_states: The outputs of the encoder.
                 A tensor of shape `[batch_size, max_time, encoder_num_units]`
+        Returns:
+            attention_keys: A tensor of shape `[batch_size, max_time, num_unit]`
+        """
+        # Fully connected layers to transform encoder_states into a tensor
+        # with `num_unit` units
+        # h_j (j: time index of input) => U_a * h_j
+        attention_keys = tf.contrib.layers.fully_connected(
+            inputs=encoder_states,
+            num_outputs=self.num_unit,
+            activation_fn=None,
+            # reuse=True,
+            scope="att_encoder_states")
+        return attention_keys
+
+    def initial_focus(self, batch_size):
+        """Return the focus before the first decoding step.
+        Args:
+            batch_size: An int32 scalar tensor
+        Returns:
+            An int32 tensor of shape `[batch_size]`
+        """
+        return tf.zeros([batch_size], dtype=tf.int32)
+
+    def next_focus(self, attention_weights, attention_focus):
+        """Update the focus by the attention weights of the current step.
+        Args:
+            attention_weights: A tensor of shape `[batch_size, max_time]`
+            attention_focus: An int32 tensor of shape `[batch_size]`
+        Returns:
+            An int32 tensor of shape `[batch_size]`
+        """
+        if self.window_size is None:
+            # The focus is not used
+            return attention_focus
+        peak = tf.to_int32(tf.argmax(attention_weights, axis=1))
+        if self.attention_type == 'windowed':
+            # Weights are given over the window
+            return window_start(attention_focus, self.window_size) + peak
+        return peak
+
+    def weights_size(self, values):
+        """Return the size of attention weights of each step.
+        Args:
+            values: A tensor of shape `[batch_size, max_time,
+                encoder_num_units]`
+        Returns:
+            A `TensorShape` or an int32 tensor
+        """
+        if self.attention_type == 'windowed':
+            return tf.TensorShape([self.window_size])
+        return tf.shape(values)[1:-1]
+
+    def weights_start(self, attention_focus):
+        """Return the frame of the first attention weight of each step.
+        Args:
+            attention_focus: An int32 tensor of shape `[batch_size]`, the
+                focus before the step
+        Returns:
+            An int32 tensor of shape `[batch_size]`. This is the window start
+                for windowed attention, and 0 for the others.
+        """
+        if self.attention_type == 'windowed':
+            return window_start(attention_focus, self.window_size)
+        return tf.zeros_like(attention_focus)
+
+    def _build(self, attention_keys, current_decoder_state, values,
+               values_length, attention_focus=None):
+        """Computes attention scores and outputs.
+        Args:
+            attention_keys: The outputs of the encoder transformed by
+                `precompute`. This is used to calculate attention scores.
+                A tensor of shape `[batch_size, max_time, num_unit]`
                 where each element in the `time` dimension corresponds to the
                 decoder states for that value.
             current_decoder_state: The current state of the docoder.
@@ -49,26 +209,20 @@ class AttentionLayer(object):
                 A tensor of shape `[batch_size, max_time, encoder_num_units]`.
             values_length: An int32 tensor of shape `[batch_size]` defining
                 the sequence length of the attention values.
+            attention_focus: An int32 tensor of shape `[batch_size]`, the
+                peak of the previous alignment. This is used only when
+                `window_size` is set.
         Returns:
             A tuple `(attention_weights, attention_context)`.
                 `attention_weights` is vector of length `time` where each
                     element is the normalized "score" of the corresponding
                     `inputs` element.
                     A tensor of shape `[batch_size, max_time]`
+                    (`[batch_size, window_size]` for windowed attention)
                 `attention_context` is the final attention layer output
                     corresponding to the weighted inputs.
                     A tensor of shape `[batch_size, encoder_num_units]`.
         """
-        # Fully connected layers to transform both encoder_states and
-        # current_decoder_state into a tensor with `num_unit` units
-        # h_j (j: time index of input) => U_a * h_j
-        att_encoder_states = tf.contrib.layers.fully_connected(
-            inputs=encoder_states,
-            num_outputs=self.num_unit,
-            activation_fn=None,
-            # reuse=True,
-            scope="att_encoder_states")
-
         # s_{i-1} (i: time index of output) => W_a * s_{i-1}
         att_decoder_state = tf.contrib.layers.fully_connected(
             inputs=current_decoder_state,
@@ -80,31 +234,32 @@ class AttentionLayer(object):
         # decoder_num_units
         # NOTE: エンコーダがBidirectionalのときユニット数を2倍にすることに注意??
 
+        if self.attention_type == 'windowed':
+            return self._build_windowed(attention_keys, att_decoder_state,
+                                        values, values_length,
+                                        attention_focus)
+
         # Compute attention scores over encoder outputs (energy: e_ij)
         # v_a = f(U_a * h_j, W_a * s_{i-1})
-        scores = self.attention_score_func(att_encoder_states,
+        scores = self.attention_score_func(attention_keys,
                                            att_decoder_state)
 
-        # Replace all scores for padded inputs with tf.float32.min
+        # Exclude padded inputs (and frames out of the window)
         num_scores = tf.shape(scores)[1]  # input length
         scores_mask = tf.sequence_mask(
             lengths=tf.to_int32(values_length),
-            maxlen=tf.to_int32(num_scores),
-            dtype=tf.float32)
+            maxlen=tf.to_int32(num_scores))
         # ex.)
         # tf.sequence_mask([1, 3, 2], 5) = [[True, False, False, False, False],
         #                                   [True, True, True, False, False],
         #                                   [True, True, False, False, False]]
-        scores = scores * scores_mask + ((1.0 - scores_mask) * tf.float32.min)
-        # TODO: For underflow?
+        if self.window_size is not None and attention_focus is not None:
+            scores_mask = tf.logical_and(scores_mask, window_mask(
+                attention_focus, self.window_size, num_scores))
 
         # Normalize the scores (attention_weights: α_ij (j=0,1,...))
-        # attention_weights = tf.nn.softmax(
-        #     scores, name="attention_weights")
-        attention_weights = tf.exp(scores / self.attention_weights_tempareture) / \
-            tf.reduce_sum(tf.exp(scores / self.attention_weights_tempareture),
-                          axis=-1,
-                          keep_dims=True)
+        attention_weights = masked_softmax(
+            scores, scores_mask, self.attention_weights_tempareture)
 
         # Calculate the weighted average of the attention inputs
         # according to the scores
@@ -119,6 +274,52 @@ class AttentionLayer(object):
 
         return (attention_weights, attention_context)
 
+    def _build_windowed(self, attention_keys, att_decoder_state, values,
+                        values_length, attention_focus):
+        """Computes attention over `window_size` frames from the window start
+           of the focus. Only keys and values in the window are gathered,
+           so a step costs O(window_size) instead of O(max_time).
+        Args:
+            attention_keys: A tensor of shape `[batch_size, max_time,
+                num_unit]`
+            att_decoder_state: The decoder state transformed by W_a.
+                A tensor of shape `[batch_size, num_unit]`
+            values: A tensor of shape `[batch_size, max_time,
+                encoder_num_units]`
+            values_length: An int32 tensor of shape `[batch_size]`
+            attention_focus: An int32 tensor of shape `[batch_size]`
+        Returns:
+            The same as `_build`
+        """
+        batch_size = tf.shape(values)[0]
+        max_time = tf.shape(values)[1]
+
+        # Frame indices of the window, `[batch_size, window_size]`
+        positions = tf.expand_dims(
+            window_start(attention_focus, self.window_size), axis=1) + \
+            tf.expand_dims(tf.range(self.window_size), axis=0)
+        # Frames beyond the input are clipped for gathering and masked
+        gather_indices = tf.stack(
+            [tf.tile(tf.expand_dims(tf.range(batch_size), axis=1),
+                     [1, self.window_size]),
+             tf.minimum(positions, max_time - 1)], axis=2)
+        keys_window = tf.gather_nd(attention_keys, gather_indices)
+        values_window = tf.gather_nd(values, gather_indices)
+
+        scores = self.attention_score_func(keys_window, att_decoder_state)
+        scores_mask = positions < tf.expand_dims(
+            tf.to_int32(values_length), axis=1)
+        attention_weights = masked_softmax(
+            scores, scores_mask, self.attention_weights_tempareture)
+
+        # c_i = sigma_{j in window}(α_ij * h_j)
+        attention_context = tf.reduce_sum(
+            tf.expand_dims(attention_weights, axis=2) * values_window,
+            axis=1, name="attention_context")
+        attention_context.set_shape([None, values.get_shape().as_list()[-1]])
+
+        return (attention_weights, attention_context)
+
     def attention_score_func(self, encoder_states, current_decoder_state):
         """An attention layer that calculates attention scores.
         Args:
@@ -130,7 +331,7 @@ class AttentionLayer(object):
             attention_sum: The summation of attention scores (energy: e_ij)
             A tensor of shape `[batch_size, max_time, ?]`
         """
-        if self.attention_type == 'bahdanau':
+        if self.attention_type in ['bahdanau', 'windowed']:
             # with tf.variable_scope("bahdanau", reuse=True):
             v_att = tf.get_variable("v_att",
                                     shape=[self.num_unit],
@@ -157,6 +358,7 @@ class AttentionLayer(object):
 
         else:
             # TODO: Add other versions
-            raise ValueError('attention_type is "bahdanau" or "layer_dot".')
+            raise ValueError(
+                'attention_type is "bahdanau" or "layer_dot" or "windowed".')
 
         return attention_sum
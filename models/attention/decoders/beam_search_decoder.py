@@ -0,0 +1,362 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Batched beam search decoder wrapping `AttentionDecoder`. Attention keys
+   are precomputed on the encoder outputs of `[batch_size, ...]`, then the
+   keys and values are tiled once to `[batch_size * beam_width, ...]` before
+   decoding, and each step reorders only the decoder states by the surviving
+   beams.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import namedtuple
+import tensorflow as tf
+from tensorflow.python.util import nest
+from .dynamic_decoder import dynamic_decode
+
+# Log probability of invalid beams
+LOG_ZERO = -1e9
+
+
+class BeamSearchState(namedtuple(
+        "BeamSearchState",
+        [
+            "cell_state",
+            "attention_context",
+            "attention_focus",
+            "log_probs",
+            "finished",
+            "lengths"
+        ])):
+    """
+    Args:
+        cell_state: The state of the decoder cell of each beam, tensors of
+            `[batch_size * beam_width, ...]`
+        attention_context: A tensor of `[batch_size * beam_width,
+            encoder_num_units]`
+        attention_focus: An int32 tensor of `[batch_size * beam_width]`, the
+            peak of the previous alignment of each beam
+        log_probs: Accumulated log probabilities, `[batch_size, beam_width]`
+        finished: A bool tensor of `[batch_size, beam_width]`, True if the
+            beam has emitted <EOS>
+        lengths: The lengths of beams (including <EOS>),
+            `[batch_size, beam_width]`
+    """
+    pass
+
+
+class BeamSearchOutput(namedtuple(
+        "BeamSearchOutput",
+        [
+            "scores",
+            "predicted_ids",
+            "parent_ids"
+        ])):
+    """
+    Args:
+        scores: Scores of beams after the length penalty,
+            `[batch_size, beam_width]`
+        predicted_ids: `[batch_size, beam_width]`
+        parent_ids: The index of the beam which each beam was extended from,
+            `[batch_size, beam_width]`
+    """
+    pass
+
+
+def tile_batch(tensor, multiplier):
+    """Repeat each entry of the batch `multiplier` times.
+    Args:
+        tensor: A tensor of `[batch_size, ...]`
+        multiplier: An int32 scalar tensor or int
+    Returns:
+        A tensor of `[batch_size * multiplier, ...]`. The copies of each
+            entry are adjacent.
+    """
+    shape = tf.shape(tensor)
+    ndims = tensor.get_shape().ndims
+    tiled = tf.tile(tf.expand_dims(tensor, axis=1),
+                    [1, multiplier] + [1] * (ndims - 1))
+    tiled = tf.reshape(tiled, tf.concat(
+        [[shape[0] * multiplier], shape[1:]], axis=0))
+    tiled.set_shape([None] + tensor.get_shape().as_list()[1:])
+    return tiled
+
+
+def _gather_beams(params, indices):
+    """Gather entries of each batch.
+    Args:
+        params: A tensor of `[batch_size, N]`
+        indices: An int32 tensor of `[batch_size, beam_width]`
+    Returns:
+        A tensor of `[batch_size, beam_width]`
+    """
+    batch_size = tf.shape(indices)[0]
+    beam_width = tf.shape(indices)[1]
+    batch_indices = tf.tile(tf.expand_dims(tf.range(batch_size), axis=1),
+                            [1, beam_width])
+    return tf.gather_nd(params, tf.stack([batch_indices, indices], axis=2))
+
+
+def _backtrack(step_ids, parent_ids):
+    """Follow parent beams from the last step to recover the labels of each
+       beam.
+    Args:
+        step_ids: An int32 tensor of `[max_time, batch_size, beam_width]`
+        parent_ids: An int32 tensor of `[max_time, batch_size, beam_width]`
+    Returns:
+        An int32 tensor of `[max_time, batch_size, beam_width]`
+    """
+    batch_size = tf.shape(step_ids)[1]
+    beam_width = tf.shape(step_ids)[2]
+    last_beams = tf.tile(tf.expand_dims(tf.range(beam_width), axis=0),
+                         [batch_size, 1])
+
+    def _step(acc, inputs):
+        beams, _ = acc
+        ids_t, parents_t = inputs
+        return (_gather_beams(parents_t, beams), _gather_beams(ids_t, beams))
+
+    _, ids = tf.scan(_step, (step_ids, parent_ids),
+                     initializer=(last_beams, tf.zeros_like(last_beams)),
+                     reverse=True)
+    return ids
+
+
+class BeamSearchDecoder(tf.contrib.seq2seq.Decoder):
+    """Beam search over the outputs of an `AttentionDecoder`. Beams are
+       sorted by their scores at each step, and decoding stops when all
+       beams of all utterances have emitted <EOS> or after
+       `max_decode_length` steps.
+    Args:
+        decoder: An instance of `AttentionDecoder` whose attention tensors
+            are of `[batch_size, ...]` (not tiled). They are tiled with
+            beam_width in `initialize`. Variables are shared with the
+            decoder built for training.
+        embedding: The embedding of target labels,
+            `[num_classes, embedding_dim]`
+        start_token: int, the index of <SOS>
+        end_token: int, the index of <EOS>
+        initial_state: The initial state of the decoder cell,
+            tensors of `[batch_size, ...]` (not tiled)
+        batch_size: An int32 scalar tensor
+        beam_width: An int32 scalar tensor or int, the number of beams
+        length_penalty_weight: A float value. Scores are log probabilities
+            divided by `((5 + length) / 6) ^ length_penalty_weight`
+            (https://arxiv.org/abs/1609.08144). 0 disables the penalty.
+        logits_tempareture: A float value. Log probabilities are computed
+            from `logits / logits_tempareture` as in training.
+    """
+
+    def __init__(self,
+                 decoder,
+                 embedding,
+                 start_token,
+                 end_token,
+                 initial_state,
+                 batch_size,
+                 beam_width,
+                 length_penalty_weight=0.0,
+                 logits_tempareture=1,
+                 name='beam_search_decoder'):
+        self.decoder = decoder
+        self.embedding = embedding
+        self.start_token = start_token
+        self.end_token = end_token
+        self.initial_state = nest.map_structure(
+            lambda x: tile_batch(x, beam_width), initial_state)
+        self.attention_values = decoder.attention_values
+        self.attention_values_length = decoder.attention_values_length
+        self._batch_size = batch_size
+        self.beam_width = tf.convert_to_tensor(beam_width, dtype=tf.int32)
+        self.length_penalty_weight = length_penalty_weight
+        self.logits_tempareture = logits_tempareture
+        self.name = name
+
+    def __call__(self):
+        return self._build()
+
+    @property
+    def output_size(self):
+        # The size is given as a tensor because beam_width may be fed
+        beam_shape = tf.expand_dims(self.beam_width, axis=0)
+        return BeamSearchOutput(scores=beam_shape,
+                                predicted_ids=beam_shape,
+                                parent_ids=beam_shape)
+
+    @property
+    def output_dtype(self):
+        return BeamSearchOutput(scores=tf.float32,
+                                predicted_ids=tf.int32,
+                                parent_ids=tf.int32)
+
+    @property
+    def batch_size(self):
+        return self._batch_size
+
+    def _build(self):
+        """
+        Returns:
+            predicted_ids: The labels of the best beam, `[batch_size,
+                max_time]`. Labels after <EOS> are <EOS>.
+            lengths: The lengths of the best beam including <EOS>,
+                `[batch_size]`
+            scores: The score of the best beam, `[batch_size]`
+        """
+        # States of beams are reordered at each step, so states of finished
+        # utterances are not copied through (impute_finished=False)
+        outputs, final_state = dynamic_decode(
+            decoder=self,
+            output_time_major=True,
+            impute_finished=False,
+            maximum_iterations=self.decoder.max_decode_length)
+        return self.finalize(outputs, final_state)
+
+    def finalize(self, outputs, final_state):
+        """Recover the labels of the best beam.
+        Args:
+            outputs: An instance of `BeamSearchOutput` of time-major tensors
+            final_state: An instance of `BeamSearchState`
+        Returns:
+            The same as `_build`
+        """
+        predicted_ids = _backtrack(outputs.predicted_ids, outputs.parent_ids)
+        # Beams are sorted by the score, so the first beam is the best
+        predicted_ids = tf.transpose(predicted_ids[:, :, 0], (1, 0))
+        return (predicted_ids, final_state.lengths[:, 0],
+                outputs.scores[-1, :, 0])
+
+    def _length_penalty(self, lengths):
+        if self.length_penalty_weight == 0:
+            return tf.ones_like(lengths, dtype=tf.float32)
+        return tf.pow((5. + tf.to_float(lengths)) / 6.,
+                      self.length_penalty_weight)
+
+    def _inputs(self, ids, attention_context):
+        return tf.concat(
+            [tf.nn.embedding_lookup(self.embedding, ids), attention_context],
+            axis=1)
+
+    def initialize(self, name=None):
+        """
+        Returns:
+            finished: A bool tensor of `[batch_size]`
+            first_inputs: A tensor of `[batch_size * beam_width,
+                embedding_dim + encoder_num_units]`
+            initial_state: An instance of `BeamSearchState`
+        """
+        batch_size, beam_width = self._batch_size, self.beam_width
+        # Keys are computed on the encoder outputs before tiling, so that
+        # the transformation is not repeated for each beam
+        self.decoder.precompute_attention(reuse=True)
+        self.decoder.attention_keys = tile_batch(
+            self.decoder.attention_keys, beam_width)
+        self.decoder.attention_values = tile_batch(
+            self.attention_values, beam_width)
+        self.decoder.attention_values_length = tile_batch(
+            self.attention_values_length, beam_width)
+
+        encoder_num_unit = self.decoder.attention_values.get_shape(
+        ).as_list()[-1]
+        attention_context = tf.zeros([batch_size * beam_width,
+                                      encoder_num_unit])
+        first_inputs = self._inputs(
+            tf.fill([batch_size * beam_width], self.start_token),
+            attention_context)
+
+        # Only the first beam is valid at first, so that it is not
+        # duplicated in the next step
+        initial_state = BeamSearchState(
+            cell_state=self.initial_state,
+            attention_context=attention_context,
+            attention_focus=self.decoder.attention_layer.initial_focus(
+                batch_size * beam_width),
+            log_probs=tf.one_hot(tf.zeros([batch_size], dtype=tf.int32),
+                                 depth=beam_width,
+                                 on_value=0.,
+                                 off_value=LOG_ZERO),
+            finished=tf.zeros([batch_size, beam_width], dtype=tf.bool),
+            lengths=tf.zeros([batch_size, beam_width], dtype=tf.int32))
+        finished = tf.zeros([batch_size], dtype=tf.bool)
+        return finished, first_inputs, initial_state
+
+    def step(self, time, inputs, state, name=None):
+        """Perform a decoding step.
+        Args:
+           time: scalar `int32` tensor.
+           inputs: A tensor of `[batch_size * beam_width, input_size]`
+           state: An instance of `BeamSearchState`
+           name: Name scope for any created operations.
+        Returns:
+            A tuple of `(outputs, next_state, next_inputs, finished)`
+        """
+        batch_size, beam_width = self._batch_size, self.beam_width
+        num_classes = self.decoder.num_classes
+
+        # The same variables as AttentionDecoder.step
+        with tf.variable_scope("step", reuse=True):
+            cell_output, cell_state = self.decoder.cell(
+                inputs, state.cell_state)
+            _, logits, attention_weights, attention_context = \
+                self.decoder.compute_output(cell_output,
+                                            state.attention_focus)
+        attention_focus = self.decoder.attention_layer.next_focus(
+            attention_weights, state.attention_focus)
+
+        log_probs = tf.nn.log_softmax(logits / self.logits_tempareture)
+        log_probs = tf.reshape(log_probs,
+                               [batch_size, beam_width, num_classes])
+
+        # Finished beams are extended only by <EOS> without cost
+        eos_only = tf.zeros_like(log_probs) + tf.one_hot(
+            self.end_token, num_classes, on_value=0., off_value=LOG_ZERO)
+        finished = tf.tile(tf.expand_dims(state.finished, axis=2),
+                           [1, 1, num_classes])
+        log_probs = tf.where(finished, eos_only, log_probs)
+
+        total_log_probs = tf.expand_dims(state.log_probs, axis=2) + log_probs
+        lengths = state.lengths + tf.to_int32(
+            tf.logical_not(state.finished))
+        scores = total_log_probs / tf.expand_dims(
+            self._length_penalty(lengths), axis=2)
+
+        # Select the best beams among all extensions of each utterance
+        top_scores, indices = tf.nn.top_k(
+            tf.reshape(scores, [batch_size, beam_width * num_classes]),
+            k=beam_width)
+        parent_ids = indices // num_classes
+        predicted_ids = indices % num_classes
+
+        next_log_probs = _gather_beams(
+            tf.reshape(total_log_probs,
+                       [batch_size, beam_width * num_classes]), indices)
+        next_lengths = _gather_beams(lengths, parent_ids)
+        next_finished = tf.logical_or(
+            _gather_beams(state.finished, parent_ids),
+            tf.equal(predicted_ids, self.end_token))
+
+        # Reorder states by the parent beams
+        flat_parent_ids = tf.reshape(
+            parent_ids + tf.expand_dims(tf.range(batch_size) * beam_width,
+                                        axis=1), [-1])
+        next_cell_state = nest.map_structure(
+            lambda x: tf.gather(x, flat_parent_ids), cell_state)
+        next_attention_context = tf.gather(attention_context,
+                                           flat_parent_ids)
+        next_attention_focus = tf.gather(attention_focus, flat_parent_ids)
+
+        outputs = BeamSearchOutput(scores=top_scores,
+                                   predicted_ids=predicted_ids,
+                                   parent_ids=parent_ids)
+        next_state = BeamSearchState(cell_state=next_cell_state,
+                                     attention_context=next_attention_context,
+                                     attention_focus=next_attention_focus,
+                                     log_probs=next_log_probs,
+                                     finished=next_finished,
+                                     lengths=next_lengths)
+        next_inputs = self._inputs(tf.reshape(predicted_ids, [-1]),
+                                   next_attention_context)
+        return (outputs, next_state, next_inputs,
+                tf.reduce_all(next_finished, axis=1))
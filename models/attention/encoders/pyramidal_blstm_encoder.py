@@ -11,8 +11,36 @@ import tensorflow as tf
 from .encoder_base import EncoderOutput, EncoderBase
 
 
+def concat_frames(inputs, inputs_seq_len):
+    """Halve the time resolution by concatenating each 2 frames. This is
+       done by a reshape, so that max_time can be unknown until run time.
+       When max_time is odd, a zero frame is appended.
+    Args:
+        inputs: A tensor of size `[batch_size, max_time, input_size]`.
+            input_size must be known.
+        inputs_seq_len: An int tensor of size `[batch_size]`
+    Returns:
+        outputs: A tensor of size
+            `[batch_size, ceil(max_time / 2), input_size * 2]`
+        outputs_seq_len: `ceil(inputs_seq_len / 2)`, the same dtype as
+            inputs_seq_len
+    """
+    input_size = inputs.get_shape().as_list()[-1]
+    batch_size = tf.shape(inputs)[0]
+    max_time = tf.shape(inputs)[1]
+
+    inputs = tf.pad(inputs, [[0, 0], [0, max_time % 2], [0, 0]])
+    outputs = tf.reshape(inputs,
+                         [batch_size, (max_time + 1) // 2, input_size * 2])
+    outputs_seq_len = (inputs_seq_len + 1) // 2
+    return outputs, outputs_seq_len
+
+
 class PyramidalBLSTMEncoder(EncoderBase):
-    """Pyramidal Bidirectional LSTM Encoder.
+    """Pyramidal Bidirectional LSTM Encoder. Each layer except the first
+       one reads 2 concatenated frames of the layer below, so the time
+       resolution of outputs is reduced by 2^(num_layer - 1).
+       See https://arxiv.org/abs/1508.01211.
     Args:
         num_unit:
         num_layer:
@@ -49,10 +77,10 @@ class PyramidalBLSTMEncoder(EncoderBase):
             EncoderOutput: A tuple of
                 `(outputs, final_state,
                         attention_values, attention_values_length)`
-                outputs:
+                outputs: `[batch_size, reduced_time, num_unit * 2]`
                 final_state:
-                attention_values:
-                attention_values_length:
+                attention_values: The same as outputs
+                attention_values_length: The lengths of outputs
         """
         self.inputs = inputs
         self.inputs_seq_len = inputs_seq_len
@@ -102,33 +130,10 @@ class PyramidalBLSTMEncoder(EncoderBase):
                 # initial_state_fw=_init_state_fw,
                 # initial_state_bw=_init_state_bw,
 
-                # Convert to `[max_time, batch_size, input_size]`
-                outputs = tf.transpose(outputs, (1, 0, 2))
-                max_time = outputs.get_shape()[0]
-
-                # Concatenate each 2 time steps to reduce time resolution
-                def concat_fn(inputs, current_time):
-                    if current_time % 2 != 0:
-                        concat_input = tf.concat(
-                            axis=0,
-                            values=[outputs[current_time - 1, :, :],
-                                    outputs[current_time, :, :]],
-                            name='pblstm_concat')
-                        return concat_input
-
-                # Use tf.map_fn to apply concat_fn to each tensor in outputs, along
-                # dimension 0 (timestep dimension)
-                # concat_list = tf.map_fn(concat_fn, outputs.value_index)
-                # concat_list = tf.foldl(concat_fn, outputs.value_index)
-                concat_list = tf.while_loop(
-                    cond=lambda x: tf.less(x, max_time),
-                    body=concat_fn,
-                    loop_vars=[outputs.value_index])
-
-                outputs = tf.pack(concat_list, axis=0, name='pblstm_pack')
-
-                # Reshape to `[batch_size, max_time, input_size]`
-                outputs = tf.transpose(outputs, (1, 0, 2))
+                if i_layer > 0:
+                    # Concatenate each 2 time steps to reduce time resolution
+                    outputs, inputs_seq_len = concat_frames(outputs,
+                                                            inputs_seq_len)
 
                 # Stacking
                 (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
@@ -8,7 +8,7 @@ from __future__ import division
 from __future__ import print_function
 
 import tensorflow as tf
-from .ctc_base import ctcBase
+from .ctc_base import ctcBase, concat_frames
 
 
 class BLSTM_CTC(ctcBase):
@@ -31,6 +31,9 @@ class BLSTM_CTC(ctcBase):
         num_proj: int, the number of nodes in recurrent projection layer
         weight_decay: A float value. Regularization parameter for weight decay
         bottleneck_dim: int, the dimensions of the bottleneck layer
+        num_subsample: int, the number of layers whose inputs are 2
+            concatenated frames of the layer below (from the 2nd layer).
+            The time resolution of logits is reduced by 2^num_subsample.
     """
 
     def __init__(self,
@@ -47,6 +50,7 @@ class BLSTM_CTC(ctcBase):
                  num_proj=None,
                  weight_decay=0.0,
                  bottleneck_dim=None,
+                 num_subsample=0,
                  name='blstm_ctc'):
 
         ctcBase.__init__(self, batch_size, input_size, num_unit, num_layer,
@@ -57,6 +61,9 @@ class BLSTM_CTC(ctcBase):
 
         self.num_proj = None if num_proj == 0 else num_proj
         self.bottleneck_dim = bottleneck_dim
+        if num_subsample >= num_layer:
+            raise ValueError('num_subsample should be less than num_layer.')
+        self.num_subsample = num_subsample
 
     def _build(self, inputs, inputs_seq_len):
         """Construct model graph.
@@ -64,13 +71,11 @@ class BLSTM_CTC(ctcBase):
             inputs: A tensor of `[batch_size, max_time, input_dim]`
             inputs_seq_len:  A tensor of `[batch_size]`
         Returns:
-            logits:
+            logits: A tensor of `[max_time, batch_size, num_classes]`.
+                max_time is reduced by `num_subsample`.
         """
         # Dropout for inputs
-        self.keep_prob_input = tf.placeholder(tf.float32,
-                                              name='keep_prob_input')
-        self.keep_prob_hidden = tf.placeholder(tf.float32,
-                                               name='keep_prob_hidden')
+        self._create_keep_prob_placeholders()
         outputs = tf.nn.dropout(inputs,
                                 self.keep_prob_input,
                                 name='dropout_input')
@@ -115,6 +120,11 @@ class BLSTM_CTC(ctcBase):
                 # initial_state_fw=_init_state_fw,
                 # initial_state_bw=_init_state_bw,
 
+                if 0 < i_layer <= self.num_subsample:
+                    # Concatenate each 2 frames to reduce time resolution
+                    outputs, inputs_seq_len = concat_frames(outputs,
+                                                            inputs_seq_len)
+
                 # Ignore 2nd return (the last state)
                 (outputs_fw, outputs_bw), _ = tf.nn.bidirectional_dynamic_rnn(
                     cell_fw=lstm_fw,
@@ -137,23 +147,25 @@ class BLSTM_CTC(ctcBase):
         batch_size = tf.shape(inputs)[0]
 
         if self.bottleneck_dim is not None:
-            with tf.name_scope('bottleneck'):
+            with tf.variable_scope('bottleneck'):
                 # Affine
-                W_bottleneck = tf.Variable(tf.truncated_normal(
-                    shape=[output_node, self.bottleneck_dim],
-                    stddev=0.1, name='W_bottleneck'))
-                b_bottleneck = tf.Variable(tf.zeros(
-                    shape=[self.bottleneck_dim], name='b_bottleneck'))
+                W_bottleneck = tf.get_variable(
+                    'W_bottleneck', shape=[output_node, self.bottleneck_dim],
+                    initializer=tf.truncated_normal_initializer(stddev=0.1))
+                b_bottleneck = tf.get_variable(
+                    'b_bottleneck', shape=[self.bottleneck_dim],
+                    initializer=tf.zeros_initializer())
                 outputs = tf.matmul(outputs, W_bottleneck) + b_bottleneck
                 output_node = self.bottleneck_dim
 
-        with tf.name_scope('output'):
+        with tf.variable_scope('output'):
             # Affine
-            W_output = tf.Variable(tf.truncated_normal(
-                shape=[output_node, self.num_classes],
-                stddev=0.1, name='W_output'))
-            b_output = tf.Variable(tf.zeros(
-                shape=[self.num_classes], name='b_output'))
+            W_output = tf.get_variable(
+                'W_output', shape=[output_node, self.num_classes],
+                initializer=tf.truncated_normal_initializer(stddev=0.1))
+            b_output = tf.get_variable(
+                'b_output', shape=[self.num_classes],
+                initializer=tf.zeros_initializer())
             logits_2d = tf.matmul(outputs, W_output) + b_output
 
             # Reshape back to the original shape
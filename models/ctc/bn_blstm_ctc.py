@@ -73,15 +73,14 @@ class BN_BLSTM_CTC(ctcBase):
             logits:
         """
         # Dropout for inputs
-        self.keep_prob_input = tf.placeholder(tf.float32,
-                                              name='keep_prob_input')
-        self.keep_prob_hidden = tf.placeholder(tf.float32,
-                                               name='keep_prob_hidden')
+        self._create_keep_prob_placeholders()
         outputs = tf.nn.dropout(inputs,
                                 self.keep_prob_input,
                                 name='dropout_input')
 
-        self.is_training = tf.placeholder(tf.bool)
+        if getattr(self, 'is_training', None) is None or \
+                self.is_training.graph is not tf.get_default_graph():
+            self.is_training = tf.placeholder(tf.bool)
 
         # Hidden layers
         for i_layer in range(self.num_layer):
@@ -148,23 +147,25 @@ class BN_BLSTM_CTC(ctcBase):
         batch_size = tf.shape(inputs)[0]
 
         if self.bottleneck_dim is not None:
-            with tf.name_scope('bottleneck'):
+            with tf.variable_scope('bottleneck'):
                 # Affine
-                W_bottleneck = tf.Variable(tf.truncated_normal(
-                    shape=[output_node, self.bottleneck_dim],
-                    stddev=0.1, name='W_bottleneck'))
-                b_bottleneck = tf.Variable(tf.zeros(
-                    shape=[self.bottleneck_dim], name='b_bottleneck'))
+                W_bottleneck = tf.get_variable(
+                    'W_bottleneck', shape=[output_node, self.bottleneck_dim],
+                    initializer=tf.truncated_normal_initializer(stddev=0.1))
+                b_bottleneck = tf.get_variable(
+                    'b_bottleneck', shape=[self.bottleneck_dim],
+                    initializer=tf.zeros_initializer())
                 outputs = tf.matmul(outputs, W_bottleneck) + b_bottleneck
                 output_node = self.bottleneck_dim
 
-        with tf.name_scope('output'):
+        with tf.variable_scope('output'):
             # Affine
-            W_output = tf.Variable(tf.truncated_normal(
-                shape=[output_node, self.num_classes],
-                stddev=0.1, name='W_output'))
-            b_output = tf.Variable(tf.zeros(
-                shape=[self.num_classes], name='b_output'))
+            W_output = tf.get_variable(
+                'W_output', shape=[output_node, self.num_classes],
+                initializer=tf.truncated_normal_initializer(stddev=0.1))
+            b_output = tf.get_variable(
+                'b_output', shape=[self.num_classes],
+                initializer=tf.zeros_initializer())
             logits_2d = tf.matmul(outputs, W_output) + b_output
 
             # Reshape back to the original shape
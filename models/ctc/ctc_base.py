@@ -8,6 +8,7 @@ from __future__ import division
 from __future__ import print_function
 
 import tensorflow as tf
+from tensorflow.python.util import nest
 
 
 OPTIMIZER_CLS_NAMES = {
@@ -20,6 +21,31 @@ OPTIMIZER_CLS_NAMES = {
 }
 
 
+def concat_frames(inputs, inputs_seq_len):
+    """Halve the time resolution by concatenating each 2 frames. This is
+       done by a reshape, so that max_time can be unknown until run time.
+       When max_time is odd, a zero frame is appended.
+    Args:
+        inputs: A tensor of size `[batch_size, max_time, input_size]`.
+            input_size must be known.
+        inputs_seq_len: An int tensor of size `[batch_size]`
+    Returns:
+        outputs: A tensor of size
+            `[batch_size, ceil(max_time / 2), input_size * 2]`
+        outputs_seq_len: `ceil(inputs_seq_len / 2)`, the same dtype as
+            inputs_seq_len
+    """
+    input_size = inputs.get_shape().as_list()[-1]
+    batch_size = tf.shape(inputs)[0]
+    max_time = tf.shape(inputs)[1]
+
+    inputs = tf.pad(inputs, [[0, 0], [0, max_time % 2], [0, 0]])
+    outputs = tf.reshape(inputs,
+                         [batch_size, (max_time + 1) // 2, input_size * 2])
+    outputs_seq_len = (inputs_seq_len + 1) // 2
+    return outputs, outputs_seq_len
+
+
 class ctcBase(object):
     """Connectionist Temporal Classification (CTC) network.
     Args:
@@ -70,6 +96,10 @@ class ctcBase(object):
         self.dropout_ratio_hidden = dropout_ratio_hidden
         self.weight_decay = float(weight_decay)
 
+        # The number of times the time resolution is halved in the model
+        # (see `concat_frames`)
+        self.num_subsample = 0
+
         # Summaries for TensorBoard
         self.summaries_train = []
         self.summaries_dev = []
@@ -91,6 +121,33 @@ class ctcBase(object):
                     tf.shape(inputs), 0.0, stddev) + inputs
         return inputs
 
+    def _create_keep_prob_placeholders(self):
+        """Create placeholders of keep probabilities of dropout. When the
+           graph is built several times (multiple towers), the placeholders
+           created first are shared by all towers."""
+        if getattr(self, 'keep_prob_input', None) is None or \
+                self.keep_prob_input.graph is not tf.get_default_graph():
+            self.keep_prob_input = tf.placeholder(tf.float32,
+                                                  name='keep_prob_input')
+            self.keep_prob_hidden = tf.placeholder(tf.float32,
+                                                   name='keep_prob_hidden')
+
+    def _initial_state(self, cell, batch_size):
+        """Create placeholders of the initial state of an RNN cell. The zero
+           state is used unless they are fed.
+        Args:
+            cell: An instance of `RNNCell`
+            batch_size: A scalar tensor
+        Returns:
+            initial_state: nested tuple of placeholders of the same
+                structure as `cell.state_size`
+        """
+        zero_state = cell.zero_state(batch_size, tf.float32)
+        return nest.map_structure(
+            lambda x: tf.placeholder_with_default(
+                x, shape=[None] + x.get_shape().as_list()[1:]),
+            zero_state)
+
     def _add_noise_to_gradients(grads_and_vars, gradient_noise_scale,
                                 stddev=0.075):
         """Adds scaled noise from a 0-mean normal distribution to gradients."""
@@ -104,6 +161,9 @@ class ctcBase(object):
             labels: A SparseTensor of target labels
             inputs_seq_len: A tensor of size `[batch_size]`
             num_gpu: the number of GPUs
+            scope: the name scope of the tower. If set, only losses in this
+                scope are summed, so that towers do not include losses of
+                each other.
         Returns:
             loss: operation for computing ctc loss
             logits:
@@ -122,12 +182,12 @@ class ctcBase(object):
         with tf.name_scope("ctc_loss"):
             ctc_loss = tf.nn.ctc_loss(labels,
                                       logits,
-                                      tf.cast(inputs_seq_len, tf.int32))
+                                      self.output_seq_len(inputs_seq_len))
             ctc_loss_mean = tf.reduce_mean(ctc_loss, name='ctc_loss_mean')
             tf.add_to_collection('losses', ctc_loss_mean)
 
         # Compute total loss
-        loss = tf.add_n(tf.get_collection('losses'), name='total_loss')
+        loss = tf.add_n(tf.get_collection('losses', scope), name='total_loss')
 
         if num_gpu == 1:
             # Add a scalar summary for the snapshot of loss
@@ -152,6 +212,40 @@ class ctcBase(object):
         Returns:
             train_op: operation for training
         """
+        optimizer = self._create_optimizer(optimizer, learning_rate_init,
+                                           is_scheduled)
+
+        # Create a variable to track the global step
+        global_step = tf.Variable(0, name='global_step', trainable=False)
+
+        if self.clip_grad is not None:
+            # Gradient clipping
+            train_op = self._gradient_clipping(loss,
+                                               optimizer,
+                                               clip_grad_by_norm,
+                                               global_step)
+
+            # TODO: Optionally add noise to weight matrix when training
+            # どっちが先？
+
+        else:
+            # Use the optimizer to apply the gradients that minimize the loss
+            # and also increment the global step counter as a single training
+            # step
+            train_op = optimizer.minimize(loss, global_step=global_step)
+
+        return train_op
+
+    def _create_optimizer(self, optimizer, learning_rate_init,
+                          is_scheduled):
+        """Create an optimizer and the placeholder of learning rate.
+        Args:
+            optimizer: string, name of the optimizer in OPTIMIZER_CLS_NAMES
+            learning_rate_init: initial learning rate
+            is_scheduled: if True, schedule learning rate at each epoch
+        Returns:
+            optimizer: An instance of `tf.train.Optimizer`
+        """
         optimizer = optimizer.lower()
         if optimizer not in OPTIMIZER_CLS_NAMES:
             raise ValueError(
@@ -174,46 +268,94 @@ class ctcBase(object):
             optimizer = OPTIMIZER_CLS_NAMES[optimizer](
                 learning_rate=learning_rate_init)
 
+        return optimizer
+
+    def train_towers(self, tower_losses, tower_weights, optimizer,
+                     learning_rate_init=None, clip_grad_by_norm=None,
+                     is_scheduled=False):
+        """Operation for data-parallel training on multiple towers.
+           Gradients are computed on the device of each tower, clipped in
+           each tower, and averaged with tower_weights.
+        Args:
+            tower_losses: list of operations for computing loss of each
+                tower. Variables must be shared by all towers.
+            tower_weights: list of scalar tensors, the weight of each tower
+                in averaging (ex. the ratio of utterances in the tower).
+                They must sum to 1.
+            optimizer: string, name of the optimizer in OPTIMIZER_CLS_NAMES
+            learning_rate_init: initial learning rate
+            clip_grad_by_norm: if True, clip gradients by norm of the
+                value of self.clip_grad
+            is_scheduled: if True, schedule learning rate at each epoch
+        Returns:
+            train_op: operation for training
+        """
+        optimizer = self._create_optimizer(optimizer, learning_rate_init,
+                                           is_scheduled)
+
         # Create a variable to track the global step
         global_step = tf.Variable(0, name='global_step', trainable=False)
 
-        if self.clip_grad is not None:
-            # Gradient clipping
-            train_op = self._gradient_clipping(loss,
-                                               optimizer,
-                                               clip_grad_by_norm,
-                                               global_step)
-
-            # TODO: Optionally add noise to weight matrix when training
-            # どっちが先？
+        trainable_vars = tf.trainable_variables()
+        tower_grads = []
+        for i_tower, loss in enumerate(tower_losses):
+            with tf.name_scope('tower_grads%d' % i_tower):
+                with tf.device(loss.device):
+                    grads = tf.gradients(loss, trainable_vars,
+                                         colocate_gradients_with_ops=True)
+                    if self.clip_grad is not None:
+                        grads = self._clip_gradients(grads,
+                                                     clip_grad_by_norm)
+            tower_grads.append(grads)
+
+        with tf.name_scope('average_grads'):
+            self.clipped_grads = []
+            for grads in zip(*tower_grads):
+                if grads[0] is None:
+                    # The variable is not used in the loss
+                    self.clipped_grads.append(None)
+                    continue
+                self.clipped_grads.append(tf.add_n(
+                    [g * w for g, w in zip(grads, tower_weights)]))
 
-        else:
-            # Use the optimizer to apply the gradients that minimize the loss
-            # and also increment the global step counter as a single training
-            # step
-            train_op = optimizer.minimize(loss, global_step=global_step)
+        # Create gradient updates
+        train_op = optimizer.apply_gradients(
+            zip(self.clipped_grads, trainable_vars),
+            global_step=global_step,
+            name='train')
 
         return train_op
 
-    def _gradient_clipping(self, loss, optimizer, clip_grad_by_norm,
-                           global_step):
-        print('--- Apply gradient clipping ---')
-        # Compute gradients
-        trainable_vars = tf.trainable_variables()
-        grads = tf.gradients(loss, trainable_vars)
-
+    def _clip_gradients(self, grads, clip_grad_by_norm):
+        """Clip gradients by the value of self.clip_grad.
+        Args:
+            grads: list of gradients (None for variables not used in loss)
+            clip_grad_by_norm: if True, clip by norm. Otherwise clip by
+                absolute values.
+        Returns:
+            clipped_grads: list of clipped gradients
+        """
         if clip_grad_by_norm:
             # Clip by norm
-            self.clipped_grads = [tf.clip_by_norm(
+            return [None if g is None else tf.clip_by_norm(
                 g,
                 clip_norm=self.clip_grad) for g in grads]
         else:
             # Clip by absolute values
-            self.clipped_grads = [tf.clip_by_value(
+            return [None if g is None else tf.clip_by_value(
                 g,
                 clip_value_min=-self.clip_grad,
                 clip_value_max=self.clip_grad) for g in grads]
 
+    def _gradient_clipping(self, loss, optimizer, clip_grad_by_norm,
+                           global_step):
+        print('--- Apply gradient clipping ---')
+        # Compute gradients
+        trainable_vars = tf.trainable_variables()
+        grads = tf.gradients(loss, trainable_vars)
+
+        self.clipped_grads = self._clip_gradients(grads, clip_grad_by_norm)
+
         # TODO: Add histograms for variables, gradients (norms)
         # self._tensorboard_statistics(trainable_vars)
 
@@ -225,11 +367,24 @@ class ctcBase(object):
 
         return train_op
 
+    def output_seq_len(self, inputs_seq_len):
+        """Return the lengths of logits.
+        Args:
+            inputs_seq_len: A tensor of size `[batch_size]`
+        Returns:
+            An int32 tensor of size `[batch_size]`
+        """
+        seq_len = tf.cast(inputs_seq_len, tf.int32)
+        for _ in range(self.num_subsample):
+            seq_len = (seq_len + 1) // 2
+        return seq_len
+
     def decoder(self, logits, inputs_seq_len, decode_type, beam_width=None):
         """Operation for decoding.
         Args:
             logits:
-            inputs_seq_len: A tensor of size `[batch_size]`
+            inputs_seq_len: A tensor of size `[batch_size]`, the lengths of
+                inputs (not subsampled)
             decode_type: greedy or beam_search
             beam_width: beam width for beam search
         Return:
@@ -240,14 +395,14 @@ class ctcBase(object):
 
         if decode_type == 'greedy':
             decoded, _ = tf.nn.ctc_greedy_decoder(
-                logits, tf.cast(inputs_seq_len, tf.int32))
+                logits, self.output_seq_len(inputs_seq_len))
 
         elif decode_type == 'beam_search':
             if beam_width is None:
                 raise ValueError('Set beam_width.')
 
             decoded, _ = tf.nn.ctc_beam_search_decoder(
-                logits, tf.cast(inputs_seq_len, tf.int32),
+                logits, self.output_seq_len(inputs_seq_len),
                 beam_width=beam_width)
 
         decode_op = tf.to_int32(decoded[0])
@@ -61,11 +61,26 @@ class GRU_CTC(ctcBase):
         Returns:
             logits:
         """
+        logits, _, _ = self._build_rnn(inputs, inputs_seq_len)
+        return logits
+
+    def _build_rnn(self, inputs, inputs_seq_len, is_stateful=False):
+        """Construct model graph which also returns the states of RNN.
+        Args:
+            inputs: A tensor of `[batch_size, max_time, input_dim]`
+            inputs_seq_len:  A tensor of `[batch_size]`
+            is_stateful: if True, the initial state is fed by placeholders
+                (zero state by default), so that states are carried across
+                chunks in streaming inference
+        Returns:
+            logits: A tensor of `[max_time, batch_size, num_classes]`
+            initial_state: nested tuple of placeholders of the initial
+                state, or None if is_stateful is False
+            final_state: nested tuple of the state after the last frame
+                of each utterance
+        """
         # Dropout for inputs
-        self.keep_prob_input = tf.placeholder(tf.float32,
-                                              name='keep_prob_input')
-        self.keep_prob_hidden = tf.placeholder(tf.float32,
-                                               name='keep_prob_hidden')
+        self._create_keep_prob_placeholders()
         inputs = tf.nn.dropout(inputs,
                                self.keep_prob_input,
                                name='dropout_input')
@@ -92,11 +107,14 @@ class GRU_CTC(ctcBase):
         stacked_gru = tf.contrib.rnn.MultiRNNCell(
             gru_list, state_is_tuple=True)
 
-        # Ignore 2nd return (the last state)
-        outputs, _ = tf.nn.dynamic_rnn(cell=stacked_gru,
-                                       inputs=inputs,
-                                       sequence_length=inputs_seq_len,
-                                       dtype=tf.float32)
+        initial_state = self._initial_state(
+            stacked_gru, tf.shape(inputs)[0]) if is_stateful else None
+        outputs, final_state = tf.nn.dynamic_rnn(
+            cell=stacked_gru,
+            inputs=inputs,
+            sequence_length=inputs_seq_len,
+            initial_state=initial_state,
+            dtype=tf.float32)
 
         # `[batch_size, max_time, input_size_splice]`
         batch_size = tf.shape(inputs)[0]
@@ -106,23 +124,25 @@ class GRU_CTC(ctcBase):
         outputs = tf.reshape(outputs, shape=[-1, output_node])
 
         if self.bottleneck_dim is not None:
-            with tf.name_scope('bottleneck'):
+            with tf.variable_scope('bottleneck'):
                 # Affine
-                W_bottleneck = tf.Variable(tf.truncated_normal(
-                    shape=[output_node, self.bottleneck_dim],
-                    stddev=0.1, name='W_bottleneck'))
-                b_bottleneck = tf.Variable(tf.zeros(
-                    shape=[self.bottleneck_dim], name='b_bottleneck'))
+                W_bottleneck = tf.get_variable(
+                    'W_bottleneck', shape=[output_node, self.bottleneck_dim],
+                    initializer=tf.truncated_normal_initializer(stddev=0.1))
+                b_bottleneck = tf.get_variable(
+                    'b_bottleneck', shape=[self.bottleneck_dim],
+                    initializer=tf.zeros_initializer())
                 outputs = tf.matmul(outputs, W_bottleneck) + b_bottleneck
                 output_node = self.bottleneck_dim
 
-        with tf.name_scope('output'):
+        with tf.variable_scope('output'):
             # Affine
-            W_output = tf.Variable(tf.truncated_normal(
-                shape=[output_node, self.num_classes],
-                stddev=0.1, name='W_output'))
-            b_output = tf.Variable(tf.zeros(
-                shape=[self.num_classes], name='b_output'))
+            W_output = tf.get_variable(
+                'W_output', shape=[output_node, self.num_classes],
+                initializer=tf.truncated_normal_initializer(stddev=0.1))
+            b_output = tf.get_variable(
+                'b_output', shape=[self.num_classes],
+                initializer=tf.zeros_initializer())
             logits_2d = tf.matmul(outputs, W_output) + b_output
 
             # Reshape back to the original shape
@@ -132,4 +152,4 @@ class GRU_CTC(ctcBase):
             # Convert to `[max_time, batch_size, num_classes]'
             logits = tf.transpose(logits_3d, (1, 0, 2))
 
-            return logits
+            return logits, initial_state, final_state
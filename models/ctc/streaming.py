@@ -0,0 +1,134 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Streaming (chunked) inference of unidirectional CTC models (LSTM_CTC,
+   GRU_CTC). Features are fed chunk by chunk, and RNN states are carried
+   across chunks, so posteriors are emitted without waiting for the whole
+   utterance.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.util import nest
+
+
+class StreamingCTC(object):
+    """Build the graph of a unidirectional CTC model for streaming inference.
+       Variables are shared with a model built in the same graph, or
+       restored from a checkpoint of the model.
+    Args:
+        network: An instance of LSTM_CTC or GRU_CTC
+        reuse: if True, reuse variables of the model already built in the
+            graph (ex. for training)
+    """
+
+    def __init__(self, network, reuse=False):
+        if not hasattr(network, '_build_rnn'):
+            raise TypeError(
+                '%s is not a unidirectional model. Use LSTM_CTC or GRU_CTC '
+                'for streaming inference.' % type(network).__name__)
+        self.network = network
+
+        with tf.variable_scope(tf.get_variable_scope(), reuse=reuse):
+            with tf.name_scope('streaming'):
+                self.inputs = tf.placeholder(
+                    tf.float32,
+                    shape=[None, None, network.input_size],
+                    name='chunk_input')
+                self.inputs_seq_len = tf.placeholder(tf.int64,
+                                                     shape=[None],
+                                                     name='chunk_seq_len')
+                logits, self.initial_state, self.final_state = \
+                    network._build_rnn(self.inputs, self.inputs_seq_len,
+                                       is_stateful=True)
+                # `[batch_size, chunk_len, num_classes]`
+                self.posteriors = tf.nn.softmax(
+                    tf.transpose(logits, (1, 0, 2)))
+
+        self._initial_state_list = nest.flatten(self.initial_state)
+        self._final_state_list = nest.flatten(self.final_state)
+        self.state = None
+
+    def reset(self):
+        """Start new streams from the zero state."""
+        self.state = None
+
+    def step(self, session, inputs, inputs_seq_len=None):
+        """Feed the next chunk of each stream.
+        Args:
+            session: A `tf.Session`
+            inputs: A numpy array of size `[batch_size, chunk_len, input_size]`
+            inputs_seq_len: A numpy array of size `[batch_size]`, the number
+                of frames of the chunk of each stream. If None, all streams
+                have chunk_len frames.
+        Returns:
+            posteriors: A numpy array of size
+                `[batch_size, chunk_len, num_classes]`
+        """
+        if inputs_seq_len is None:
+            inputs_seq_len = np.full((inputs.shape[0],), inputs.shape[1],
+                                     dtype=np.int64)
+        feed_dict = {
+            self.inputs: inputs,
+            self.inputs_seq_len: inputs_seq_len,
+            self.network.keep_prob_input: 1.0,
+            self.network.keep_prob_hidden: 1.0
+        }
+        if self.state is not None:
+            feed_dict.update(zip(self._initial_state_list, self.state))
+
+        outputs = session.run([self.posteriors] + self._final_state_list,
+                              feed_dict=feed_dict)
+        self.state = outputs[1:]
+        return outputs[0]
+
+
+def decode_streaming(streaming, session, inputs, chunk_size, decoder,
+                     frame_shift=0.01):
+    """Decode an utterance chunk by chunk as if features arrive in real
+       time, and measure latency.
+    Args:
+        streaming: An instance of `StreamingCTC`
+        session: A `tf.Session`
+        inputs: A numpy array of size `[frame_num, input_size]`
+        chunk_size: int, the number of frames of a chunk
+        decoder: An incremental decoder which has `reset()`, `step()`,
+            `best()` and `first_token_frame` (see
+            experiments/utils/ctc_decoder.py)
+        frame_shift: A float value, seconds per frame
+    Returns:
+        labels: list of decoded labels
+        first_token_latency: seconds from the arrival of the frame where the
+            first label is emitted to the end of processing its chunk
+            (waiting for the rest of the chunk + computation). None if no
+            label is emitted.
+        rtf: real-time factor, processing time / duration of the utterance
+    """
+    streaming.reset()
+    decoder.reset()
+    frame_num = inputs.shape[0]
+    processing_time = 0.
+    first_token_latency = None
+    for start in range(0, frame_num, chunk_size):
+        chunk = inputs[start:start + chunk_size]
+        start_time = time.time()
+        posteriors = streaming.step(session, chunk[np.newaxis])
+        decoder.step(posteriors[0])
+        duration = time.time() - start_time
+        processing_time += duration
+
+        if first_token_latency is None and \
+                decoder.first_token_frame is not None:
+            # The chunk is available after its last frame arrives
+            end_frame = start + len(chunk)
+            first_token_latency = \
+                (end_frame - 1 - decoder.first_token_frame) * frame_shift + \
+                duration
+
+    return (decoder.best(), first_token_latency,
+            processing_time / (frame_num * frame_shift))
@@ -8,6 +8,7 @@ from __future__ import print_function
 import sys
 import time
 import unittest
+import numpy as np
 import tensorflow as tf
 from tensorflow.python import debug as tf_debug
 
@@ -27,6 +28,67 @@ class TestAttention(tf.test.TestCase):
         self.check_training(model_type='attention', label_type='phone')
         self.check_training(model_type='attention', label_type='character')
 
+    def test_attention_weights(self):
+        print("Attention weights Working check.")
+        for attention_type in ['bahdanau', 'windowed']:
+            self.check_attention_weights(attention_type)
+
+    def check_attention_weights(self, attention_type, window_size=8):
+        """Attention weights of inference are given over all frames for
+           all attention types."""
+        print('----- ' + attention_type + ' -----')
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            batch_size = 4
+            inputs, labels, inputs_seq_len, labels_seq_len = generate_data(
+                label_type='phone',
+                model='attention',
+                batch_size=batch_size)
+
+            output_size = 61 + 2
+            network = BLSTMAttetion(
+                batch_size=batch_size,
+                input_size=inputs[0].shape[1],
+                encoder_num_unit=64,
+                encoder_num_layer=1,
+                attention_dim=32,
+                decoder_num_unit=64,
+                decoder_num_layer=1,
+                embedding_dim=20,
+                output_size=output_size,
+                sos_index=output_size - 2,
+                eos_index=output_size - 1,
+                max_decode_length=20,
+                attention_weights_tempareture=0.5,
+                logits_tempareture=4,
+                parameter_init=0.1,
+                attention_type=attention_type,
+                attention_window_size=(window_size
+                                       if attention_type == 'windowed'
+                                       else None))
+            network.define()
+            attention_weights_op = network.attention_weights()
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                attention_weights = sess.run(attention_weights_op, feed_dict={
+                    network.inputs: inputs,
+                    network.inputs_seq_len: inputs_seq_len,
+                    network.keep_prob_input: 1.0,
+                    network.keep_prob_hidden: 1.0
+                })
+
+            self.assertEqual(attention_weights.ndim, 3)
+            self.assertEqual(attention_weights.shape[0], batch_size)
+            self.assertEqual(attention_weights.shape[2], inputs.shape[1])
+            # Each step sums to 1 (0 after decoding is finished)
+            sums = attention_weights.sum(axis=2)
+            self.assertTrue(np.all(np.logical_or(
+                np.isclose(sums, 1., atol=1e-5), np.isclose(sums, 0.))))
+            if attention_type == 'windowed':
+                self.assertTrue(np.all(
+                    (attention_weights > 0).sum(axis=2) <= window_size))
+
     def check_training(self, model_type, label_type):
         print('----- ' + model_type + ', ' + label_type + ' -----')
         tf.reset_default_graph()
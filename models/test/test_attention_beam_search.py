@@ -0,0 +1,145 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import tensorflow as tf
+
+sys.path.append('../')
+sys.path.append('../../')
+from attention.blstm_attention_seq2seq import BLSTMAttetion
+from util import measure_time
+from data import generate_data, num2phone
+from experiments.utils.edit_distance import ErrorCounter
+
+
+def strip_eos(labels, eos_index):
+    """Remove <EOS> and labels after it."""
+    labels = list(labels)
+    if eos_index in labels:
+        labels = labels[:labels.index(eos_index)]
+    return labels
+
+
+class TestAttentionBeamSearch(tf.test.TestCase):
+
+    @measure_time
+    def test_beam_search(self):
+        print("Attention beam search Working check.")
+        self.check_beam_search(length_penalty_weight=0.0)
+        self.check_beam_search(length_penalty_weight=0.6)
+
+    def check_beam_search(self, length_penalty_weight, max_steps=200,
+                          num_runs=10):
+        print('----- length penalty: %.1f -----' % length_penalty_weight)
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            # Load batch data
+            batch_size = 4
+            inputs, labels, inputs_seq_len, labels_seq_len = generate_data(
+                label_type='phone',
+                model='attention',
+                batch_size=batch_size)
+
+            # Define model
+            output_size = 61 + 2
+            network = BLSTMAttetion(
+                batch_size=batch_size,
+                input_size=inputs[0].shape[1],
+                encoder_num_unit=256,
+                encoder_num_layer=2,
+                attention_dim=128,
+                decoder_num_unit=256,
+                decoder_num_layer=1,
+                embedding_dim=50,
+                output_size=output_size,
+                sos_index=output_size - 2,
+                eos_index=output_size - 1,
+                max_decode_length=100,
+                attention_weights_tempareture=0.5,
+                logits_tempareture=4,
+                parameter_init=0.1,
+                clip_grad=5.0,
+                clip_activation_encoder=50,
+                clip_activation_decoder=50,
+                dropout_ratio_input=1.0,
+                dropout_ratio_hidden=1.0,
+                weight_decay=1e-6,
+                beam_width=10)
+            network.define()
+
+            loss_op = network.compute_loss()
+            learning_rate = 1e-3
+            train_op = network.train(optimizer='adam',
+                                     learning_rate_init=learning_rate,
+                                     is_scheduled=False)
+            _, decode_op_greedy = network.decoder(decode_type='greedy')
+            _, decode_op_beam = network.decoder(
+                decode_type='beam_search',
+                beam_width=network.beam_width,
+                length_penalty_weight=length_penalty_weight)
+
+            feed_dict = {
+                network.inputs: inputs,
+                network.labels: labels,
+                network.inputs_seq_len: inputs_seq_len,
+                network.labels_seq_len: labels_seq_len,
+                network.keep_prob_input: network.dropout_ratio_input,
+                network.keep_prob_hidden: network.dropout_ratio_hidden,
+                network.learning_rate: learning_rate
+            }
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+
+                # Train model
+                for step in range(max_steps):
+                    _, loss_train = sess.run([train_op, loss_op],
+                                             feed_dict=feed_dict)
+                    if (step + 1) % 50 == 0:
+                        print('Step %d: loss = %.3f' % (step + 1, loss_train))
+
+                feed_dict[network.keep_prob_input] = 1.0
+                feed_dict[network.keep_prob_hidden] = 1.0
+                labels_true = [label[1:-1] for label in labels]
+
+                def evaluate(decode_op, feed_dict):
+                    sess.run(decode_op, feed_dict=feed_dict)
+                    start_time = time.time()
+                    for _ in range(num_runs):
+                        predicted_ids = sess.run(decode_op,
+                                                 feed_dict=feed_dict)
+                    latency = (time.time() - start_time) / num_runs
+                    labels_pred = [strip_eos(x, network.eos_index)
+                                   for x in predicted_ids]
+                    error_counter = ErrorCounter()
+                    error_counter.update(labels_true, labels_pred)
+                    return labels_pred, latency, error_counter.error_rate
+
+                labels_greedy, latency, per = evaluate(decode_op_greedy,
+                                                       feed_dict)
+                print('greedy: PER = %.3f / %.3f sec per batch' %
+                      (per, latency))
+                print('True: %s' % num2phone(labels_true[0]))
+                print('Pred: %s' % num2phone(labels_greedy[0]))
+
+                # Beam width is changed at runtime
+                for beam_width in [1, 4, 10]:
+                    feed_dict[network.beam_width_pl] = beam_width
+                    labels_beam, latency, per = evaluate(decode_op_beam,
+                                                         feed_dict)
+                    print('beam %d: PER = %.3f / %.3f sec per batch' %
+                          (beam_width, per, latency))
+                    print('Pred: %s' % num2phone(labels_beam[0]))
+
+                    # Beam search with a beam is greedy decoding
+                    if beam_width == 1 and length_penalty_weight == 0:
+                        self.assertEqual(labels_greedy, labels_beam)
+
+
+if __name__ == "__main__":
+    tf.test.main()
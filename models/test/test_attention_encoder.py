@@ -71,7 +71,21 @@ class TestAttentionEncoder(unittest.TestCase):
                 encoder_outputs = sess.run(
                     encoder_outputs_op, feed_dict=feed_dict)
 
-                if model_type == 'blstm_encoder':
+                if model_type == 'pblstm_encoder':
+                    # Time resolution is halved from the 2nd layer
+                    reduced_frame_num = frame_num
+                    for _ in range(encoder.num_layer - 1):
+                        reduced_frame_num = (reduced_frame_num + 1) // 2
+                    outputs = encoder_outputs.outputs
+                    attention_values_length = encoder_outputs.attention_values_length
+
+                    self.assertEqual(
+                        (batch_size, reduced_frame_num, encoder.num_unit * 2),
+                        outputs.shape)
+                    self.assertEqual(reduced_frame_num,
+                                     attention_values_length[0])
+
+                elif model_type == 'blstm_encoder':
                     # Pick up the final layer
                     outputs = encoder_outputs.outputs
                     (final_state_fw,
@@ -0,0 +1,269 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../')
+from attention.decoders.attention_layer import AttentionLayer, \
+    masked_softmax, window_mask, scatter_window
+from util import measure_time
+
+
+def build_decode_loop(attention_layer, encoder_states, values_length,
+                      decoder_states, is_precomputed, reuse):
+    """Run attention over decoder states of all steps in a while loop like
+       `dynamic_decode`.
+    Args:
+        attention_layer: An instance of `AttentionLayer`
+        encoder_states: A tensor of `[batch_size, max_time, encoder_num_unit]`
+        values_length: A tensor of `[batch_size]`
+        decoder_states: A tensor of `[num_steps, batch_size, decoder_num_unit]`
+        is_precomputed: if False, transform encoder states at every step
+        reuse: if True, reuse variables of the attention layer
+    Returns:
+        attention_weights: A tensor of `[num_steps, batch_size, max_time]`
+            (`[num_steps, batch_size, window_size]` for windowed attention)
+    """
+    num_steps = tf.shape(decoder_states)[0]
+    with tf.variable_scope('step', reuse=reuse):
+        attention_keys = attention_layer.precompute(encoder_states) \
+            if is_precomputed else None
+
+    def body(time, focus, weights_ta):
+        with tf.variable_scope('step', reuse=reuse):
+            keys = attention_keys if is_precomputed \
+                else attention_layer.precompute(encoder_states)
+            attention_weights, _ = attention_layer(
+                attention_keys=keys,
+                current_decoder_state=decoder_states[time],
+                values=encoder_states,
+                values_length=values_length,
+                attention_focus=focus)
+        return (time + 1,
+                attention_layer.next_focus(attention_weights, focus),
+                weights_ta.write(time, attention_weights))
+
+    _, _, weights_ta = tf.while_loop(
+        cond=lambda time, _, __: time < num_steps,
+        body=body,
+        loop_vars=[tf.constant(0),
+                   attention_layer.initial_focus(tf.shape(encoder_states)[0]),
+                   tf.TensorArray(tf.float32, size=num_steps)])
+    return weights_ta.stack()
+
+
+def time_step(sess, op, num_steps, num_runs):
+    """Return the mean time of a decoder step in milliseconds."""
+    sess.run(op)
+    start_time = time.time()
+    for _ in range(num_runs):
+        sess.run(op)
+    return (time.time() - start_time) * 1000 / (num_runs * num_steps)
+
+
+def np_masked_softmax(scores, mask, tempareture):
+    """Reference of `masked_softmax` in NumPy (float64)."""
+    scores = np.where(mask, scores / tempareture, -np.inf)
+    exp_scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+    return exp_scores / exp_scores.sum(axis=1, keepdims=True)
+
+
+class TestAttentionLayer(tf.test.TestCase):
+
+    def test_masked_softmax(self):
+        print("Masked softmax Working check.")
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            np.random.seed(0)
+            # Large scores overflow exp() without subtracting the maximum
+            scores = np.random.randn(4, 10).astype(np.float32) * 100
+            lengths = np.array([10, 7, 3, 1])
+            mask = np.arange(10)[None, :] < lengths[:, None]
+            focus = np.array([5, 0, 9, 2], dtype=np.int32)
+            # [focus - 2, focus + 2), shifted right to start from frame 0
+            start = np.maximum(focus - 2, 0)
+            positions = np.arange(10)[None, :]
+            band = np.logical_and(positions >= start[:, None],
+                                  positions < start[:, None] + 4)
+
+            weights_op = masked_softmax(tf.constant(scores),
+                                        tf.constant(mask), tempareture=0.5)
+            band_op = window_mask(tf.constant(focus), window_size=4,
+                                  max_time=10)
+            with tf.Session() as sess:
+                weights, band_tf = sess.run([weights_op, band_op])
+
+            self.assertTrue(np.all(np.isfinite(weights)))
+            self.assertAllEqual(weights[~mask], np.zeros((~mask).sum()))
+            self.assertAllClose(weights, np_masked_softmax(
+                scores.astype(np.float64), mask, 0.5), atol=1e-6)
+            self.assertAllEqual(band_tf, band)
+            # The window keeps its full width at the beginning
+            self.assertAllEqual(band_tf[1], np.arange(10) < 4)
+            self.assertAllEqual(band_tf.sum(axis=1), [4, 4, 3, 4])
+
+    def test_scatter_window(self):
+        print("Scatter window Working check.")
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            np.random.seed(0)
+            # `[batch_size, num_steps, window_size]`
+            weights = np.random.rand(2, 3, 4).astype(np.float32)
+            start = np.array([[0, 2, 6], [1, 5, 7]], dtype=np.int32)
+            max_time = 9
+            # Window frames beyond max_time are dropped
+            expected = np.zeros((2, 3, max_time), dtype=np.float32)
+            for i in range(2):
+                for j in range(3):
+                    end = min(start[i, j] + 4, max_time)
+                    expected[i, j, start[i, j]:end] = \
+                        weights[i, j, :end - start[i, j]]
+
+            scattered_op = scatter_window(tf.constant(weights),
+                                          tf.constant(start), max_time)
+            with tf.Session() as sess:
+                scattered = sess.run(scattered_op)
+
+            self.assertAllClose(scattered, expected)
+
+    @measure_time
+    def test_precompute(self):
+        print("Attention layer Working check.")
+        # A long TIMIT utterance is about 800 frames
+        self.check_precompute(max_time=800, num_steps=75)
+
+    def check_precompute(self, max_time, num_steps, batch_size=8,
+                         encoder_num_unit=512, decoder_num_unit=256,
+                         num_runs=5):
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            np.random.seed(0)
+            encoder_states = tf.constant(np.random.randn(
+                batch_size, max_time, encoder_num_unit).astype(np.float32))
+            decoder_states = tf.constant(np.random.randn(
+                num_steps, batch_size, decoder_num_unit).astype(np.float32))
+            values_length = tf.constant(
+                np.random.randint(max_time // 2, max_time + 1, batch_size),
+                dtype=tf.int32)
+
+            attention_layer = AttentionLayer(
+                num_unit=128, attention_weights_tempareture=0.5,
+                attention_type='bahdanau')
+            weights_op = {}
+            for is_precomputed in [True, False]:
+                weights_op[is_precomputed] = build_decode_loop(
+                    attention_layer, encoder_states, values_length,
+                    decoder_states, is_precomputed,
+                    reuse=not is_precomputed)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+
+                weights = {}
+                for is_precomputed in [False, True]:
+                    weights[is_precomputed] = sess.run(
+                        weights_op[is_precomputed])
+                    print('%s: %.3f msec per decoder step' %
+                          ('precomputed' if is_precomputed else 'recomputed',
+                           time_step(sess, weights_op[is_precomputed],
+                                     num_steps, num_runs)))
+
+                self.assertAllClose(weights[False], weights[True],
+                                    atol=1e-5)
+
+
+    @measure_time
+    def test_windowed(self):
+        print("Windowed attention Working check.")
+        self.check_windowed_equal(max_time=100, num_steps=20)
+        # The step time of windowed attention should not grow with max_time
+        for max_time in [400, 1600]:
+            self.check_windowed_time(max_time=max_time, num_steps=50,
+                                     window_size=64)
+
+    def check_windowed_equal(self, max_time, num_steps, batch_size=4,
+                             encoder_num_unit=64, decoder_num_unit=32):
+        """A window covering all frames gives the same weights as bahdanau
+           attention."""
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            np.random.seed(0)
+            encoder_states = tf.constant(np.random.randn(
+                batch_size, max_time, encoder_num_unit).astype(np.float32))
+            decoder_states = tf.constant(np.random.randn(
+                num_steps, batch_size, decoder_num_unit).astype(np.float32))
+            values_length = tf.constant(
+                np.random.randint(max_time // 2, max_time + 1, batch_size),
+                dtype=tf.int32)
+
+            weights_op = {}
+            for attention_type in ['bahdanau', 'windowed']:
+                # The window starts from the first frame
+                attention_layer = AttentionLayer(
+                    num_unit=32, attention_weights_tempareture=0.5,
+                    attention_type=attention_type,
+                    window_size=(max_time * 2 if attention_type == 'windowed'
+                                 else None))
+                weights_op[attention_type] = build_decode_loop(
+                    attention_layer, encoder_states, values_length,
+                    decoder_states, is_precomputed=True,
+                    reuse=attention_type == 'windowed')
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                weights = sess.run(weights_op)
+
+            self.assertEqual(weights['windowed'].shape,
+                             (num_steps, batch_size, max_time * 2))
+            self.assertAllClose(weights['windowed'][:, :, :max_time],
+                                weights['bahdanau'], atol=1e-6)
+            self.assertAllEqual(weights['windowed'][:, :, max_time:],
+                                np.zeros((num_steps, batch_size, max_time)))
+
+    def check_windowed_time(self, max_time, num_steps, window_size,
+                            batch_size=8, encoder_num_unit=512,
+                            decoder_num_unit=256, num_runs=5):
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            np.random.seed(0)
+            encoder_states = tf.constant(np.random.randn(
+                batch_size, max_time, encoder_num_unit).astype(np.float32))
+            decoder_states = tf.constant(np.random.randn(
+                num_steps, batch_size, decoder_num_unit).astype(np.float32))
+            values_length = tf.fill([batch_size], max_time)
+
+            weights_op = {}
+            for attention_type in ['bahdanau', 'windowed']:
+                attention_layer = AttentionLayer(
+                    num_unit=128, attention_weights_tempareture=0.5,
+                    attention_type=attention_type,
+                    window_size=(window_size if attention_type == 'windowed'
+                                 else None))
+                weights_op[attention_type] = build_decode_loop(
+                    attention_layer, encoder_states, values_length,
+                    decoder_states, is_precomputed=True,
+                    reuse=attention_type == 'windowed')
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+
+                for attention_type in ['bahdanau', 'windowed']:
+                    print('max_time %d, %s: %.3f msec per decoder step' %
+                          (max_time, attention_type,
+                           time_step(sess, weights_op[attention_type],
+                                     num_steps, num_runs)))
+
+                weights = sess.run(weights_op['windowed'])
+                self.assertAllClose(weights.sum(axis=2),
+                                    np.ones((num_steps, batch_size)))
+
+
+if __name__ == "__main__":
+    tf.test.main()
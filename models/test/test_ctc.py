@@ -25,6 +25,8 @@ class TestCTC(tf.test.TestCase):
         print("CTC Working check.")
         self.check_training(model_type='blstm_ctc', label_type='character')
         self.check_training(model_type='blstm_ctc', label_type='phone')
+        self.check_training(model_type='blstm_ctc', label_type='phone',
+                            num_subsample=1)
         self.check_training(model_type='lstm_ctc', label_type='character')
         self.check_training(model_type='lstm_ctc', label_type='phone')
         self.check_training(model_type='bgru_ctc', label_type='character')
@@ -34,7 +36,7 @@ class TestCTC(tf.test.TestCase):
         # self.check_training(model_type='cnn_ctc', label_type='phone')
         # self.check_training(model_type='cnn_ctc', label_type='phone')
 
-    def check_training(self, model_type, label_type):
+    def check_training(self, model_type, label_type, num_subsample=0):
         print('----- ' + model_type + ', ' + label_type + ' -----')
         tf.reset_default_graph()
         with tf.Graph().as_default():
@@ -59,6 +61,10 @@ class TestCTC(tf.test.TestCase):
             # Define model graph
             output_size = 26 if label_type == 'character' else 61
             model = load(model_type=model_type)
+            # Only BLSTM_CTC reduces time resolution
+            subsample_params = {}
+            if num_subsample > 0:
+                subsample_params['num_subsample'] = num_subsample
             network = model(batch_size=batch_size,
                             input_size=inputs[0].shape[1],
                             num_unit=256,
@@ -71,7 +77,8 @@ class TestCTC(tf.test.TestCase):
                             dropout_ratio_input=1.0,
                             dropout_ratio_hidden=1.0,
                             num_proj=None,
-                            weight_decay=1e-6)
+                            weight_decay=1e-6,
+                            **subsample_params)
 
             # Add to the graph each operation
             loss_op, logits = network.compute_loss(inputs_pl,
@@ -0,0 +1,133 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../')
+sys.path.append('../../')
+from ctc.load_model import load
+from ctc.streaming import StreamingCTC, decode_streaming
+from util import measure_time
+from data import generate_data, num2alpha
+from experiments.utils.sparsetensor import list2sparsetensor
+from experiments.utils.ctc_decoder import GreedyDecoder, PrefixBeamSearchDecoder
+
+
+class TestStreamingCTC(tf.test.TestCase):
+
+    @measure_time
+    def test_streaming_ctc(self):
+        print("Streaming CTC Working check.")
+        self.check_streaming(model_type='lstm_ctc')
+        self.check_streaming(model_type='gru_ctc')
+
+    def check_streaming(self, model_type, max_steps=200):
+        print('----- ' + model_type + ' -----')
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            # Load batch data
+            batch_size = 1
+            inputs, labels, inputs_seq_len = generate_data(
+                label_type='character', model='ctc', batch_size=batch_size)
+
+            # Define placeholders
+            inputs_pl = tf.placeholder(tf.float32,
+                                       shape=[None, None, inputs.shape[-1]],
+                                       name='input')
+            indices_pl = tf.placeholder(tf.int64, name='indices')
+            values_pl = tf.placeholder(tf.int32, name='values')
+            shape_pl = tf.placeholder(tf.int64, name='shape')
+            labels_pl = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+            inputs_seq_len_pl = tf.placeholder(tf.int64,
+                                               shape=[None],
+                                               name='inputs_seq_len')
+
+            # Define model graph
+            output_size = 26
+            model = load(model_type=model_type)
+            network = model(batch_size=batch_size,
+                            input_size=inputs[0].shape[1],
+                            num_unit=256,
+                            num_layer=2,
+                            bottleneck_dim=128,
+                            output_size=output_size,
+                            parameter_init=0.1,
+                            clip_grad=5.0,
+                            clip_activation=50,
+                            dropout_ratio_input=1.0,
+                            dropout_ratio_hidden=1.0,
+                            num_proj=None,
+                            weight_decay=1e-6)
+            loss_op, logits = network.compute_loss(inputs_pl,
+                                                   labels_pl,
+                                                   inputs_seq_len_pl)
+            learning_rate = 1e-3
+            train_op = network.train(loss_op,
+                                     optimizer='adam',
+                                     learning_rate_init=learning_rate,
+                                     is_scheduled=False)
+            # `[batch_size, max_time, num_classes]`
+            posteriors_op = tf.nn.softmax(tf.transpose(logits, (1, 0, 2)))
+
+            # Streaming graph sharing variables with the model
+            streaming = StreamingCTC(network, reuse=True)
+
+            feed_dict = {
+                inputs_pl: inputs,
+                labels_pl: list2sparsetensor(labels),
+                inputs_seq_len_pl: inputs_seq_len,
+                network.keep_prob_input: network.dropout_ratio_input,
+                network.keep_prob_hidden: network.dropout_ratio_hidden,
+                network.lr: learning_rate
+            }
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+
+                # Train model
+                for step in range(max_steps):
+                    _, loss_train = sess.run([train_op, loss_op],
+                                             feed_dict=feed_dict)
+                    if (step + 1) % 50 == 0:
+                        print('Step %d: loss = %.3f' % (step + 1, loss_train))
+
+                # Posteriors of the whole utterance
+                feed_dict[network.keep_prob_input] = 1.0
+                feed_dict[network.keep_prob_hidden] = 1.0
+                posteriors = sess.run(posteriors_op, feed_dict=feed_dict)[0]
+
+                # Posteriors chunk by chunk are the same
+                for chunk_size in [1, 7, 50]:
+                    streaming.reset()
+                    posteriors_streaming = np.concatenate(
+                        [streaming.step(
+                            sess, inputs[:, start:start + chunk_size])[0]
+                         for start in range(0, inputs.shape[1], chunk_size)],
+                        axis=0)
+                    self.assertAllClose(posteriors, posteriors_streaming,
+                                        atol=1e-5)
+
+                # First-token latency & RTF
+                blank_index = output_size
+                print('True: %s' % num2alpha(labels[0]))
+                for chunk_size in [10, 20, 50]:
+                    for decoder in [GreedyDecoder(blank_index),
+                                    PrefixBeamSearchDecoder(blank_index,
+                                                            beam_width=10)]:
+                        labels_pred, latency, rtf = decode_streaming(
+                            streaming, sess, inputs[0], chunk_size, decoder)
+                        print('chunk %d, %s: latency = %s sec / RTF = %.3f' %
+                              (chunk_size, type(decoder).__name__,
+                               'None' if latency is None
+                               else '%.3f' % latency, rtf))
+                        print('Pred: %s' % num2alpha(labels_pred))
+
+
+if __name__ == "__main__":
+    tf.test.main()